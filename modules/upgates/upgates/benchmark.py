@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Benchmarks
+
+Micro-benchmarks for the hot paths of a sync. `benchmark_decode` builds a
+synthetic `/products` page with large HTML long descriptions (real pages are
+several MB) and times decoding it with the standard library versus the fast
+decoder in `upgates.models.payloads`, and the cost of the old full-page debug
+log line versus the size summary logged now. `benchmark_sync` runs a full
+`sync-all` against the local mock API (`upgates.mock_server`) with a throwaway
+DuckDB file and reports end-to-end throughput, without touching the live shop
+or its quota.
+
+Usage:
+
+    $> upgates benchmark-decode --products 100 --description-kb 20
+    $> upgates benchmark-sync --products 2000 --latency-ms 150
+
+File: upgates/benchmark.py
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+from upgates.client import UpgatesClient
+from upgates.db.duckdb_api import UpgatesDuckDBAPI
+from upgates.mock_server import (
+    MockCatalog,
+    MockSettings,
+    MockUpgatesAPI,
+    synthetic_product,
+)
+from upgates.models.payloads import loads
+
+
+def synthetic_products_page(
+    products: int = 100, description_kb: int = 20, page: int = 1, pages: int = 1
+) -> Dict[str, Any]:
+    """Build a `/products` page shaped like the API's, with HTML descriptions."""
+    first = (page - 1) * products + 1
+    return {
+        "current_page": page,
+        "current_page_items": products,
+        "number_of_pages": pages,
+        "number_of_items": products * pages,
+        "products": [
+            synthetic_product(product_id, description_kb)
+            for product_id in range(first, first + products)
+        ],
+    }
+
+
+def _best_of(func: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of `repeat` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def benchmark_decode(
+    products: int = 100, description_kb: int = 20, repeat: int = 5
+) -> Dict[str, float]:
+    """Time decoding and logging one synthetic products page (ms, best of N)."""
+    body = json.dumps(synthetic_products_page(products, description_kb)).encode()
+    data = loads(body)
+    return {
+        "page_mb": len(body) / 1024 / 1024,
+        "json_loads_ms": _best_of(lambda: json.loads(body), repeat),
+        "fast_loads_ms": _best_of(lambda: loads(body), repeat),
+        "full_log_ms": _best_of(lambda: f"📊 Response data: {data}", repeat),
+        "summary_log_ms": _best_of(
+            lambda: f"📊 Decoded page 1: {len(body)} bytes, "
+            f"{len(data.get('products') or [])} items",
+            repeat,
+        ),
+    }
+
+
+async def benchmark_sync(
+    catalog: MockCatalog, settings: Optional[MockSettings] = None
+) -> Dict[str, Any]:
+    """Run `sync_all()` against an in-process mock API; return throughput figures.
+
+    The sync writes to a temporary DuckDB file, so the local cache is untouched.
+    """
+    api = MockUpgatesAPI(catalog, settings)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_api = UpgatesDuckDBAPI(db_file=os.path.join(tmp, "bench.db"))
+            client = UpgatesClient(cache=False, db_api=db_api)
+            client.API_URL = f"http://{host}:{port}/api/v2"
+            client.scheduler.coordinator = None  # keep the mock out of the ledger
+            started = time.perf_counter()
+            async with client:
+                await client.sync_all()
+            seconds = time.perf_counter() - started
+            products = client.db_api.conn.execute(
+                "SELECT COUNT(*) FROM products"
+            ).fetchone()[0]
+            client.db_api.close()
+    finally:
+        await runner.cleanup()
+
+    requests = sum(api.requests.values())
+    return {
+        "seconds": seconds,
+        "requests": requests,
+        "requests_per_s": requests / seconds,
+        "products_stored": products,
+        "products_per_s": products / seconds,
+        "peak_concurrency": api.peak_in_flight,
+        "throttled": dict(api.throttled),
+        "by_endpoint": dict(api.requests),
+    }
+
+
+# EOF
@@ -11,9 +11,13 @@ Commands:
     start-webhook       Start webhook server for real-time updates.
     start-scheduler     Start scheduled auto-sync process.
     sync-all            Sync all data: products, customers, orders.
+    plan-sync           Show the requests a sync needs versus the remaining API quota.
     sync-products       Sync products data.
     sync-customers      Sync customers data.
     sync-orders         Sync orders data.
+    sync-stock-prices   Refresh product stock, availability and prices only.
+    sync-parameters     Sync parameters, their values and product parameter links.
+    verify-cache        Compare the product cache with products/simple and repair the drift.
     list-product-fields List all available product fields
     search-product      Search for a product by product_code.
     show-products       Show all products with related data.
@@ -22,6 +26,10 @@ Commands:
     translate-product   Translate product descriptions for a given language.
     save-translation    Save the updated product translations back to Upgates.cz API.
     clear-cache         Force-clear the DuckDB cache file.
+    stats               Show per-endpoint API latency, throughput and phase timings.
+    benchmark-decode    Time JSON decoding and logging of a large products page.
+    benchmark-sync      Time a full sync against the local mock API.
+    mock-server         Serve a local mock of the Upgates API with synthetic data.
 
 
 File:
@@ -32,13 +40,21 @@ import asyncio
 import os
 import subprocess
 import sys
+from typing import Any, Awaitable, Callable
 
 import click
 import duckdb
 import IPython
+import pandas as pd
 from rich.console import Console
+from rich.table import Table
 from upgates import config
+from upgates.benchmark import benchmark_decode, benchmark_sync
+from upgates.cache import ResponseCache
 from upgates.client import UpgatesClient
+from upgates.db.duckdb_api import UpgatesDuckDBAPI
+from upgates.mock_server import MockCatalog, MockSettings, run_mock_server
+from upgates.telemetry import histogram
 
 # Ensure the package directory is included in sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -59,6 +75,46 @@ def _clear_cache() -> int:
         return 0
 
 
+def _run_client(
+    action: Callable[[UpgatesClient], Awaitable[Any]], **client_kwargs: Any
+) -> Any:
+    """Run `action` with a pooled UpgatesClient and close its session afterwards."""
+
+    async def runner() -> Any:
+        async with UpgatesClient(**client_kwargs) as client:
+            return await action(client)
+
+    return asyncio.run(runner())
+
+
+# Shared sync options
+incremental_option = click.option(
+    "--incremental/--full",
+    default=False,
+    help="Only fetch items changed since the last sync, or rebuild everything (default).",
+)
+
+check_budget_option = click.option(
+    "--check-budget/--no-check-budget",
+    default=True,
+    help="Estimate the requests needed first and refuse if the API quota cannot cover them.",
+)
+
+commit_option = click.option(
+    "--commit",
+    type=click.Choice(["page", "run"]),
+    default=None,
+    help="Commit products per page, or stage them and commit once per run "
+    "(default: UPGATES_SYNC_COMMIT).",
+)
+
+replay_option = click.option(
+    "--replay",
+    is_flag=True,
+    help="Serve the sync entirely from the on-disk API response cache (no API calls).",
+)
+
+
 # Define the CLI commands
 
 
@@ -93,17 +149,30 @@ def start_scheduler():
     type=int,
     help="Number of pages to fetch. Default is all pages.",
 )
+@incremental_option
 @click.option(
     "--embed", is_flag=True, help="Launch ipython.embed() shell after syncing."
 )
-def sync_products(reset_cache, page_count, embed):
+@check_budget_option
+@commit_option
+@replay_option
+def sync_products(
+    reset_cache, page_count, incremental, embed, check_budget, commit, replay
+):
     """Sync products data."""
 
     if reset_cache:
         _clear_cache()  # Ensure clear_cache is called if the flag is set
 
-    client = UpgatesClient()
-    asyncio.run(client.sync_products(page_count=page_count))
+    _run_client(
+        lambda client: client.sync_products(
+            page_count=page_count,
+            incremental=incremental,
+            check_budget=check_budget,
+            commit=commit,
+        ),
+        replay=replay,
+    )
 
     if embed:
         IPython.embed()
@@ -117,44 +186,93 @@ def sync_products(reset_cache, page_count, embed):
     type=int,
     help="Number of pages to fetch. Default is all pages.",
 )
-def sync_customers(reset_cache, page_count):
+@incremental_option
+@replay_option
+def sync_customers(reset_cache, page_count, incremental, replay):
     """Sync customers data."""
     if reset_cache:
         _clear_cache()  # Ensure clear_cache is called if the flag is set
-    client = UpgatesClient()
-    asyncio.run(client.sync_customers(page_count=page_count))
+    _run_client(
+        lambda client: client.sync_customers(
+            page_count=page_count, incremental=incremental
+        ),
+        replay=replay,
+    )
 
 
 @click.command()
-@click.option("--clear-cache", is_flag=True, help="Clear the cache before syncing.")
+@click.option("--reset-cache", is_flag=True, help="Clear the cache before syncing.")
 @click.option(
     "--page-count",
     default=None,
     type=int,
     help="Number of pages to fetch. Default is all pages.",
 )
-def sync_orders(reset_cache, page_count):
+@incremental_option
+@replay_option
+def sync_orders(reset_cache, page_count, incremental, replay):
     """Sync orders data."""
     if reset_cache:
         _clear_cache()  # Ensure clear_cache is called if the flag is set
-    client = UpgatesClient()
-    asyncio.run(client.sync_orders(page_count=page_count))
+    _run_client(
+        lambda client: client.sync_orders(
+            page_count=page_count, incremental=incremental
+        ),
+        replay=replay,
+    )
+
+
+@click.command(name="sync-stock-prices")
+@click.option(
+    "--page-count",
+    default=None,
+    type=int,
+    help="Number of pages to fetch. Default is all pages.",
+)
+@incremental_option
+@click.option(
+    "--in-stock/--not-in-stock",
+    default=None,
+    help="Only refresh products in stock, or only those with other availabilities.",
+)
+@replay_option
+def sync_stock_prices(page_count, incremental, in_stock, replay):
+    """Refresh product stock, availability and prices only."""
+    _run_client(
+        lambda client: client.sync_stock_prices(
+            page_count=page_count, incremental=incremental, in_stock=in_stock
+        ),
+        replay=replay,
+    )
 
 
 @click.command(name="sync-parameters")
-@click.option("--clear-cache", is_flag=True, help="Clear the cache before syncing.")
+@click.option("--reset-cache", is_flag=True, help="Clear the cache before syncing.")
 @click.option(
     "--page-count",
     default=None,
     type=int,
     help="Number of pages to fetch. Default is all pages.",
 )
-def sync_parameters(reset_cache, page_count):
-    """Show all parameters."""
+@incremental_option
+@click.option(
+    "--with-products/--without-products",
+    default=True,
+    help="Also sync which parameter values each product has.",
+)
+@replay_option
+def sync_parameters(reset_cache, page_count, incremental, with_products, replay):
+    """Sync parameters, their values and product parameter links."""
     if reset_cache:
         _clear_cache()  # Ensure clear_cache is called if the flag is set
-    client = UpgatesClient()
-    asyncio.run(client.sync_parameters(page_count=page_count))
+    _run_client(
+        lambda client: client.sync_parameters(
+            page_count=page_count,
+            incremental=incremental,
+            with_products=with_products,
+        ),
+        replay=replay,
+    )
 
 
 # --
@@ -167,10 +285,53 @@ def sync_parameters(reset_cache, page_count):
     type=int,
     help="Number of pages to fetch. Default is all pages.",
 )
-def sync_all():
+@incremental_option
+@check_budget_option
+@commit_option
+@replay_option
+def sync_all(page_count, incremental, check_budget, commit, replay):
     """Sync all data: products, customers, orders."""
-    client = UpgatesClient()
-    asyncio.run(client.sync_all())
+    _run_client(
+        lambda client: client.sync_all(
+            page_count=page_count,
+            incremental=incremental,
+            check_budget=check_budget,
+            commit=commit,
+        ),
+        replay=replay,
+    )
+
+
+@click.command(name="plan-sync")
+@click.option(
+    "--page-count",
+    default=None,
+    type=int,
+    help="Number of pages to fetch. Default is all pages.",
+)
+@incremental_option
+@click.argument("endpoints", nargs=-1)
+def plan_sync(page_count, incremental, endpoints):
+    """Show the requests a sync needs versus the remaining API quota."""
+    endpoints = list(endpoints) or ["products", "customers", "orders"]
+    plan = _run_client(
+        lambda client: client.plan_sync(endpoints, page_count, incremental)
+    )
+    console.print(f"📋 {plan.describe()}")
+
+
+@click.command(name="verify-cache")
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Only report missing, stale and deleted products; change nothing.",
+)
+def verify_cache(dry_run):
+    """Compare the product cache with products/simple and repair the drift."""
+    drift = _run_client(
+        lambda client: client.verify_cache(repair=not dry_run), cache=False
+    )
+    console.print(f"🔎 {drift.describe()}")
 
 
 ####
@@ -208,21 +369,27 @@ def translate_product(product_code, target_lang, prompt, save):
 
     languages = [target_lang] if "," not in target_lang else target_lang.split(",")
 
-    def translate(product_code, target_lang, prompt, save) -> None:
+    async def translate(product_code, target_lang, prompt) -> None:
         """Translate product descriptions."""
         console.print(f"▶️ Translate product: {product_code}")
-        asyncio.run(client.translate_product(product_code, target_lang, prompt))
+        await client.translate_product(product_code, target_lang, prompt)
 
-        if not save:
-            return
+    async def translate_all() -> None:
+        async with client:
+            for code in product_codes:
+                for lang in languages:
+                    await translate(code, lang, "")
 
-        console.print(f"💾 Saving translation for product: {product_code}")
-        # Save the translation back to Upgates.cz API but avoid updating the product again
-        asyncio.run(client.save_translation(product_code, target_lang))
+            if not save:
+                return
 
-    _ = [
-        translate(code, lang, "", save) for code in product_codes for lang in languages
-    ]
+            # Save all products and languages in batched PUT requests
+            console.print(f"💾 Saving translations for products: {product_codes}")
+            result = await client.save_translations(product_codes, languages)
+            for code in result.failed:
+                console.print(f"❌ Save failed: {code}")
+
+    asyncio.run(translate_all())
     console.print(
         f"✅ Translations completed. \nLanguages: {languages}\nProduct Codes: {product_codes}"
     )
@@ -240,61 +407,65 @@ def translate_product(product_code, target_lang, prompt, save):
 @click.argument("target_lang")
 def save_translation(product_code, target_lang, update):
     """Save the updated product translations back to Upgates.cz API."""
-    client = UpgatesClient()
-    if update:
-        empty_prompt = ""
-        asyncio.run(client.translate_product(product_code, target_lang, empty_prompt))
-    asyncio.run(client.save_translation(product_code, target_lang))
 
+    async def save(client: UpgatesClient) -> None:
+        if update:
+            empty_prompt = ""
+            await client.translate_product(product_code, target_lang, empty_prompt)
+        await client.save_translation(product_code, target_lang)
 
-async def save_product_translation(
-    client: UpgatesClient, code: str, target_lang: str
-) -> list:
-    """bla bla"""
-    groups = []
-    async with asyncio.TaskGroup() as tg:
-        tg.create_task(client.translate_product(code, target_lang, ""))
-        tg.create_task(client.save_translation(code, target_lang))
-        groups.append(tg)
-    return groups
+    _run_client(save)
 
 
 async def save_product_translations(target_lang: str) -> None:
     """Async wrapper to batch save product translations."""
     target_lang = target_lang.lower()
-    client = UpgatesClient()
+    async with UpgatesClient() as client:
+        await _save_product_translations(client, target_lang)
+
+
+async def _save_product_translations(client: UpgatesClient, target_lang: str) -> None:
+    """Translate and save every product missing a `target_lang` description."""
     codes = await client.db_api.get_all_product_codes()
 
     chunk_size = 10
     chunks = [codes[x : x + chunk_size] for x in range(0, len(codes), chunk_size)]
 
-    async def save(code, target_lang):
-        async with asyncio.TaskGroup() as tg:
-            query = """
-            SELECT 1 FROM descriptions AS d 
-                WHERE 
-                    d.product_id = (SELECT p.product_id from products AS p WHERE p.code = ?) 
-                    AND 
-                    d.language = ?
-                    AND 
-                    d.long_description IS NOT NULL
-                    AND 
-                    d.long_description <> ''
-            """.strip()
-
-            exists = client.db_api.conn.execute(query, [code, target_lang]).fetchone()
-
-            if exists:
-                print(f"☑️ Skipped: {code}")
-                return
+    translated = []
+
+    async def translate(code, target_lang):
+        query = """
+        SELECT 1 FROM descriptions AS d 
+            WHERE 
+                d.product_id = (SELECT p.product_id from products AS p WHERE p.code = ?) 
+                AND 
+                d.language = ?
+                AND 
+                d.long_description IS NOT NULL
+                AND 
+                d.long_description <> ''
+        """.strip()
+
+        exists = client.db_api.conn.execute(query, [code, target_lang]).fetchone()
+
+        if exists:
+            print(f"☑️ Skipped: {code}")
+            return
 
-            try:
-                await client.translate_product(code, target_lang, "")
-            except AttributeError:
-                console.print(f"❌ Translation failed: {code}")
-                return
-            else:
-                tg.create_task(client.save_translation(code, target_lang))
+        try:
+            await client.translate_product(code, target_lang, "")
+        except AttributeError:
+            console.print(f"❌ Translation failed: {code}")
+        else:
+            translated.append(code)
+
+    async def flush(force=False):
+        # Push translations in full PUT batches rather than one request each
+        if translated and (force or len(translated) >= client.PUT_BATCH_SIZE):
+            result = await client.save_translations(translated, [target_lang])
+            for code in result.failed:
+                console.print(f"❌ Save failed: {code}")
+            translated.clear()
 
     for chunk in chunks:
         tasks = list()
@@ -302,8 +473,11 @@ async def save_product_translations(target_lang: str) -> None:
             if "X" in code:
                 console.print(f"❌ Skip: {code}")
                 continue
-            tasks.append(save(code, target_lang))
+            tasks.append(translate(code, target_lang))
         await asyncio.gather(*tasks)
+        await flush()
+
+    await flush(force=True)
 
 
 # CMD: Save all translations
@@ -407,8 +581,13 @@ def show_parameters():
 
 
 @click.command()
-def clear_cache():
+@click.option("--http", is_flag=True, help="Also clear the on-disk API response cache.")
+def clear_cache(http):
     """Force-clear the DuckDB cache file."""
+    if http:
+        ResponseCache().clear()
+        console.print("✅ API response cache cleared.")
+
     db_file = config.default_db_path
     # Ensure the cache file exists before attempting to remove
     if os.path.exists(db_file):
@@ -422,19 +601,157 @@ def clear_cache():
         console.print("⚠️ Cache file does not exist.")
 
 
+@click.command()
+@click.option(
+    "--hours", default=24.0, help="Only include requests from the last N hours."
+)
+@click.option("--histogram/--no-histogram", "show_histogram", default=True)
+def stats(hours, show_histogram):
+    """Show per-endpoint API latency, throughput and phase timings."""
+    db_api = UpgatesDuckDBAPI()
+    summary = db_api.get_api_request_stats(hours)
+    if summary.empty:
+        console.print(f"⚠️ No API requests recorded in the last {hours:g} hours.")
+        return
+
+    table = Table(title=f"Upgates API requests (last {hours:g}h)")
+    for column in summary.columns:
+        table.add_column(column, justify="left" if column == "endpoint" else "right")
+    for row in summary.itertuples(index=False):
+        table.add_row(*("" if pd.isna(v) else str(v) for v in row))
+    console.print(table)
+    console.print(
+        "p50/p95 = network latency, decode/store = mean ms per page spent in JSON "
+        "decoding and DuckDB writes."
+    )
+
+    if not show_histogram:
+        return
+    for endpoint in summary["endpoint"]:
+        latencies = db_api.get_api_latencies(endpoint, hours)
+        if not latencies:
+            continue
+        console.print(f"\n[bold]{endpoint}[/bold] latency")
+        buckets = histogram(latencies)
+        widest = max(count for _, count in buckets) or 1
+        for label, count in buckets:
+            bar = "█" * round(40 * count / widest)
+            console.print(f"  {label:>12} {bar} {count}")
+
+
+@click.command(name="benchmark-decode")
+@click.option("--products", default=100, help="Products on the synthetic page.")
+@click.option(
+    "--description-kb", default=20, help="Size of each HTML long description in KB."
+)
+@click.option("--repeat", default=5, help="Runs per measurement (best is shown).")
+def benchmark_decode_command(products, description_kb, repeat):
+    """Time JSON decoding and logging of a large products page."""
+    results = benchmark_decode(products, description_kb, repeat)
+    table = Table(title=f"Products page: {results.pop('page_mb'):.1f} MB")
+    table.add_column("Step")
+    table.add_column("Best (ms)", justify="right")
+    for step, ms in results.items():
+        table.add_row(step[: -len("_ms")], f"{ms:.2f}")
+    console.print(table)
+
+
+def mock_options(func):
+    """Catalog size and injected behaviour shared by the mock API commands."""
+    options = [
+        click.option("--products", default=1000, help="Synthetic products."),
+        click.option("--customers", default=200, help="Synthetic customers."),
+        click.option("--orders", default=500, help="Synthetic orders."),
+        click.option("--parameters", default=20, help="Synthetic parameters."),
+        click.option(
+            "--description-kb", default=20, help="Size of each long description in KB."
+        ),
+        click.option("--latency-ms", default=0.0, help="Added latency per request."),
+        click.option("--jitter-ms", default=0.0, help="Random extra latency (0..N)."),
+        click.option(
+            "--throttle-every", default=0, help="Answer every Nth request with 429."
+        ),
+        click.option("--hour-limit", default=100000, help="Hourly request limit."),
+        click.option("--day-limit", default=0, help="Daily request limit."),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _mock_setup(options):
+    catalog = MockCatalog(
+        products=options["products"],
+        customers=options["customers"],
+        orders=options["orders"],
+        parameters=options["parameters"],
+        description_kb=options["description_kb"],
+    )
+    settings = MockSettings(
+        latency_ms=options["latency_ms"],
+        jitter_ms=options["jitter_ms"],
+        throttle_every=options["throttle_every"],
+        hour_limit=options["hour_limit"],
+        day_limit=options["day_limit"],
+    )
+    return catalog, settings
+
+
+@click.command(name="mock-server")
+@mock_options
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8089)
+def mock_server(host, port, **options):
+    """Serve a local mock of the Upgates API with synthetic data."""
+    catalog, settings = _mock_setup(options)
+    console.print(
+        f"🧪 Point the client at it with UPGATES_API_URL=http://{host}:{port}/api/v2"
+    )
+    run_mock_server(catalog, settings, host=host, port=port)
+
+
+@click.command(name="benchmark-sync")
+@mock_options
+def benchmark_sync_command(**options):
+    """Time a full sync against the local mock API."""
+    catalog, settings = _mock_setup(options)
+    results = asyncio.run(benchmark_sync(catalog, settings))
+    table = Table(
+        title=f"sync-all against the mock API ({options['products']} products)"
+    )
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    for metric in ("seconds", "requests_per_s", "products_per_s"):
+        table.add_row(metric, f"{results[metric]:.2f}")
+    for metric in ("requests", "products_stored", "peak_concurrency"):
+        table.add_row(metric, str(results[metric]))
+    for reason, count in results["throttled"].items():
+        table.add_row(f"429 ({reason})", str(count))
+    for endpoint, count in sorted(results["by_endpoint"].items()):
+        table.add_row(endpoint, str(count))
+    console.print(table)
+
+
 cli.add_command(start_webhook)
 cli.add_command(start_scheduler)
 cli.add_command(sync_all)
+cli.add_command(plan_sync)
 cli.add_command(sync_products)
 cli.add_command(sync_customers)
 cli.add_command(sync_orders)
 cli.add_command(sync_parameters)
+cli.add_command(sync_stock_prices)
+cli.add_command(verify_cache)
 cli.add_command(search_product)
 cli.add_command(show_products)
 cli.add_command(show_customers)
 cli.add_command(show_parameters)
 cli.add_command(show_orders)
 cli.add_command(clear_cache)
+cli.add_command(benchmark_decode_command)
+cli.add_command(benchmark_sync_command)
+cli.add_command(mock_server)
+cli.add_command(stats)
 
 # Register the new commands with the CLI group:
 cli.add_command(translate_product)
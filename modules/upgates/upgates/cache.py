@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates HTTP Response Cache
+
+This module stores raw Upgates API page bodies on disk, keyed by endpoint and
+query parameters, so that re-running a failed ingest or a schema migration does
+not spend the limited API quota again. Entries expire after a per-endpoint TTL;
+in replay mode the TTL is ignored and every page must come from the cache.
+
+Usage:
+
+    cache = ResponseCache()
+    body = cache.get("products", {"page": 1})
+    if body is None:
+        cache.put("products", {"page": 1}, body := await fetch())
+
+File: upgates/cache.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+import logfire
+
+from upgates import config
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a response is not in the cache."""
+
+
+def parse_ttls(value: str) -> Dict[str, float]:
+    """Parse `endpoint=seconds` pairs, eg. "products=3600,parameters=86400"."""
+    ttls = {}
+    for pair in filter(None, (p.strip() for p in value.split(","))):
+        endpoint, _, seconds = pair.partition("=")
+        ttls[endpoint.strip().strip("/")] = float(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """File-based cache of raw API response bodies."""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        default_ttl: float = config.UPGATES_HTTP_CACHE_TTL,
+        ttls: Optional[Mapping[str, float]] = None,
+    ):
+        self.path = Path(path or config.http_cache_path)
+        self.default_ttl = default_ttl
+        self.ttls = dict(
+            parse_ttls(config.UPGATES_HTTP_CACHE_TTLS) if ttls is None else ttls
+        )
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def ttl(self, endpoint: str) -> float:
+        """TTL for an endpoint; `products/simple` falls back to `products`."""
+        parts = endpoint.strip("/").split("/")
+        for i in range(len(parts), 0, -1):
+            ttl = self.ttls.get("/".join(parts[:i]))
+            if ttl is not None:
+                return ttl
+        return self.default_ttl
+
+    def _file(self, endpoint: str, params: Optional[Mapping[str, Any]]) -> Path:
+        query = json.dumps(params or {}, sort_keys=True, default=str)
+        digest = hashlib.sha1(query.encode()).hexdigest()
+        return self.path / endpoint.strip("/").replace("/", "__") / f"{digest}.json"
+
+    def get(
+        self,
+        endpoint: str,
+        params: Optional[Mapping[str, Any]] = None,
+        ignore_ttl: bool = False,
+    ) -> Optional[bytes]:
+        """Return a cached body, or None if it is missing or has expired."""
+        file = self._file(endpoint, params)
+        try:
+            age = time.time() - file.stat().st_mtime
+            if not ignore_ttl and age > self.ttl(endpoint):
+                return None
+            body = file.read_bytes()
+        except FileNotFoundError:
+            return None
+        logfire.debug(f"💾 Cache hit: {endpoint} {dict(params or {})} ({age:.0f}s old)")
+        return body
+
+    def put(
+        self, endpoint: str, params: Optional[Mapping[str, Any]], body: bytes
+    ) -> None:
+        """Store a response body atomically."""
+        file = self._file(endpoint, params)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, file)
+
+    def clear(self, endpoint: Optional[str] = None) -> None:
+        """Remove cached responses for one endpoint, or all of them."""
+        target = (
+            self.path / endpoint.strip("/").replace("/", "__")
+            if endpoint
+            else self.path
+        )
+        shutil.rmtree(target, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+
+# EOF
@@ -9,14 +9,29 @@ methods for translating product descriptions using AI and saving the translation
 
 Usage:
 
-    client = UpgatesClient()
-    asyncio.run(client.sync_all())
+    async with UpgatesClient() as client:
+        await client.sync_all()
 
 File: upgates/client.py
 """
 
 import asyncio
-from typing import Any, Dict, List, Optional
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 import aiohttp
 
@@ -27,7 +42,62 @@ from pydantic import BaseModel, Field
 
 from upgates import config
 from upgates.ai import TranslationDeps, translate_text
+from upgates.cache import CacheMiss, ResponseCache
+from upgates.coordinator import HostCoordinator, coordinator_available
+from upgates.db.batches import (
+    customer_frames,
+    order_frames,
+    parameter_frames,
+    product_frames,
+    product_parameter_frames,
+)
 from upgates.db.duckdb_api import UpgatesDuckDBAPI
+from upgates.drift import CacheDrift
+from upgates.models.payloads import dumps, loads
+from upgates.planner import REFUSE, SyncPlan, plan_requests
+from upgates.ratelimit import (
+    QuotaState,
+    RateLimitExceeded,
+    RequestScheduler,
+    backoff_delay,
+)
+from upgates.telemetry import RequestSample, RequestStats
+from upgates.writer import ProductWriter, SaveResult
+
+# Response statuses worth retrying: the request may succeed if sent again
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+
+@dataclass
+class _Flight:
+    """One in-flight page GET and the number of callers awaiting it."""
+
+    task: "asyncio.Future[Dict[str, Any]]"
+    waiters: int = 0
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    """Parse an API ISO 8601 timestamp; naive values are taken as UTC."""
+    try:
+        parsed = datetime.fromisoformat(str(value)) if value else None
+    except ValueError:
+        return None
+    if parsed and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def newest_update_time(
+    items: List[Dict[str, Any]], newest: Optional[str] = None
+) -> Optional[str]:
+    """Return the newest `last_update_time` among `items` and `newest`."""
+    newest_time = _parse_time(newest)
+    for item in items:
+        value = item.get("last_update_time")
+        parsed = _parse_time(value)
+        if parsed and (newest_time is None or parsed > newest_time):
+            newest, newest_time = value, parsed
+    return newest
 
 
 def log_sync_statistics(sync_results: Dict[str, List]) -> None:
@@ -88,373 +158,915 @@ class UpgatesClient:
     LOGIN = config.UPGATES_LOGIN
     API_KEY = config.UPGATES_API_KEY
     VERIFY_SSL = True if config.UPGATES_VERIFY_SSL else False
-
-    def __init__(self):
-        """Ensure DuckDB database is initialized before starting."""
+    MAX_CONCURRENCY = config.UPGATES_API_MAX_CONCURRENCY
+    REQUEST_TIMEOUT = config.UPGATES_API_TIMEOUT
+    DNS_CACHE_TTL = config.UPGATES_DNS_CACHE_TTL
+    KEEPALIVE_TIMEOUT = config.UPGATES_KEEPALIVE_TIMEOUT
+    RATE_LIMIT_RETRIES = config.UPGATES_RATE_LIMIT_RETRIES
+    RETRY_LIMIT = config.UPGATES_API_RETRY_LIMIT
+    RETRY_BACKOFF = config.UPGATES_API_RETRY_BACKOFF
+    RETRY_MAX_BACKOFF = config.UPGATES_API_RETRY_MAX_BACKOFF
+    PREFETCH_PAGES = config.UPGATES_PREFETCH_PAGES
+    PUT_BATCH_SIZE = config.UPGATES_PUT_BATCH_SIZE
+    PUT_RETRIES = config.UPGATES_PUT_RETRIES
+    CHECKPOINT_MAX_AGE_HOURS = config.UPGATES_CHECKPOINT_MAX_AGE_HOURS
+    SYNC_COMMIT = config.UPGATES_SYNC_COMMIT
+    WRITE_QUEUE_PAGES = config.UPGATES_WRITE_QUEUE_PAGES
+    VERIFY_BATCH_SIZE = config.UPGATES_VERIFY_BATCH_SIZE
+
+    def __init__(
+        self,
+        cache: Optional[bool] = None,
+        replay: bool = False,
+        db_api: Optional[UpgatesDuckDBAPI] = None,
+    ):
+        """Ensure DuckDB database is initialized before starting.
+
+        `cache` enables the on-disk response cache (default: UPGATES_HTTP_CACHE);
+        `replay` serves every request from that cache and never calls the API;
+        `db_api` stores into another database instead of the default DuckDB file.
+        """
         logfire.debug("🌉 UpgatesClient initialized.")
-        self.db_api = (
-            UpgatesDuckDBAPI()
-        )  # Initializes only once due to lazy table creation
-
-    async def sync_all(self):
-        """Sync all data: products, customers, orders."""
-        logfire.info("ℹ️ Starting full API sync...")
-        await asyncio.gather(
-            self.sync_products(), self.sync_customers(), self.sync_orders()
+        self.replay = replay
+        use_cache = config.UPGATES_HTTP_CACHE if cache is None else cache
+        self.cache = ResponseCache() if (use_cache or replay) else None
+        # Initializes only once due to lazy table creation
+        self.db_api = db_api or UpgatesDuckDBAPI()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.scheduler = RequestScheduler(
+            max_concurrency=self.MAX_CONCURRENCY,
+            reserve=config.UPGATES_QUOTA_RESERVE,
+            max_wait=config.UPGATES_QUOTA_MAX_WAIT,
+            latency_spike_factor=config.UPGATES_LATENCY_SPIKE_FACTOR,
+            coordinator=(
+                HostCoordinator(config.coordinator_path, slots=self.MAX_CONCURRENCY)
+                if config.UPGATES_COORDINATOR and coordinator_available()
+                else None
+            ),
+        )
+        self.stats = RequestStats(max_samples=config.UPGATES_TELEMETRY_MAX_SAMPLES)
+        # First pages fetched by plan_sync(), handed over to the sync itself
+        self._probes: Dict[Tuple[str, Tuple], Dict[str, Any]] = {}
+        # Identical page GETs in flight, shared by concurrent callers
+        self._flights: Dict[Tuple[str, Tuple], _Flight] = {}
+        self.coalesced = 0
+        self.writer = ProductWriter(
+            self._request, batch_size=self.PUT_BATCH_SIZE, retries=self.PUT_RETRIES
         )
+        # Single thread running the DuckDB work of syncs, off the event loop
+        self._db_executor: Optional[ThreadPoolExecutor] = None
 
-    async def sync_products(self, page_count=None):
-        """Sync products from the Upgates.cz API."""
-        logfire.info("Fetching product data...")
-        products_response = await self.fetch_data("products", page_count=page_count)
+    @property
+    def quota(self) -> QuotaState:
+        """Live API quota as last reported by the Upgates API."""
+        return self.scheduler.snapshot()
 
-        if products_response:
-            products = products_response.get("products", [])
-            logfire.info(
-                f"Fetched product data: {products[:1]}..."
-            )  # Log the first product as a sample
+    async def __aenter__(self) -> "UpgatesClient":
+        await self._get_session()
+        return self
 
-            if products:
-                for product in products:
-                    # print ("Product: ", product['product_id'], product['code'])
-                    # import pdb; pdb.set_trace()
-                    product_id = product.get("product_id")
-                    code = product.get("code")
-                    ean = product.get("ean", "")
-                    manufacturer = product.get("manufacturer", "")
-                    stock = product.get("stock", 0)
-                    weight = product.get("weight", 0)
-                    availability = product.get("availability", "")
-                    availability_type = product.get("availability_type", "")
-                    unit = product.get("unit", "ks")
-
-                    # Convert _yn fields to 1 (True) or 0 (False)
-                    action_currently_yn = (
-                        1 if product.get("action_currently_yn", False) else 0
-                    )
-                    active_yn = 1 if product.get("active_yn", False) else 0
-                    archived_yn = 1 if product.get("archived_yn", False) else 0
-                    can_add_to_basket_yn = (
-                        1 if product.get("can_add_to_basket_yn", False) else 0
-                    )
-                    adult_yn = 1 if product.get("adult_yn", False) else 0
-                    set_yn = 1 if product.get("set_yn", False) else 0
-                    in_set_yn = 1 if product.get("in_set_yn", False) else 0
-                    exclude_from_search_yn = (
-                        1 if product.get("exclude_from_search_yn", False) else 0
-                    )
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
 
-                    # Inserting product data into the database
-                    self.db_api.insert_product(
-                        product_id,
-                        code,
-                        ean,
-                        manufacturer,
-                        stock,
-                        weight,
-                        availability,
-                        availability_type,
-                        unit,
-                        action_currently_yn,
-                        active_yn,
-                        archived_yn,
-                        can_add_to_basket_yn,
-                        adult_yn,
-                        set_yn,
-                        in_set_yn,
-                        exclude_from_search_yn,
-                    )
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled keep-alive session, creating it on first use.
 
-                    # Insert descriptions
-                    for desc in product.get("descriptions", []):
-                        language = desc.get("language", "unknown")
-                        title = desc.get("title", "")
-                        short_description = desc.get("short_description", "")
-                        long_description = desc.get("long_description", "")
-                        url = desc.get("url", "")
-                        seo_title = desc.get("seo_title", "")
-                        seo_description = desc.get("seo_description", "")
-                        seo_url = desc.get("seo_url", "")
-                        seo_keywords = desc.get("seo_keywords", "")
-                        unit = desc.get("unit", "ks")
-                        self.db_api.insert_product_description(
-                            product_id,
-                            language,
-                            title,
-                            short_description,
-                            long_description,
-                            url,
-                            seo_title,
-                            seo_description,
-                            seo_url,
-                            seo_keywords,
-                            unit,
-                        )
+        Sessions are bound to the event loop they were created in, so a new one
+        is opened when the client is reused from another `asyncio.run()` call.
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        ):
+            connector = aiohttp.TCPConnector(
+                limit=self.MAX_CONCURRENCY,
+                limit_per_host=self.MAX_CONCURRENCY,
+                ttl_dns_cache=self.DNS_CACHE_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                ssl=self.VERIFY_SSL,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                auth=aiohttp.BasicAuth(self.LOGIN, self.API_KEY),
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT),
+                json_serialize=dumps,
+            )
+            self._session_loop = loop
+            logfire.debug(
+                f"🔌 Opened pooled API session (max {self.MAX_CONCURRENCY} connections)."
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the pooled API session and flush request telemetry."""
+        await self._db(self.stats.flush, self.db_api)
+        if self._db_executor is not None:
+            self._db_executor.shutdown(wait=True)
+            self._db_executor = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logfire.debug("🔌 Closed pooled API session.")
+        self._session = None
+        self._session_loop = None
+
+    async def _db(self, call: Callable[..., Any], *args: Any) -> Any:
+        """Run a DuckDB call on the client's writer thread and await its result.
+
+        DuckDB calls are synchronous; made on the event loop they stall every
+        in-flight request. One thread keeps the writes of concurrent syncs
+        (and their transactions) serialized.
+        """
+        if self._db_executor is None:
+            self._db_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="upgates-duckdb"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._db_executor, functools.partial(call, *args)
+        )
 
-                    # Insert prices
-                    for price in product.get("prices", []):
-                        currency = price.get("currency", "unknown")
-                        price_with_vat = next(
-                            (
-                                pl.get("price_with_vat", 0)
-                                for pl in price.get("pricelists", [])
-                            ),
-                            0.0,
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[int, bytes]:
+        """Send one API request through the quota scheduler.
+
+        429 responses are retried once the scheduler's `Retry-After` wait has
+        passed. Transient failures (connection errors, timeouts, 5xx) are retried
+        up to RETRY_LIMIT times with exponential backoff and jitter. Returns the
+        response status and raw body.
+        """
+        if self.replay:
+            raise CacheMiss(f"❌ Replay mode: {method} {endpoint} {params} not cached.")
+
+        session = await self._get_session()
+        url = f"{self.API_URL}/{endpoint}"
+        page = (params or {}).get("page")
+        throttled = failures = 0
+
+        while True:
+            try:
+                async with self.scheduler.slot():
+                    with logfire.span(
+                        "🌐 {method} {endpoint}",
+                        method=method,
+                        endpoint=endpoint,
+                        page=page,
+                    ) as span:
+                        started = time.monotonic()
+                        async with session.request(
+                            method, url, params=params, json=payload
+                        ) as response:
+                            body = await response.read()
+                            latency = time.monotonic() - started
+                            quota = self.scheduler.update(
+                                response.status, response.headers, latency=latency
+                            )
+                        sample = self.stats.record(
+                            RequestSample(
+                                endpoint=endpoint,
+                                method=method,
+                                page=page,
+                                status=response.status,
+                                bytes=len(body),
+                                latency_ms=latency * 1000,
+                                hour_remaining=quota.hour_remaining,
+                                day_remaining=quota.day_remaining,
+                            )
                         )
-                        self.db_api.insert_product_price(
-                            product_id, currency, price_with_vat
+                        span.set_attributes(
+                            {
+                                "status": sample.status,
+                                "bytes": sample.bytes,
+                                "latency_ms": round(sample.latency_ms, 1),
+                                "hour_remaining": sample.hour_remaining,
+                                "day_remaining": sample.day_remaining,
+                            }
                         )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                failures += 1
+                if failures > self.RETRY_LIMIT:
+                    raise
+                await self._backoff(method, endpoint, failures, repr(e))
+                continue
+
+            if response.status == 429:
+                throttled += 1
+                if throttled > self.RATE_LIMIT_RETRIES:
+                    raise RateLimitExceeded(
+                        f"❌ {method} {endpoint} still rate limited after "
+                        f"{self.RATE_LIMIT_RETRIES} retries. Quota: {self.quota}"
+                    )
+                continue
 
-                    # Insert images
-                    for image in product.get("images", []):
-                        file_id = image.get("file_id", None)
-                        url = image.get("url", "")
-                        main_yn = 1 if image.get("main_yn", False) else 0
-                        position = image.get("position", 0)
-                        self.db_api.insert_product_image(
-                            product_id, file_id, url, main_yn, position
-                        )
+            if response.status in TRANSIENT_STATUSES and failures < self.RETRY_LIMIT:
+                failures += 1
+                await self._backoff(
+                    method, endpoint, failures, f"HTTP {response.status}"
+                )
+                continue
 
-                    # Insert categories
-                    for category in product.get("categories", []):
-                        category_id = category.get("category_id")
-                        category_code = category.get("code", "")
-                        category_name = category.get("name", "")
-                        main_yn = 1 if category.get("main_yn", 0) else 0
-                        position = category.get("position", 0)
-                        self.db_api.insert_product_category(
-                            product_id,
-                            category_id,
-                            category_code,
-                            category_name,
-                            main_yn,
-                            position,
-                        )
+            return response.status, body
 
-                    # Insert metadata
-                    for meta in product.get("metas", []):
-                        meta_key = meta.get("key", "")
-                        meta_type = meta.get("type", "")
-                        meta_value = meta.get("value", "")
-                        self.db_api.insert_product_meta(
-                            product_id, meta_key, meta_type, meta_value
-                        )
+    async def _backoff(
+        self, method: str, endpoint: str, attempt: int, reason: str
+    ) -> None:
+        delay = backoff_delay(attempt, self.RETRY_BACKOFF, self.RETRY_MAX_BACKOFF)
+        logfire.warning(
+            f"⚠️ {method} {endpoint} failed ({reason}); "
+            f"retry {attempt}/{self.RETRY_LIMIT} in {delay:.1f}s"
+        )
+        await asyncio.sleep(delay)
+
+    async def sync_all(
+        self, page_count=None, incremental=False, check_budget=True, commit=None
+    ):
+        """Sync all data: products, customers, orders.
+
+        The three syncs download concurrently; their pages are written one
+        transaction at a time by the DuckDB writer thread (see `_db`).
+        """
+        mode = "incremental" if incremental else "full"
+        logfire.info(f"ℹ️ Starting {mode} API sync...")
+        if check_budget:
+            await self.check_budget(
+                ["products", "customers", "orders"], page_count, incremental
+            )
+        try:
+            await asyncio.gather(
+                self.sync_products(
+                    page_count=page_count,
+                    incremental=incremental,
+                    check_budget=False,
+                    commit=commit,
+                ),
+                self.sync_customers(page_count=page_count, incremental=incremental),
+                self.sync_orders(page_count=page_count, incremental=incremental),
+            )
+        finally:
+            self._probes.clear()
+
+    @staticmethod
+    def _probe_key(endpoint: str, params: Optional[Dict[str, Any]]) -> Tuple:
+        return endpoint, tuple(sorted((params or {}).items()))
+
+    async def plan_sync(
+        self, endpoints: List[str], page_count=None, incremental=False
+    ) -> SyncPlan:
+        """Estimate the requests a sync of `endpoints` needs against the quota.
+
+        Fetches page 1 of each endpoint for its `number_of_pages` (and the
+        quota headers); those pages are kept and reused by the sync itself.
+        """
+
+        async def probe(endpoint: str) -> int:
+            params = self._incremental_params(endpoint, incremental)
+            checkpoint = None if page_count else self._get_checkpoint(endpoint, params)
+            if checkpoint:
+                # An interrupted sync resumes; no probe needed
+                return checkpoint["number_of_pages"] - checkpoint["last_page"]
+            first = await self._get_page(endpoint, 1, params)
+            self._probes[self._probe_key(endpoint, params)] = first
+            total = first.get("number_of_pages", 1)
+            return (min(total, page_count) if page_count else total) - 1
+
+        remaining = await asyncio.gather(*(probe(e) for e in endpoints))
+        return plan_requests(
+            dict(zip(endpoints, remaining)),
+            self.quota,
+            reserve=self.scheduler.reserve,
+            max_wait=self.scheduler.max_wait,
+        )
+
+    async def check_budget(
+        self, endpoints: List[str], page_count=None, incremental=False
+    ) -> Optional[SyncPlan]:
+        """Plan a sync and refuse to start it if the quota cannot cover it."""
+        if self.replay:
+            return None
+        plan = await self.plan_sync(endpoints, page_count, incremental)
+        if plan.action == REFUSE:
+            self._probes.clear()
+            raise RateLimitExceeded(f"❌ Sync refused. {plan.describe()}")
+        logfire.info(f"📋 Sync plan: {plan.describe()}")
+        return plan
+
+    def _incremental_params(self, endpoint: str, incremental: bool) -> Dict[str, Any]:
+        """Query params limiting a sync to items changed since the last one."""
+        if not incremental:
+            return {}
+        watermark = self.db_api.get_sync_watermark(endpoint)
+        if not watermark:
+            logfire.info(f"ℹ️ No {endpoint} watermark yet; running a full sync.")
+            return {}
+        logfire.info(f"ℹ️ Incremental {endpoint} sync from {watermark}")
+        return {"last_update_time_from": watermark}
+
+    def _record_watermark(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        newest: Optional[str],
+        started: str,
+        items_synced: int,
+    ) -> None:
+        """Persist the high-water mark reached by a completed sync.
+
+        Falls back to the previous watermark when nothing changed, and to the
+        sync start time for endpoints whose items carry no `last_update_time`.
+        """
+        watermark = newest or params.get("last_update_time_from") or started
+        self.db_api.set_sync_watermark(endpoint, watermark, items_synced)
+
+    def _get_checkpoint(
+        self, endpoint: str, params: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Checkpoint of an interrupted sync of `endpoint` with the same params."""
+        return self.db_api.get_sync_checkpoint(
+            endpoint, dumps(dict(sorted(params.items()))), self.CHECKPOINT_MAX_AGE_HOURS
+        )
+
+    async def _sync_pages(
+        self,
+        endpoint: str,
+        store: Optional[Callable[[List[Dict[str, Any]]], int]] = None,
+        page_count: Optional[int] = None,
+        incremental: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+        finish: Optional[Callable[[], Any]] = None,
+    ) -> Tuple[int, int]:
+        """Page through an endpoint, storing each page as it arrives.
+
+        Downloads and writes overlap: a fetcher task pushes decoded pages into a
+        bounded queue (WRITE_QUEUE_PAGES) and the pages are stored on the DuckDB
+        writer thread; when the writer falls behind the queue fills up and the
+        downloads pause.
+
+        Each page is stored in one transaction together with a checkpoint, so
+        a sync that is interrupted (eg. at page 180 of 220) resumes from the
+        next page on the following run instead of starting over. `finish` runs
+        in the same transaction that records a complete sync's watermark.
+        Returns (items fetched, rows stored).
+        """
+        started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        since = await self._db(self._incremental_params, endpoint, incremental)
+        params = {**since, **(filters or {})}
+        key = endpoint.split("/")[0]
+        newest = None
+        fetched = stored = 0
+        start_page = 1
+
+        # Limited runs (--page-count) neither resume nor leave checkpoints
+        checkpoint = (
+            None
+            if page_count
+            else await self._db(self._get_checkpoint, endpoint, params)
+        )
+        if checkpoint:
+            start_page = checkpoint["last_page"] + 1
+            started = checkpoint["started"]
+            newest = checkpoint["last_update_time"]
+            fetched = checkpoint["items_synced"]
+            logfire.info(
+                f"⏯️ Resuming {endpoint} sync from page {start_page}/"
+                f"{checkpoint['number_of_pages']} ({fetched} items already stored)."
+            )
 
-                    # Insert VAT details
-                    for vat_country, vat_percentage in product.get("vats", {}).items():
-                        self.db_api.insert_product_vat(
-                            product_id, vat_country, vat_percentage
+        if not checkpoint or start_page <= checkpoint["number_of_pages"]:
+            queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.WRITE_QUEUE_PAGES))
+            fetcher = asyncio.ensure_future(
+                self._fetch_pages(queue, endpoint, params, page_count, start_page)
+            )
+            page_number = start_page
+            try:
+                while (page := await queue.get()) is not None:
+                    if isinstance(page, Exception):
+                        raise page  # after the pages fetched before it are stored
+                    items = page.get(key, [])
+                    if not items:
+                        logfire.warning(
+                            f"⚠️ No {key} found on page {page.get('current_page')}."
+                        )
+                    newest = newest_update_time(items, newest)
+                    fetched += len(items)
+                    progress = None
+                    if not page_count:
+                        progress = (
+                            endpoint,
+                            dumps(dict(sorted(params.items()))),
+                            page_number,
+                            page.get("number_of_pages", 1),
+                            started,
+                            newest,
+                            fetched,
                         )
+                    rows, seconds = await self._db(
+                        self._write_page, store if items else None, items, progress
+                    )
+                    stored += rows
+                    if seconds is not None:
+                        self.stats.add_timing(endpoint, page_number, "store", seconds)
+                    logfire.info(
+                        f"Processed {len(items)} {key} from {endpoint} page "
+                        f"{page.get('current_page')}/{page.get('number_of_pages')}"
+                    )
+                    page_number += 1
+            finally:
+                fetcher.cancel()
+                # Let the fetcher unwind (in-flight requests, queue puts) first
+                await asyncio.gather(fetcher, return_exceptions=True)
+
+        await self._db(
+            self._finish_sync,
+            endpoint,
+            params,
+            page_count,
+            filters,
+            finish,
+            (newest, started, fetched),
+        )
+        return fetched, stored
+
+    async def _fetch_pages(
+        self,
+        queue: asyncio.Queue,
+        endpoint: str,
+        params: Dict[str, Any],
+        page_count: Optional[int],
+        start_page: int,
+    ) -> None:
+        """Feed the pages of a sync into `queue`, then None (or the error)."""
+        try:
+            async for page in self.iter_pages(
+                endpoint, params=params, page_count=page_count, start_page=start_page
+            ):
+                await queue.put(page)
+        except Exception as error:
+            await queue.put(error)
+        else:
+            await queue.put(None)
 
-                logfire.info(
-                    f"Product sync complete. {len(products)} products fetched and inserted."
+    def _write_page(
+        self,
+        store: Optional[Callable[[List[Dict[str, Any]]], int]],
+        items: List[Dict[str, Any]],
+        progress: Optional[Tuple],
+    ) -> Tuple[int, Optional[float]]:
+        """Store one page and its checkpoint atomically (on the writer thread).
+
+        Returns (rows stored, seconds spent storing or None).
+        """
+        rows, seconds = 0, None
+        # A page's rows and its checkpoint are committed together
+        with self.db_api.transaction():
+            if store:
+                started_store = time.monotonic()
+                rows = store(items)
+                seconds = time.monotonic() - started_store
+            if progress:
+                self.db_api.set_sync_checkpoint(*progress)
+        return rows, seconds
+
+    def _finish_sync(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        page_count: Optional[int],
+        filters: Optional[Dict[str, Any]],
+        finish: Optional[Callable[[], Any]],
+        progress: Tuple,
+    ) -> None:
+        """Run `finish` and record a complete sync (on the writer thread)."""
+        newest, started, fetched = progress
+        with self.db_api.transaction():
+            if finish:
+                finish()
+            if page_count is None:
+                if not filters:
+                    self._record_watermark(endpoint, params, newest, started, fetched)
+                self.db_api.clear_sync_checkpoint(endpoint)
+        self.stats.flush(self.db_api, keep_pending=True)
+
+    async def sync_products(
+        self, page_count=None, incremental=False, check_budget=True, commit=None
+    ):
+        """Sync products from the Upgates.cz API.
+
+        With `commit="page"` (default: UPGATES_SYNC_COMMIT) every page is
+        committed atomically as it arrives. With `commit="run"` pages are
+        collected in staging tables and merged in one transaction at the end,
+        so readers never see a partially synced catalog.
+        """
+        logfire.info("Fetching product data...")
+        commit = commit or self.SYNC_COMMIT
+        try:
+            if check_budget:
+                await self.check_budget(["products"], page_count, incremental)
+            if commit == "run":
+                params = await self._db(
+                    self._incremental_params, "products", incremental
+                )
+                checkpoint = await self._db(self._get_checkpoint, "products", params)
+                if page_count or not checkpoint:
+                    await self._db(self.db_api.reset_product_staging)
+                total, _ = await self._sync_pages(
+                    "products",
+                    self._stage_products,
+                    page_count,
+                    incremental,
+                    finish=self._commit_staged_products,
                 )
             else:
-                logfire.warning("No product data found to sync.")
+                total, _ = await self._sync_pages(
+                    "products", self._store_products, page_count, incremental
+                )
+        finally:
+            if check_budget:
+                self._probes.clear()
+
+        if total:
+            logfire.info(
+                f"Product sync complete. {total} products fetched and inserted."
+            )
+        elif incremental:
+            logfire.info("No products changed since the last sync.")
         else:
-            logfire.warning("Failed to fetch product data.")
+            logfire.warning("No product data found to sync.")
 
-    async def sync_customers(self, page_count=None):
-        """Sync customer data from the API."""
-        logfire.info("ℹ️ Fetching customer data...")
-        all_customers = []
-        page = 1
+    def _store_products(self, products: List[Dict[str, Any]]) -> int:
+        """Load one page of API products and their child rows into DuckDB.
 
-        while True:
-            customers_response = await self.fetch_data("customers", page, page_count)
-            if (
-                isinstance(customers_response, dict)
-                and "customers" in customers_response
-            ):
-                customers = customers_response["customers"]
-                if customers:
-                    all_customers.extend(customers)
-                    logfire.info(f"Fetched {len(customers)} items from page {page}")
-
-                    total_pages = customers_response.get("number_of_pages", 0)
-                    if page >= total_pages:
-                        logfire.debug(
-                            f"✅ All pages fetched. Total pages: {total_pages}"
-                        )
-                        break
-                    page += 1
-                else:
-                    logfire.warning(f"⚠️ No customers found on page {page}.")
-                    break
-            else:
-                logfire.error(
-                    f"❌ Customers data is missing in response for page {page}."
+        The page is flattened into one DataFrame per table and written with a
+        few set-based statements rather than one query per row.
+        """
+        batch = product_frames(products)
+        written = self.db_api.upsert_product_batch(batch)
+        logfire.debug(f"💾 Stored product page: {written}")
+        return len(batch.products)
+
+    def _stage_products(self, products: List[Dict[str, Any]]) -> int:
+        """Collect one page of products in the staging tables (commit per run)."""
+        return self.db_api.stage_product_batch(product_frames(products))
+
+    def _commit_staged_products(self) -> None:
+        written = self.db_api.commit_product_staging()
+        logfire.info(f"💾 Committed staged product sync: {written}")
+
+    async def sync_stock_prices(
+        self, page_count=None, incremental=False, in_stock=None
+    ):
+        """Refresh product stock, availability and prices only.
+
+        Reads the slim `products/simple` and `products/prices` endpoints instead
+        of full product pages (descriptions, images, metas), so it is cheap
+        enough to run every few minutes. Products must already exist locally;
+        unknown products are skipped until the next full product sync.
+        """
+        logfire.info("ℹ️ Refreshing product stock and prices...")
+        filters = {} if in_stock is None else {"in_stock_yn": int(bool(in_stock))}
+        stock, prices = await asyncio.gather(
+            self._sync_slim_products(
+                "products/simple", self._store_stock, page_count, incremental, filters
+            ),
+            self._sync_slim_products(
+                "products/prices", self._store_prices, page_count, incremental, filters
+            ),
+        )
+        logfire.info(
+            f"✅ Stock and price refresh complete. {stock} stock rows, "
+            f"{prices} price rows updated."
+        )
+
+    async def _sync_slim_products(
+        self, endpoint, store, page_count, incremental, filters
+    ) -> int:
+        """Page through a `products/*` sub-endpoint, storing each page."""
+        fetched, stored = await self._sync_pages(
+            endpoint, store, page_count, incremental, filters
+        )
+        logfire.info(f"Fetched {fetched} products from {endpoint}.")
+        return stored
+
+    def _store_stock(self, products: List[Dict[str, Any]]) -> int:
+        """Update stock and availability from one `products/simple` page."""
+        stock = pd.DataFrame(
+            [
+                (
+                    p.get("product_id"),
+                    p.get("stock"),
+                    p.get("availability", ""),
+                    p.get("availability_type", ""),
                 )
-                break
+                for p in products
+            ],
+            columns=["product_id", "stock", "availability", "availability_type"],
+        )
+        return self.db_api.update_product_stock(stock)
 
-        # FIXME
-        # We need to come back to this later
+    def _store_prices(self, products: List[Dict[str, Any]]) -> int:
+        """Replace prices from one `products/prices` page.
 
-        # if all_customers:
-        #    self.db_api.insert_customers(all_customers)
-        #    logfire.info(
-        #        f"✅ Customer sync complete. {len(all_customers)} customers fetched and inserted."
-        #    )
+        Like a full product sync, each currency stores the `price_with_vat` of
+        its first pricelist.
+        """
+        prices = pd.DataFrame(
+            [
+                (
+                    p.get("product_id"),
+                    price.get("currency", "unknown"),
+                    next(
+                        (
+                            pl.get("price_with_vat", 0)
+                            for pl in price.get("pricelists", [])
+                        ),
+                        0.0,
+                    ),
+                )
+                for p in products
+                for price in p.get("prices", [])
+            ],
+            columns=["product_id", "currency", "price_with_vat"],
+        )
+        return self.db_api.replace_product_prices(
+            prices, [p.get("product_id") for p in products]
+        )
 
-    async def sync_orders(self):
-        """Sync order data from the API."""
-        logfire.info("ℹ️ Fetching order data...")
-        all_orders = []
-        page = 1
+    async def sync_customers(self, page_count=None, incremental=False):
+        """Sync customer data from the API."""
+        logfire.info("ℹ️ Fetching customer data...")
+        total, stored = await self._sync_pages(
+            "customers", self._store_customers, page_count, incremental
+        )
+        logfire.info(
+            f"✅ Customer sync complete. {total} customers fetched, {stored} stored."
+        )
 
-        while True:
-            orders_response = await self.fetch_data("orders", page)
-            if isinstance(orders_response, dict) and "orders" in orders_response:
-                orders = orders_response["orders"]
-                if orders:
-                    all_orders.extend(orders)
-                    logfire.info(f"Fetched {len(orders)} items from page {page}")
-
-                    total_pages = orders_response.get("number_of_pages", 0)
-                    if page >= total_pages:
-                        logfire.debug(
-                            f"✅ All pages fetched. Total pages: {total_pages}"
-                        )
-                        break
-                    page += 1
-                else:
-                    logfire.warning(f"⚠️ No orders found on page {page}.")
-                    break
-            else:
-                logfire.error(f"❌ Orders data is missing in response for page {page}.")
-                break
+    def _store_customers(self, customers: List[Dict[str, Any]]) -> int:
+        """Upsert one page of API customers into DuckDB."""
+        return self.db_api.upsert_customers(customer_frames(customers))
 
-        # if all_orders:
-        #     self.db_api.insert_orders(all_orders)
-        #     logfire.info(
-        #         f"✅ Order sync complete. {len(all_orders)} orders fetched and inserted."
-        #     )
+    async def sync_orders(self, page_count=None, incremental=False):
+        """Sync order data (with order lines) from the API."""
+        logfire.info("ℹ️ Fetching order data...")
+        total, stored = await self._sync_pages(
+            "orders", self._store_orders, page_count, incremental
+        )
+        logfire.info(
+            f"✅ Order sync complete. {total} orders fetched, {stored} stored."
+        )
 
-    async def sync_parameters(self):
-        """Sync parameter data from the API."""
+    def _store_orders(self, orders: List[Dict[str, Any]]) -> int:
+        """Upsert one page of API orders and replace their lines in DuckDB."""
+        written = self.db_api.upsert_order_batch(order_frames(orders))
+        logfire.debug(f"💾 Stored order page: {written}")
+        return written["orders"]
+
+    async def sync_parameters(
+        self, page_count=None, incremental=False, with_products=True
+    ):
+        """Sync parameters, their values and (optionally) product parameter links.
+
+        Parameter definitions come from `/parameters`; which values each
+        product has comes from `/products/parameters`, which lists every
+        product's parameters in one paged endpoint, so nothing is fetched per
+        product. `incremental` applies to the product links only (the
+        `/parameters` list has no change filter).
+        """
         logfire.info("ℹ️ Fetching parameter data...")
-        page = 1
+        total, stored = await self._sync_pages(
+            "parameters", self._store_parameters, page_count
+        )
+        logfire.info(
+            f"✅ Parameter sync complete. {total} parameters fetched, {stored} stored."
+        )
+        if with_products:
+            total, stored = await self._sync_pages(
+                "products/parameters",
+                self._store_product_parameters,
+                page_count,
+                incremental,
+            )
+            logfire.info(
+                f"✅ Product parameter sync complete. {total} products fetched, "
+                f"{stored} parameter links written."
+            )
 
-        while True:
-            parameters_response = await self.fetch_data("parameters", page)
-            if (
-                isinstance(parameters_response, dict)
-                and "parameters" in parameters_response
-            ):
-                parameters = parameters_response["parameters"]
-                if parameters:
-                    logfire.info(f"Fetched {len(parameters)} items from page {page}")
-                    logfire.debug(
-                        f"Inserting {len(parameters)} parameters into the database."
-                    )
+    def _store_parameters(self, parameters: List[Dict[str, Any]]) -> int:
+        """Upsert one `/parameters` page with its values and descriptions."""
+        written = self.db_api.upsert_parameter_batch(parameter_frames(parameters))
+        logfire.debug(f"💾 Stored parameter page: {written}")
+        return written["parameters"]
+
+    def _store_product_parameters(self, products: List[Dict[str, Any]]) -> int:
+        """Replace the parameter value links of one `/products/parameters` page."""
+        ids = [p["product_id"] for p in products if p.get("product_id") is not None]
+        inserted, deleted = self.db_api.replace_product_parameters(
+            product_parameter_frames(products), ids
+        )
+        return inserted + deleted
 
-                    parameters = Parameters(
-                        parameters=[Parameter(**parameter) for parameter in parameters]
-                    )
+    async def _get_page(
+        self, endpoint: str, page: int, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Fetch and decode a single page of an endpoint.
 
-                    import ipdb
+        Concurrent calls for the same page and params share one request
+        (single-flight): the sync, the scheduler's stock refresh and a
+        translation job asking at once cost one unit of quota, and all get the
+        same decoded page, which callers must not modify.
+        """
+        query = {**(params or {}), "page": page}
+        if page == 1:
+            probe = self._probes.pop(self._probe_key(endpoint, params), None)
+            if probe is not None:
+                return probe
+
+        key = self._probe_key(endpoint, query)
+        flight = self._flights.get(key)
+        if flight is None or flight.task.get_loop() is not asyncio.get_running_loop():
+            flight = _Flight(asyncio.ensure_future(self._fetch_page(endpoint, query)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(
+                lambda _: (
+                    self._flights.pop(key, None)
+                    if self._flights.get(key) is flight
+                    else None
+                )
+            )
+        else:
+            self.coalesced += 1
+            logfire.debug(f"🔗 Joined in-flight request for page {page} of {endpoint}")
 
-                    ipdb.set_trace()
-                    # self.db_api.insert_parameters(parameters)
+        flight.waiters += 1
+        try:
+            # Shielded, so one caller giving up does not cancel the others' request
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
 
-                    total_pages = parameters_response.get("number_of_pages", 0)
-                    if page >= total_pages:
-                        logfire.debug(
-                            f"✅ All pages fetched. Total pages: {total_pages}"
-                        )
-                        break
-                    page += 1
-                else:
-                    logfire.warning(f"⚠️ No parameters found on page {page}.")
-                    break
-            else:
-                logfire.error(
-                    f"❌ Parameters data is missing in response for page {page}."
+    async def _fetch_page(self, endpoint: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch (or read from the cache) and decode one page."""
+        page = query["page"]
+        try:
+            body = None
+            if self.cache:
+                started = time.monotonic()
+                body = await asyncio.to_thread(
+                    self.cache.get, endpoint, query, self.replay
                 )
-                break
+                if body is not None:
+                    self.stats.record(
+                        RequestSample(
+                            endpoint=endpoint,
+                            page=page,
+                            status=200,
+                            bytes=len(body),
+                            latency_ms=(time.monotonic() - started) * 1000,
+                            cached=True,
+                        )
+                    )
 
-    async def fetch_data(self, endpoint, page=1, page_count=None) -> dict[str, Any]:
-        """Fetch data from the API with retries and handle pagination with rate-limiting."""
-        all_data = []
+            if body is None:
+                logfire.debug(f"🔄 Fetching page {page} of {endpoint}")
+                status, body = await self._request("GET", endpoint, params=query)
+                logfire.debug(f"✅ Received response status: {status} for page {page}")
+                if status != 200:
+                    raise RuntimeError(
+                        f"Unexpected response status {status}: {body[:200]!r}"
+                    )
+                if self.cache:
+                    await asyncio.to_thread(self.cache.put, endpoint, query, body)
+
+            # Decode the raw bytes once; never stringify multi-MB pages for the log
+            started = time.monotonic()
+            data = loads(body)
+            self.stats.add_timing(endpoint, page, "decode", time.monotonic() - started)
+            logfire.debug(
+                f"📊 Decoded page {page} of {endpoint}: {len(body)} bytes, "
+                f"{len(data.get(endpoint.split('/')[0]) or [])} items"
+            )
+            return data
 
-        async def fetch_page(page_number: int):
-            """Fetch a single page of data."""
-            try:
-                logfire.debug(f"🔄 Fetching page {page_number} of {endpoint}")
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{self.API_URL}/{endpoint}?page={page_number}",
-                        auth=aiohttp.BasicAuth(self.LOGIN, self.API_KEY),
-                        ssl=self.VERIFY_SSL,
-                    ) as response:
-                        logfire.debug(
-                            f"✅ Received response status: {response.status} for page {page_number}"
-                        )
+        except Exception as e:
+            logfire.warning(f"⚠️ Failed to fetch page {page} of {endpoint}: {e}")
+            raise
 
-                        if response.status == 429:
-                            raise RuntimeError("Rate limit exceeded. Retry later.")
-                            # If rate limit exceeded, extract Retry-After header and wait
-                            # retry_after = response.headers.get(
-                            #    "Retry-After", 60
-                            # )  # Default to 60 seconds if not provided
-                            # await asyncio.sleep(int(retry_after))  # Wait for retry time
-                            # return await fetch_page(page_number)  # Retry the same page
-
-                        # Parse the response
-                        data = await response.json()
-                        logfire.debug(f"📊 Response data: {data}")
-
-                        # Handle the response depending on the endpoint
-                        match endpoint:
-                            case "products":
-                                items = data.get("products", [])
-                            case "customers":
-                                items = data.get("customers", [])
-                            case "orders":
-                                items = data.get("orders", [])
-                            case "parameters":
-                                items = data.get("parameters", [])
-                            case _:
-                                logfire.error(
-                                    f"❌ Unexpected endpoint {endpoint}. Aborting."
-                                )
-                                import ipdb
-
-                                ipdb.set_trace()
-                                return [], 0
-
-                        return items, data.get("number_of_pages", 1)
-
-            except Exception as e:
-                logfire.warning(
-                    f"⚠️ Failed to fetch page {page_number} of {endpoint}: {e}"
-                )
-                raise
+    async def iter_pages(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        page_count: Optional[int] = None,
+        start_page: int = 1,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the decoded pages of an endpoint in page order.
+
+        Page 1 reveals the page count; later pages are prefetched concurrently
+        (bounded by the scheduler) but at most PREFETCH_PAGES ahead of the
+        consumer, so memory stays flat while downloads overlap processing.
+        """
+        first = await self._get_page(endpoint, start_page, params)
+        total_pages = first.get("number_of_pages", 1)
+        last_page = min(total_pages, page_count) if page_count else total_pages
+        yield first
 
-        # Fetch pages sequentially or up to the specified `page_count`
-        page = 1
-        while True:
-            items, total_pages = await fetch_page(page)
-            all_data.extend(items)
+        pending: Deque[asyncio.Task] = deque()
+        next_page = start_page + 1
+        try:
+            while pending or next_page <= last_page:
+                while next_page <= last_page and len(pending) < self.PREFETCH_PAGES:
+                    pending.append(
+                        asyncio.ensure_future(
+                            self._get_page(endpoint, next_page, params)
+                        )
+                    )
+                    next_page += 1
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
-            # If page_count is provided, stop after reaching the specified number of pages
-            if page_count and page >= page_count:
-                logfire.debug(
-                    f"✅ Reached the requested page count of {page_count}. Stopping."
-                )
-                break
+        logfire.debug(f"✅ All pages fetched. Total pages: {last_page}")
+        logfire.debug(f"📉 API quota: {self.quota}")
+
+    async def fetch_data(self, endpoint, page=1, page_count=None) -> dict[str, Any]:
+        """Fetch all pages of an endpoint into a single response dict.
 
-            # If all pages are fetched, stop
-            match page >= total_pages:
-                case True:
-                    logfire.debug(f"✅ All pages fetched. Total pages: {total_pages}")
-                    break
-                case False:
-                    page += 1  # Go to the next page
+        Prefer `iter_pages()`, which does not hold the whole dataset in memory.
+        """
+        all_data = []
+        async for data in self.iter_pages(
+            endpoint, page_count=page_count, start_page=page
+        ):
+            all_data.extend(data.get(endpoint.split("/")[0], []))
 
         logfire.info(f"✅ All pages fetched. Total items: {len(all_data)}")
         return {endpoint: all_data}
 
+    async def fetch_products(
+        self, codes: List[str], endpoint: str = "products"
+    ) -> List[Dict[str, Any]]:
+        """Fetch products by code (`?codes=`), eg. for a webhook or translation.
+
+        Codes are sorted, so concurrent lookups of the same products share one
+        in-flight request.
+        """
+        params = {"codes": ";".join(sorted(set(codes)))}
+        products: List[Dict[str, Any]] = []
+        async for page in self.iter_pages(endpoint, params=params):
+            products.extend(page.get("products", []))
+        return products
+
+    async def verify_cache(self, repair: bool = True) -> CacheDrift:
+        """Find products that drifted from the shop and (optionally) repair them.
+
+        Lists `products/simple` (codes, ids, `last_update_time`) and compares
+        it with the local products table. With `repair`, missing and stale
+        products are re-fetched in `?codes=` batches of VERIFY_BATCH_SIZE and
+        products deleted remotely are removed locally.
+        """
+        logfire.info("🔎 Verifying the product cache against products/simple...")
+        rows = []
+        async for page in self.iter_pages("products/simple"):
+            rows.extend(
+                (p.get("product_id"), p.get("code"), p.get("last_update_time"))
+                for p in page.get("products", [])
+            )
+        listing = pd.DataFrame(
+            rows, columns=["product_id", "code", "last_update_time"]
+        ).dropna(subset=["product_id"])
+        frame = await self._db(self.db_api.compare_product_listing, listing)
+        drift = CacheDrift.from_frame(listing["product_id"].nunique(), frame)
+        logfire.info(f"🔎 {drift.describe()}")
+        if not repair or drift.in_sync:
+            return drift
+
+        codes = drift.refetch
+        batches = [
+            codes[i : i + self.VERIFY_BATCH_SIZE]
+            for i in range(0, len(codes), self.VERIFY_BATCH_SIZE)
+        ]
+        for products in await asyncio.gather(*map(self.fetch_products, batches)):
+            if products:
+                batch = product_frames(products)
+                written = await self._db(self.db_api.upsert_product_batch, batch)
+                drift.refetched += written["products"]
+                drift.unchanged += written["unchanged"]
+        drift.removed = await self._db(self.db_api.delete_products, drift.deleted)
+        drift.repaired = True
+        logfire.info(f"🛠️ {drift.describe()}")
+        return drift
+
     async def translate_product(
         self, product_code: str, target_lang: str, prompt: str
     ) -> dict:
@@ -534,75 +1146,94 @@ class UpgatesClient:
         logfire.info("DuckDB instance updated with new translation fields.")
         return ai_dump
 
-    async def save_translation(self, product_code: str, target_lang: str = "cz"):
-        """Save the translated product back to Upgates API."""
-        target_lang = target_lang.lower().strip()
-        logfire.info(
-            f"Saving '{target_lang}' translations for product '{product_code}' back to Upgates.cz API"
-        )
-
+    async def _translation_entry(
+        self, product_code: str, target_langs: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Build the PUT payload entry with a product's stored translations."""
         product_details = await self.db_api.get_product_details(product_code)
-        if product_details.empty:
+        if product_details is None or product_details.empty:
             logfire.error(f"Product '{product_code}' not found in local database.")
-            return
+            return None
 
         product = product_details.iloc[0]
         descriptions = product.get("descriptions", [])
-        if not descriptions:
-            logfire.error("No descriptions found for the product.")
-            return
-        desc_matched = [
-            d
-            for d in descriptions
-            if d.get("language").lower().strip() == target_lang.lower().strip()
-        ]
-        translations = desc_matched[0] if desc_matched else None
+        if not isinstance(descriptions, list) or not descriptions:
+            logfire.error(f"No descriptions found for the product '{product_code}'.")
+            return None
 
+        langs = [lang.lower().strip() for lang in target_langs]
+        translations = [
+            d for d in descriptions if d.get("language").lower().strip() in langs
+        ]
         if not translations:
-            logfire.error("No translation found to save for the product.")
-            return
+            logfire.error(
+                f"No translation found to save for the product '{product_code}'."
+            )
+            return None
 
-        # Corrected payload structure
-        payload = {
-            "products": [
+        return {
+            "code": product_code,
+            "descriptions": [
                 {
-                    "code": product_code,
-                    "descriptions": [
-                        {
-                            "language": translations.get("language"),
-                            "active_yn": True,  # optional, default is TRUE
-                            "title": translations.get("title")
-                            or translations.get("seo_title"),
-                            "short_description": translations.get("short_description"),
-                            "long_description": translations.get("long_description"),
-                            "seo_description": translations.get("seo_description"),
-                            "seo_keywords": translations.get("seo_keywords"),
-                            "seo_title": translations.get("seo_title"),
-                            "seo_url": translations.get(
-                                "seo_url"
-                            ),  # optional if needed
-                        }
-                    ],
+                    "language": translation.get("language"),
+                    "active_yn": True,  # optional, default is TRUE
+                    "title": translation.get("title") or translation.get("seo_title"),
+                    "short_description": translation.get("short_description"),
+                    "long_description": translation.get("long_description"),
+                    "seo_description": translation.get("seo_description"),
+                    "seo_keywords": translation.get("seo_keywords"),
+                    "seo_title": translation.get("seo_title"),
+                    "seo_url": translation.get("seo_url"),  # optional if needed
                 }
-            ]
+                for translation in translations
+            ],
         }
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.API_URL}/products/{product_code}"
-            auth = aiohttp.BasicAuth(self.LOGIN, self.API_KEY)
-            async with session.put(
-                url, json=payload, auth=auth, ssl=self.VERIFY_SSL
-            ) as resp:
-                if resp.status == 200:
-                    logfire.info(
-                        "Product translations saved to Upgates.cz API successfully."
-                    )
-                    return await resp.json()
-                else:
-                    error_text = await resp.text()
-                    raise RuntimeError(
-                        f"🔥 [{product_code}] Failed to save translation. Status: {resp.status} - {error_text}"
-                    )
+    async def save_products(self, products: List[Dict[str, Any]]) -> SaveResult:
+        """Save product payload entries in batched `PUT /products` requests."""
+        return await self.writer.save(products)
+
+    async def save_translations(
+        self, product_codes: List[str], target_langs: List[str]
+    ) -> SaveResult:
+        """Save the stored translations of many products back to the Upgates API.
+
+        Each product's languages share one payload entry and up to 100 products
+        share one PUT request; only products that fail are re-sent.
+        """
+        logfire.info(
+            f"Saving {target_langs} translations for {len(product_codes)} products "
+            "back to Upgates.cz API"
+        )
+        entries = []
+        for code in dict.fromkeys(product_codes):
+            entry = await self._translation_entry(code, target_langs)
+            if entry:
+                entries.append(entry)
+        return await self.save_products(entries)
+
+    async def save_translation(self, product_code: str, target_lang: str = "cz"):
+        """Save the translated product back to Upgates API."""
+        target_lang = target_lang.lower().strip()
+        logfire.info(
+            f"Saving '{target_lang}' translations for product '{product_code}' back to Upgates.cz API"
+        )
+
+        entry = await self._translation_entry(product_code, [target_lang])
+        if not entry:
+            return
+
+        result = await self.save_products([entry])
+        if result.ok:
+            logfire.info("Product translations saved to Upgates.cz API successfully.")
+            return result
+        else:
+            error_text = "; ".join(
+                m.get("message", "") for m in result.failed[product_code]
+            )
+            raise RuntimeError(
+                f"🔥 [{product_code}] Failed to save translation. {error_text}"
+            )
 
 
 # EOF
@@ -52,10 +52,58 @@ UPGATES_API_URL = os.getenv("UPGATES_API_URL", "")
 UPGATES_LOGIN = os.getenv("UPGATES_LOGIN", "")
 UPGATES_API_KEY = os.getenv("UPGATES_API_KEY", "")
 UPGATES_SYNC_INTERVAL_MINUTES = int(os.getenv("UPGATES_SYNC_INTERVAL_MINUTES", "10"))
-UPGATES_API_RETRY_LIMIT = int(os.getenv("UPGATES_API_RETRY_LIMIT", "1"))
+# Retries of transient failures (connection errors, timeouts, 5xx), with
+# exponential backoff and full jitter between UPGATES_API_RETRY_BACKOFF seconds
+# and UPGATES_API_RETRY_MAX_BACKOFF seconds
+UPGATES_API_RETRY_LIMIT = int(os.getenv("UPGATES_API_RETRY_LIMIT", "3"))
+UPGATES_API_RETRY_BACKOFF = float(os.getenv("UPGATES_API_RETRY_BACKOFF", "1"))
+UPGATES_API_RETRY_MAX_BACKOFF = float(os.getenv("UPGATES_API_RETRY_MAX_BACKOFF", "30"))
+# Interrupted syncs resume from their last stored page within this many hours
+UPGATES_CHECKPOINT_MAX_AGE_HOURS = float(
+    os.getenv("UPGATES_CHECKPOINT_MAX_AGE_HOURS", "24")
+)
+# Product sync commits: "page" (each page atomically) or "run" (staged, all at once)
+UPGATES_SYNC_COMMIT = os.getenv("UPGATES_SYNC_COMMIT", "page").lower()
 UPGATES_VERIFY_SSL = (
     1 if os.getenv("UPGATES_VERIFY_SSL", "1").lower() in ("1", "true") else 0
 )
+# Upgates allows at most 3 concurrent requests per API access group
+UPGATES_API_MAX_CONCURRENCY = int(os.getenv("UPGATES_API_MAX_CONCURRENCY", "3"))
+UPGATES_API_TIMEOUT = float(os.getenv("UPGATES_API_TIMEOUT", "60"))
+UPGATES_DNS_CACHE_TTL = int(os.getenv("UPGATES_DNS_CACHE_TTL", "300"))
+UPGATES_KEEPALIVE_TIMEOUT = float(os.getenv("UPGATES_KEEPALIVE_TIMEOUT", "30"))
+# Share the concurrency limit and quota with other processes on this host
+UPGATES_COORDINATOR = os.getenv("UPGATES_COORDINATOR", "1").lower() in ("1", "true")
+# Requests kept back from syncs (eg. for order processing) and max quota wait
+UPGATES_QUOTA_RESERVE = int(os.getenv("UPGATES_QUOTA_RESERVE", "0"))
+UPGATES_QUOTA_MAX_WAIT = float(os.getenv("UPGATES_QUOTA_MAX_WAIT", "3600"))
+UPGATES_RATE_LIMIT_RETRIES = int(os.getenv("UPGATES_RATE_LIMIT_RETRIES", "5"))
+# Pages downloaded ahead of the consumer while streaming a sync
+UPGATES_PREFETCH_PAGES = int(
+    os.getenv("UPGATES_PREFETCH_PAGES", str(2 * UPGATES_API_MAX_CONCURRENCY))
+)
+# Decoded pages queued for the DuckDB writer thread before downloads pause
+UPGATES_WRITE_QUEUE_PAGES = int(os.getenv("UPGATES_WRITE_QUEUE_PAGES", "4"))
+# On-disk API response cache; TTLs in seconds, per endpoint as "products=3600,..."
+UPGATES_HTTP_CACHE = os.getenv("UPGATES_HTTP_CACHE", "").lower() in ("1", "true")
+UPGATES_HTTP_CACHE_TTL = float(os.getenv("UPGATES_HTTP_CACHE_TTL", "900"))
+UPGATES_HTTP_CACHE_TTLS = os.getenv(
+    "UPGATES_HTTP_CACHE_TTLS",
+    "parameters=86400,products=3600,products/simple=120,products/prices=300",
+)
+# Back off concurrency when a response is this many times slower than average
+UPGATES_LATENCY_SPIKE_FACTOR = float(os.getenv("UPGATES_LATENCY_SPIKE_FACTOR", "3"))
+# Days of API request telemetry kept in DuckDB for `upgates stats`
+UPGATES_TELEMETRY_DAYS = int(os.getenv("UPGATES_TELEMETRY_DAYS", "30"))
+# Request samples buffered in memory between flushes (oldest dropped beyond this)
+UPGATES_TELEMETRY_MAX_SAMPLES = int(os.getenv("UPGATES_TELEMETRY_MAX_SAMPLES", "10000"))
+# Products per batched PUT (API maximum is 100) and retries of failed products
+UPGATES_PUT_BATCH_SIZE = int(os.getenv("UPGATES_PUT_BATCH_SIZE", "100"))
+UPGATES_PUT_RETRIES = int(os.getenv("UPGATES_PUT_RETRIES", "2"))
+# Product codes per `?codes=` request when verify-cache re-fetches drifted products
+UPGATES_VERIFY_BATCH_SIZE = int(os.getenv("UPGATES_VERIFY_BATCH_SIZE", "50"))
+# Scheduler interval of the stock & price refresh (products/simple, products/prices)
+UPGATES_STOCK_SYNC_MINUTES = int(os.getenv("UPGATES_STOCK_SYNC_MINUTES", "5"))
 
 # Open AI
 OPENAI_ENABLED = os.getenv("OPENAI_ENABLED", "").lower() in ("1", "true")
@@ -78,6 +126,8 @@ output_path = data_path / "output"
 logs_path = data_path / "logs"
 db_path = data_path / "db"
 cache_path = data_path / "cache"
+http_cache_path = cache_path / "http"
+coordinator_path = data_path / "coordinator"
 
 db_file = __name__.split(".")[0] + ".db"
 default_db_path = db_path / db_file
@@ -90,6 +140,8 @@ sys_dirs = [
     logs_path,
     db_path,
     cache_path,
+    http_cache_path,
+    coordinator_path,
 ]
 
 # Ensure default data path and subdirectories exist
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Host Coordinator
+
+The API allows 3 concurrent requests and one hourly/daily quota per API access
+group, but the webhook server, the scheduler and ad-hoc `upgates` CLI runs are
+separate processes, each with its own `RequestScheduler`. This module lets them
+share both limits through files in a common directory:
+
+- **slots**: `slot-N.lock` files, one per allowed concurrent request. A request
+  holds an exclusive `flock` on one of them; the kernel releases it when the
+  process exits, so a crashed process never leaks a slot.
+- **quota ledger**: `quota.json` holds the newest `X-Rate-Limit-*` figures and
+  any `Retry-After` seen by any process, so a 429 or an exhausted hour reported
+  to one process pauses all of them.
+
+File locks need `fcntl`; on platforms without it the coordinator is disabled and
+every process only paces itself.
+
+Usage:
+
+    coordinator = HostCoordinator(config.coordinator_path, slots=3)
+    async with coordinator.slot():
+        ...  # send one request
+    coordinator.publish(scheduler.state)
+
+File: upgates/coordinator.py
+"""
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+import logfire
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+# Quota fields shared between processes (see ratelimit.QuotaState)
+LEDGER_FIELDS = (
+    "hour_limit",
+    "day_limit",
+    "hour_remaining",
+    "day_remaining",
+    "total_remaining",
+)
+
+
+def coordinator_available() -> bool:
+    """Whether this platform supports the file locks the coordinator uses."""
+    return fcntl is not None
+
+
+class HostCoordinator:
+    """File-lock semaphore and quota ledger shared by all clients on a host."""
+
+    def __init__(
+        self, path: Union[str, Path], slots: int = 3, poll_interval: float = 0.05
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.slots = max(1, slots)
+        self.poll_interval = poll_interval
+        self.ledger_file = self.path / "quota.json"
+        self._ledger_lock = self.path / "quota.lock"
+
+    def _try_lock(self, index: int) -> Optional[int]:
+        # A fresh descriptor per attempt: flock conflicts between descriptors
+        # even within one process, so coroutines of one client coordinate too.
+        fd = os.open(self.path / f"slot-{index}.lock", os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    async def acquire(self) -> int:
+        """Wait for a free host-wide request slot; returns its lock descriptor."""
+        waited = 0.0
+        while True:
+            for index in range(self.slots):
+                fd = self._try_lock(index)
+                if fd is not None:
+                    if waited:
+                        logfire.debug(
+                            f"🚦 Host request slot {index} free after {waited:.2f}s."
+                        )
+                    return fd
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+
+    @staticmethod
+    def release(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the host's concurrent request slots."""
+        fd = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(fd)
+
+    def read(self) -> Dict[str, Any]:
+        """The shared quota ledger (empty when missing or unreadable)."""
+        try:
+            data = json.loads(self.ledger_file.read_text())
+        except (OSError, ValueError):
+            return {}
+        for key in ("updated_at", "retry_at"):
+            if data.get(key):
+                data[key] = datetime.fromisoformat(data[key])
+        return data
+
+    def publish(self, state) -> None:
+        """Record a process's latest quota state if it is newer than the ledger's.
+
+        A `retry_at` in the future is kept until it passes, whoever reported it.
+        """
+        if state.updated_at is None:
+            return
+        with open(self._ledger_lock, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            ledger = self.read()
+            if ledger.get("updated_at") and ledger["updated_at"] > state.updated_at:
+                return
+            retry_at = max(
+                (t for t in (state.retry_at, ledger.get("retry_at")) if t),
+                default=None,
+            )
+            if retry_at and retry_at <= state.updated_at:
+                retry_at = None
+            data = {field: getattr(state, field) for field in LEDGER_FIELDS}
+            data["updated_at"] = state.updated_at.isoformat()
+            data["retry_at"] = retry_at.isoformat() if retry_at else None
+            data["pid"] = os.getpid()
+            tmp = self.ledger_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.ledger_file)
+
+
+# EOF
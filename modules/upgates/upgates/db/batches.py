@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar Page Batches
+
+This module flattens one decoded API page into pandas DataFrames, one per DuckDB
+table, so a page is loaded with a handful of set-based `INSERT ... SELECT`
+statements (see `UpgatesDuckDBAPI.upsert_product_batch`) instead of one
+`execute()` per product, description, price, image, category, meta and VAT.
+
+Column names match the DuckDB tables; the value clean-up done by the old
+per-row inserts (`_yn` flags, `cs` -> `cz`, joined SEO keywords) happens here.
+Customer and order pages are flattened the same way (orders with their lines),
+and so are `/parameters` and the product links of `/products/parameters`.
+
+Usage:
+
+    batch = product_frames(page["products"])
+    db_api.upsert_product_batch(batch)
+    db_api.upsert_customers(customer_frames(page["customers"]))
+    db_api.upsert_order_batch(order_frames(page["orders"]))
+
+File: upgates/db/batches.py
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from upgates.models.payloads import dumps
+
+PRODUCT_COLUMNS = [
+    "product_id",
+    "code",
+    "ean",
+    "manufacturer",
+    "stock",
+    "weight",
+    "availability",
+    "availability_type",
+    "unit",
+    "action_currently_yn",
+    "active_yn",
+    "archived_yn",
+    "can_add_to_basket_yn",
+    "adult_yn",
+    "set_yn",
+    "in_set_yn",
+    "exclude_from_search_yn",
+    "last_update_time",
+    "content_hash",
+]
+PRODUCT_FLAGS = [column for column in PRODUCT_COLUMNS if column.endswith("_yn")]
+
+DESCRIPTION_COLUMNS = [
+    "product_id",
+    "language",
+    "title",
+    "short_description",
+    "long_description",
+    "url",
+    "seo_title",
+    "seo_description",
+    "seo_url",
+    "seo_keywords",
+    "unit",
+]
+PRICE_COLUMNS = ["product_id", "currency", "price_with_vat"]
+IMAGE_COLUMNS = ["product_id", "file_id", "url", "main_yn", "position"]
+CATEGORY_COLUMNS = [
+    "product_id",
+    "category_id",
+    "category_code",
+    "category_name",
+    "main_yn",
+    "position",
+]
+META_COLUMNS = ["product_id", "meta_key", "meta_type", "meta_value"]
+VAT_COLUMNS = ["product_id", "country_code", "vat_percentage"]
+
+# Product tables in load order (products first, for the foreign keys)
+PRODUCT_TABLES = {
+    "products": PRODUCT_COLUMNS,
+    "descriptions": DESCRIPTION_COLUMNS,
+    "prices": PRICE_COLUMNS,
+    "images": IMAGE_COLUMNS,
+    "categories": CATEGORY_COLUMNS,
+    "metas": META_COLUMNS,
+    "vats": VAT_COLUMNS,
+}
+
+CUSTOMER_COLUMNS = [
+    "customer_id",
+    "type",
+    "firstname",
+    "surname",
+    "email",
+    "phone",
+    "company_name",
+    "code",
+    "language",
+    "pricelist",
+    "active_yn",
+    "creation_time",
+    "last_update_time",
+]
+ORDER_COLUMNS = [
+    "order_number",
+    "order_id",
+    "customer_id",
+    "total_price",
+    "status",
+    "status_id",
+    "currency",
+    "language",
+    "email",
+    "paid_date",
+    "creation_time",
+    "last_update_time",
+]
+ORDER_ITEM_COLUMNS = [
+    "order_number",
+    "uuid",
+    "product_id",
+    "type",
+    "code",
+    "title",
+    "quantity",
+    "price_per_unit",
+    "price_with_vat",
+    "price_without_vat",
+    "vat",
+]
+
+PARAMETER_COLUMNS = [
+    "parameter_id",
+    "position",
+    "display_type",
+    "display_in_product_list_yn",
+    "display_in_product_detail_yn",
+    "display_in_filters_as_slider_yn",
+]
+PARAMETER_DESCRIPTION_COLUMNS = ["parameter_id", "language", "name"]
+PARAMETER_VALUE_COLUMNS = ["value_id", "parameter_id", "position", "image_url"]
+PARAMETER_VALUE_DESCRIPTION_COLUMNS = ["value_id", "language", "value"]
+PRODUCT_PARAMETER_COLUMNS = ["product_id", "parameter_id", "value_id"]
+
+# Parameter tables in load order, with the key each is upserted on
+PARAMETER_TABLES = {
+    "parameters": (PARAMETER_COLUMNS, ["parameter_id"]),
+    "parameter_descriptions": (
+        PARAMETER_DESCRIPTION_COLUMNS,
+        ["parameter_id", "language"],
+    ),
+    "parameter_values": (PARAMETER_VALUE_COLUMNS, ["value_id"]),
+    "parameter_value_descriptions": (
+        PARAMETER_VALUE_DESCRIPTION_COLUMNS,
+        ["value_id", "language"],
+    ),
+}
+
+
+def _frame(rows: List[tuple], columns: List[str]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _language(value: Any) -> str:
+    # Czech is stored as 'cz', whatever the API or a translation calls it
+    language = str(value or "unknown").lower()
+    return "cz" if language == "cs" else language
+
+
+def _keywords(value: Any) -> str:
+    if not value:
+        return ""
+    return value if isinstance(value, str) else ", ".join(value)
+
+
+def content_hash(product: Dict[str, Any]) -> str:
+    """Stable hash of an API product payload (key order does not matter)."""
+    return hashlib.blake2b(
+        dumps(product, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else dumps(value)
+
+
+@dataclass
+class ProductBatch:
+    """One page of products flattened into a DataFrame per table."""
+
+    products: pd.DataFrame = field(default_factory=pd.DataFrame)
+    descriptions: pd.DataFrame = field(default_factory=pd.DataFrame)
+    prices: pd.DataFrame = field(default_factory=pd.DataFrame)
+    images: pd.DataFrame = field(default_factory=pd.DataFrame)
+    categories: pd.DataFrame = field(default_factory=pd.DataFrame)
+    metas: pd.DataFrame = field(default_factory=pd.DataFrame)
+    vats: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+
+def product_frames(products: List[Dict[str, Any]]) -> ProductBatch:
+    """Flatten API products (a `/products` page) into a ProductBatch."""
+    rows, descriptions, prices, images, categories, metas, vats = ([] for _ in range(7))
+    for product in products:
+        product_id = product.get("product_id")
+        rows.append(
+            (
+                product_id,
+                product.get("code"),
+                product.get("ean", ""),
+                product.get("manufacturer", ""),
+                product.get("stock", 0),
+                product.get("weight", 0),
+                product.get("availability", ""),
+                product.get("availability_type", ""),
+                product.get("unit", "ks"),
+                *(bool(product.get(flag, False)) for flag in PRODUCT_FLAGS),
+                product.get("last_update_time"),
+                content_hash(product),
+            )
+        )
+        for desc in product.get("descriptions", []):
+            descriptions.append(
+                (
+                    product_id,
+                    _language(desc.get("language")),
+                    desc.get("title", ""),
+                    desc.get("short_description", ""),
+                    desc.get("long_description", ""),
+                    desc.get("url", ""),
+                    desc.get("seo_title", ""),
+                    desc.get("seo_description", ""),
+                    desc.get("seo_url", ""),
+                    _keywords(desc.get("seo_keywords")),
+                    desc.get("unit", "ks"),
+                )
+            )
+        for price in product.get("prices", []):
+            prices.append(
+                (
+                    product_id,
+                    price.get("currency", "unknown"),
+                    next(
+                        (
+                            pl.get("price_with_vat", 0)
+                            for pl in price.get("pricelists", [])
+                        ),
+                        0.0,
+                    ),
+                )
+            )
+        for image in product.get("images", []):
+            images.append(
+                (
+                    product_id,
+                    image.get("file_id"),
+                    image.get("url", ""),
+                    bool(image.get("main_yn", False)),
+                    image.get("position", 0),
+                )
+            )
+        for category in product.get("categories", []):
+            categories.append(
+                (
+                    product_id,
+                    category.get("category_id"),
+                    category.get("code", ""),
+                    category.get("name", ""),
+                    bool(category.get("main_yn", False)),
+                    category.get("position", 0),
+                )
+            )
+        for meta in product.get("metas", []):
+            metas.append(
+                (
+                    product_id,
+                    meta.get("key", ""),
+                    meta.get("type", ""),
+                    _text(meta.get("value", meta.get("values"))),
+                )
+            )
+        for country, percentage in (product.get("vats") or {}).items():
+            vats.append((product_id, country, percentage))
+
+    return ProductBatch(
+        products=_frame(rows, PRODUCT_COLUMNS).drop_duplicates(
+            "product_id", keep="last"
+        ),
+        descriptions=_frame(descriptions, DESCRIPTION_COLUMNS).drop_duplicates(
+            ["product_id", "language"], keep="first"
+        ),
+        prices=_frame(prices, PRICE_COLUMNS),
+        images=_frame(images, IMAGE_COLUMNS),
+        categories=_frame(categories, CATEGORY_COLUMNS).drop_duplicates(
+            ["product_id", "category_id"], keep="first"
+        ),
+        metas=_frame(metas, META_COLUMNS),
+        vats=_frame(vats, VAT_COLUMNS),
+    )
+
+
+def customer_frames(customers: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Flatten API customers (a `/customers` page) into a `customers` frame."""
+    rows = []
+    for customer in customers:
+        login = customer.get("login") or {}
+        company = customer.get("company") or {}
+        rows.append(
+            (
+                customer.get("customer_id"),
+                customer.get("type", ""),
+                customer.get("firstname"),
+                customer.get("surname"),
+                login.get("email"),
+                (customer.get("communication") or {}).get("phone"),
+                company.get("name"),
+                customer.get("code"),
+                _language(customer.get("language")),
+                customer.get("pricelist"),
+                bool(login.get("active_yn", False)),
+                customer.get("creation_time"),
+                customer.get("last_update_time"),
+            )
+        )
+    return _frame(rows, CUSTOMER_COLUMNS).drop_duplicates("customer_id", keep="last")
+
+
+@dataclass
+class OrderBatch:
+    """One page of orders and their lines, a DataFrame per table."""
+
+    orders: pd.DataFrame = field(default_factory=pd.DataFrame)
+    order_items: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+
+def order_frames(orders: List[Dict[str, Any]]) -> OrderBatch:
+    """Flatten API orders (an `/orders` page) into an OrderBatch."""
+    rows, items = [], []
+    for order in orders:
+        number = order.get("order_number")
+        customer = order.get("customer") or {}
+        rows.append(
+            (
+                number,
+                order.get("order_id"),
+                customer.get("customer_id"),
+                order.get("order_total", 0.0),
+                order.get("status"),
+                order.get("status_id"),
+                order.get("currency_id"),
+                _language(order.get("language_id")),
+                customer.get("email"),
+                order.get("paid_date"),
+                order.get("creation_time"),
+                order.get("last_update_time"),
+            )
+        )
+        for item in order.get("products", []):
+            items.append(
+                (
+                    number,
+                    item.get("uuid"),
+                    item.get("product_id"),
+                    item.get("type", "product"),
+                    item.get("code"),
+                    item.get("title"),
+                    item.get("quantity", 0),
+                    item.get("price_per_unit", 0.0),
+                    item.get("price_with_vat", 0.0),
+                    item.get("price_without_vat", 0.0),
+                    item.get("vat", 0),
+                )
+            )
+    return OrderBatch(
+        orders=_frame(rows, ORDER_COLUMNS).drop_duplicates("order_number", keep="last"),
+        order_items=_frame(items, ORDER_ITEM_COLUMNS).drop_duplicates(
+            ["order_number", "uuid"], keep="last"
+        ),
+    )
+
+
+@dataclass
+class ParameterBatch:
+    """One page of parameters with their values and descriptions."""
+
+    parameters: pd.DataFrame = field(default_factory=pd.DataFrame)
+    parameter_descriptions: pd.DataFrame = field(default_factory=pd.DataFrame)
+    parameter_values: pd.DataFrame = field(default_factory=pd.DataFrame)
+    parameter_value_descriptions: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+
+def parameter_frames(parameters: List[Dict[str, Any]]) -> ParameterBatch:
+    """Flatten API parameters (a `/parameters` page) into a ParameterBatch."""
+    rows, descriptions, values, value_descriptions = [], [], [], []
+    for parameter in parameters:
+        parameter_id = parameter.get("id")
+        rows.append(
+            (
+                parameter_id,
+                parameter.get("position", 0),
+                parameter.get("display_type", "select"),
+                bool(parameter.get("display_in_product_list_yn", False)),
+                bool(parameter.get("display_in_product_detail_yn", False)),
+                bool(parameter.get("display_in_filters_as_slider_yn", False)),
+            )
+        )
+        for desc in parameter.get("descriptions", []):
+            descriptions.append(
+                (parameter_id, _language(desc.get("language")), desc.get("name", ""))
+            )
+        for value in parameter.get("values", []):
+            value_id = value.get("id")
+            values.append(
+                (
+                    value_id,
+                    parameter_id,
+                    value.get("position", 0),
+                    (value.get("image") or {}).get("url"),
+                )
+            )
+            for desc in value.get("descriptions", []):
+                value_descriptions.append(
+                    (value_id, _language(desc.get("language")), desc.get("value", ""))
+                )
+
+    return ParameterBatch(
+        parameters=_frame(rows, PARAMETER_COLUMNS).drop_duplicates(
+            "parameter_id", keep="last"
+        ),
+        parameter_descriptions=_frame(
+            descriptions, PARAMETER_DESCRIPTION_COLUMNS
+        ).drop_duplicates(["parameter_id", "language"], keep="last"),
+        parameter_values=_frame(values, PARAMETER_VALUE_COLUMNS).drop_duplicates(
+            "value_id", keep="last"
+        ),
+        parameter_value_descriptions=_frame(
+            value_descriptions, PARAMETER_VALUE_DESCRIPTION_COLUMNS
+        ).drop_duplicates(["value_id", "language"], keep="last"),
+    )
+
+
+def product_parameter_frames(products: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Flatten a `/products/parameters` page into product -> value links.
+
+    Links are read from `parameters_new`, the only part of the payload that
+    carries parameter and value IDs; entries without IDs are skipped.
+    """
+    links = [
+        (product.get("product_id"), parameter.get("id"), value.get("id"))
+        for product in products
+        for parameter in product.get("parameters_new") or []
+        for value in parameter.get("values", [])
+        if parameter.get("id") is not None and value.get("id") is not None
+    ]
+    return _frame(links, PRODUCT_PARAMETER_COLUMNS).drop_duplicates()
+
+
+# EOF
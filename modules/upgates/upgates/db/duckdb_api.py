@@ -16,12 +16,33 @@ File: /Users/cward/Repos/neven_cz/modules/upgates/upgates/db/duckdb_api.py
 """
 
 import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
 
 import duckdb
 import logfire
 import pandas as pd
 
 from upgates import config
+from upgates.db.batches import (
+    CATEGORY_COLUMNS,
+    CUSTOMER_COLUMNS,
+    ORDER_COLUMNS,
+    ORDER_ITEM_COLUMNS,
+    PARAMETER_TABLES,
+    PRICE_COLUMNS,
+    PRODUCT_PARAMETER_COLUMNS,
+    PRODUCT_TABLES,
+    OrderBatch,
+    ParameterBatch,
+    ProductBatch,
+)
+from upgates.db.migrations import apply_migrations
+
+# Product child tables replaced (not appended to) on every sync
+REPLACED_TABLES = ("prices", "images", "metas", "vats")
 
 
 class UpgatesDuckDBAPI:
@@ -29,13 +50,17 @@ class UpgatesDuckDBAPI:
 
     _initialized = False  # Class-level flag to track initialization
 
-    def __init__(self):
-        """Initialize the DuckDB API client."""
+    def __init__(self, db_file: Optional[str] = None):
+        """Initialize the DuckDB API client (default: the configured cache file)."""
         self.cache_path = config.cache_path
-        self.db_file = config.default_db_path
+        self.db_file = db_file or config.default_db_path
         self._ensure_cache_directory_exists()
         existed_already = os.path.exists(self.db_file)
-        self.conn = duckdb.connect(self.db_file)
+        self._connection = duckdb.connect(self.db_file)
+        self._owner = threading.get_ident()
+        self._local = threading.local()
+        self._cursors: list = []
+        self._cursors_lock = threading.Lock()
 
         # Initialize DB only if not already done
         if not (UpgatesDuckDBAPI._initialized and existed_already):
@@ -47,6 +72,42 @@ class UpgatesDuckDBAPI:
 
         logfire.debug("UpgatesDuckDBAPI initialized.")
 
+    @property
+    def conn(self) -> duckdb.DuckDBPyConnection:
+        """This thread's DuckDB connection.
+
+        The thread that opened the database uses the connection itself; any
+        other thread (eg. the sync writer thread) gets its own cursor of the
+        same database, with its own transactions, so concurrent tasks never
+        run statements inside each other's transaction.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if threading.get_ident() == self._owner:
+                conn = self._connection
+            else:
+                conn = self._connection.cursor()
+                with self._cursors_lock:
+                    self._cursors.append(conn)
+            self._local.conn = conn
+        return conn
+
+    @property
+    def _transaction_depth(self) -> int:
+        return getattr(self._local, "transaction_depth", 0)
+
+    @_transaction_depth.setter
+    def _transaction_depth(self, depth: int) -> None:
+        self._local.transaction_depth = depth
+
+    def close(self) -> None:
+        """Close the thread cursors and the connection."""
+        with self._cursors_lock:
+            cursors, self._cursors = self._cursors, []
+        for cursor in cursors:
+            cursor.close()
+        self._connection.close()
+
     def _initialize_db(self):
         """Create tables if they don't exist."""
         logfire.debug("Initializing DuckDB tables...")
@@ -61,6 +122,7 @@ class UpgatesDuckDBAPI:
         self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_category_id START 1;")
         self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_customer_id START 1;")
         self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_order_id START 1;")
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_order_item_id START 1;")
         self.conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_parameter_id START 1;")
         self.conn.execute(
             "CREATE SEQUENCE IF NOT EXISTS seq_parameter_description_id START 1;"
@@ -80,6 +142,8 @@ class UpgatesDuckDBAPI:
             self._create_customers_table()
         if not self._check_table_exists("orders"):
             self._create_orders_table()
+        if not self._check_table_exists("order_items"):
+            self._create_order_items_table()
         if not self._check_table_exists("descriptions"):
             self._create_descriptions_table()
         if not self._check_table_exists("prices"):
@@ -92,9 +156,21 @@ class UpgatesDuckDBAPI:
             self._create_metas_table()
         if not self._check_table_exists("vats"):
             self._create_vats_table()
-        if not self._check_table_exists("parameters"):
-            self._create_parameters_table()
-
+        if not self._check_table_exists("sync_state"):
+            self._create_sync_state_table()
+        if not self._check_table_exists("sync_checkpoints"):
+            self._create_sync_checkpoints_table()
+        if not self._check_table_exists("api_requests"):
+            self._create_api_requests_table()
+
+        apply_migrations(self.conn)
+
+        # After the migrations: migration 4 drops the old parameter layout
+        for table in PARAMETER_TABLES:
+            if not self._check_table_exists(table):
+                getattr(self, f"_create_{table}_table")()
+        if not self._check_table_exists("product_parameters"):
+            self._create_product_parameters_table()
         logfire.debug("DuckDB tables initialized.")
 
     def _check_table_exists(self, table_name):
@@ -129,7 +205,9 @@ class UpgatesDuckDBAPI:
                 adult_yn BOOLEAN,
                 set_yn BOOLEAN,
                 in_set_yn BOOLEAN,
-                exclude_from_search_yn BOOLEAN
+                exclude_from_search_yn BOOLEAN,
+                last_update_time TEXT,
+                content_hash TEXT
             );
         """)
         logfire.debug(
@@ -148,7 +226,13 @@ class UpgatesDuckDBAPI:
                 surname TEXT,
                 email TEXT,
                 phone TEXT,
-                company_name TEXT
+                company_name TEXT,
+                code TEXT,
+                language TEXT,
+                pricelist TEXT,
+                active_yn BOOLEAN,
+                creation_time TEXT,
+                last_update_time TEXT
             );
         """)
 
@@ -163,7 +247,34 @@ class UpgatesDuckDBAPI:
                 customer_id INTEGER,
                 total_price FLOAT,
                 total_weight FLOAT,
-                status TEXT
+                status TEXT,
+                status_id INTEGER,
+                currency TEXT,
+                language TEXT,
+                email TEXT,
+                paid_date TEXT,
+                creation_time TEXT,
+                last_update_time TEXT
+            );
+        """)
+
+    def _create_order_items_table(self):
+        """Create order items (order lines) table if it doesn't exist."""
+        logfire.debug("Creating order_items table...")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_order_item_id'),
+                order_number TEXT,
+                uuid TEXT,
+                product_id INTEGER,
+                type TEXT,
+                code TEXT,
+                title TEXT,
+                quantity FLOAT,
+                price_per_unit FLOAT,
+                price_with_vat FLOAT,
+                price_without_vat FLOAT,
+                vat FLOAT
             );
         """)
 
@@ -258,15 +369,38 @@ class UpgatesDuckDBAPI:
             );
         """)
 
+    def _create_parameters_table(self):
+        """Create parameters table if it doesn't exist."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS parameters (
+                parameter_id INTEGER PRIMARY KEY,
+                position INTEGER,
+                display_type TEXT,
+                display_in_product_list_yn BOOLEAN,
+                display_in_product_detail_yn BOOLEAN,
+                display_in_filters_as_slider_yn BOOLEAN
+            );
+        """)
+
     def _create_parameter_descriptions_table(self):
-        """Create parameter descriptions table if it doesn't exist."""
+        """Create parameter descriptions (names per language) table if it doesn't exist."""
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS parameter_descriptions (
-                id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_parameter_description_id'),
                 parameter_id INTEGER,
                 language TEXT,
                 name TEXT,
-                FOREIGN KEY (parameter_id) REFERENCES parameters(id)
+                PRIMARY KEY (parameter_id, language)
+            );
+        """)
+
+    def _create_parameter_values_table(self):
+        """Create parameter values table if it doesn't exist."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS parameter_values (
+                value_id INTEGER PRIMARY KEY,
+                parameter_id INTEGER,
+                position INTEGER,
+                image_url TEXT
             );
         """)
 
@@ -274,48 +408,213 @@ class UpgatesDuckDBAPI:
         """Create parameter value descriptions table if it doesn't exist."""
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS parameter_value_descriptions (
-                id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_parameter_value_description_id'),
-                parameter_value_id INTEGER,
+                value_id INTEGER,
                 language TEXT,
                 value TEXT,
-                FOREIGN KEY (parameter_value_id) REFERENCES parameter_values(id)
+                PRIMARY KEY (value_id, language)
             );
         """)
 
-    def _create_parameter_values_table(self):
-        """Create parameter values table if it doesn't exist."""
+    def _create_product_parameters_table(self):
+        """Create product parameters (product -> parameter value links) table."""
         self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS parameter_values (
-                id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_parameter_value_id'),
-                position INTEGER,
-                image_id INTEGER,
-                FOREIGN KEY (image_id) REFERENCES images(id)
+            CREATE TABLE IF NOT EXISTS product_parameters (
+                product_id INTEGER,
+                parameter_id INTEGER,
+                value_id INTEGER,
+                PRIMARY KEY (product_id, parameter_id, value_id)
             );
         """)
 
-    def _create_parameters_table(self):
-        """Create parameters table if it doesn't exist."""
-        if self._check_table_exists("parameter_values"):
-            return
+    def _create_sync_state_table(self):
+        """Create sync state table (per-endpoint incremental sync watermarks)."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                endpoint TEXT PRIMARY KEY,
+                last_update_time TEXT,
+                last_sync_time TIMESTAMP,
+                items_synced INTEGER
+            );
+        """)
 
+    def get_sync_watermark(self, endpoint: str) -> str | None:
+        """Return the `last_update_time` high-water mark recorded for an endpoint."""
+        result = self.conn.execute(
+            "SELECT last_update_time FROM sync_state WHERE endpoint = ?", (endpoint,)
+        ).fetchone()
+        return result[0] if result else None
+
+    def set_sync_watermark(
+        self, endpoint: str, last_update_time: str, items_synced: int
+    ) -> None:
+        """Record the high-water mark reached by a completed sync of an endpoint."""
+        self.conn.execute(
+            """
+            INSERT INTO sync_state (endpoint, last_update_time, last_sync_time, items_synced)
+            VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+            ON CONFLICT (endpoint) DO UPDATE SET
+                last_update_time = EXCLUDED.last_update_time,
+                last_sync_time = EXCLUDED.last_sync_time,
+                items_synced = EXCLUDED.items_synced
+        """,
+            (endpoint, last_update_time, items_synced),
+        )
+        logfire.debug(f"Sync watermark for '{endpoint}' set to {last_update_time}")
+
+    def _create_sync_checkpoints_table(self):
+        """Create sync checkpoints table (last stored page of running syncs)."""
         self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS parameters (
-                id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_parameter_id'),
-                position INTEGER,
-                display_type TEXT,
-                display_in_product_list_yn BOOLEAN,
-                display_in_product_detail_yn BOOLEAN,
-                display_in_filters_as_slider_yn BOOLEAN,
-                image_id INTEGER,
-                FOREIGN KEY (image_id) REFERENCES images(id)
+            CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                endpoint TEXT PRIMARY KEY,
+                params TEXT,
+                last_page INTEGER,
+                number_of_pages INTEGER,
+                started TEXT,
+                last_update_time TEXT,
+                items_synced INTEGER,
+                updated_at TIMESTAMP
+            );
+        """)
+
+    def get_sync_checkpoint(
+        self, endpoint: str, params: str, max_age_hours: float
+    ) -> dict | None:
+        """Return the checkpoint of an interrupted sync of `endpoint` with `params`.
+
+        Checkpoints of syncs with other parameters (eg. another watermark) or
+        older than `max_age_hours` are ignored.
+        """
+        result = self.conn.execute(
+            """
+            SELECT last_page, number_of_pages, started, last_update_time, items_synced
+            FROM sync_checkpoints
+            WHERE endpoint = ? AND params = ?
+                AND updated_at >= ?
+        """,
+            (endpoint, params, datetime.now() - timedelta(hours=max_age_hours)),
+        ).fetchone()
+        if not result:
+            return None
+        keys = ("last_page", "number_of_pages", "started", "last_update_time")
+        return dict(zip(keys + ("items_synced",), result))
+
+    def set_sync_checkpoint(
+        self,
+        endpoint: str,
+        params: str,
+        last_page: int,
+        number_of_pages: int,
+        started: str,
+        last_update_time: str | None,
+        items_synced: int,
+    ) -> None:
+        """Record the last page of `endpoint` whose items have been stored."""
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO sync_checkpoints
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                endpoint,
+                params,
+                last_page,
+                number_of_pages,
+                started,
+                last_update_time,
+                items_synced,
+                datetime.now(),
+            ),
+        )
+
+    def clear_sync_checkpoint(self, endpoint: str) -> None:
+        """Forget the checkpoint of a completed sync."""
+        self.conn.execute(
+            "DELETE FROM sync_checkpoints WHERE endpoint = ?", (endpoint,)
+        )
+
+    def _create_api_requests_table(self):
+        """Create API request telemetry table (one row per request/page)."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_requests (
+                run_id TEXT,
+                endpoint TEXT,
+                method TEXT,
+                page INTEGER,
+                status INTEGER,
+                bytes BIGINT,
+                latency_ms DOUBLE,
+                decode_ms DOUBLE,
+                store_ms DOUBLE,
+                cached BOOLEAN,
+                hour_remaining INTEGER,
+                day_remaining INTEGER,
+                ts TIMESTAMP
             );
         """)
 
-        self._create_parameter_values_table()
-        self._create_parameter_descriptions_table()
-        self._create_parameter_value_descriptions_table()
-        self._create_images_table()
-        self._create_parameters_table()
+    def insert_api_requests(self, samples: pd.DataFrame) -> int:
+        """Append request telemetry samples; drops samples past retention."""
+        self.conn.register("api_request_samples", samples)
+        try:
+            self.conn.execute(
+                "INSERT INTO api_requests BY NAME SELECT * FROM api_request_samples"
+            )
+        finally:
+            self.conn.unregister("api_request_samples")
+        cutoff = datetime.now() - timedelta(days=config.UPGATES_TELEMETRY_DAYS)
+        self.conn.execute("DELETE FROM api_requests WHERE ts < ?", (cutoff,))
+        return len(samples)
+
+    def get_api_request_stats(self, hours: float = 24) -> pd.DataFrame:
+        """Per-endpoint request counts, latency percentiles, phases and pages/s."""
+        return self.conn.execute(
+            """
+            WITH runs AS (
+                SELECT
+                    endpoint,
+                    run_id,
+                    COUNT(*) FILTER (WHERE page IS NOT NULL) AS pages,
+                    epoch(MAX(ts + to_microseconds(CAST(latency_ms * 1000 AS BIGINT)))
+                        - MIN(ts)) AS seconds
+                FROM api_requests
+                WHERE ts >= ?
+                GROUP BY endpoint, run_id
+            )
+            SELECT
+                r.endpoint,
+                COUNT(*) AS requests,
+                COUNT(*) FILTER (WHERE r.cached) AS cached,
+                COUNT(*) FILTER (WHERE r.status >= 400) AS errors,
+                ROUND(SUM(r.bytes) / 1048576, 2) AS mb,
+                ROUND(quantile_cont(r.latency_ms, 0.5)
+                    FILTER (WHERE NOT r.cached), 1) AS p50_ms,
+                ROUND(quantile_cont(r.latency_ms, 0.95)
+                    FILTER (WHERE NOT r.cached), 1) AS p95_ms,
+                ROUND(AVG(r.decode_ms), 1) AS decode_ms,
+                ROUND(AVG(r.store_ms), 1) AS store_ms,
+                ROUND(ANY_VALUE(t.pages_per_s), 2) AS pages_per_s
+            FROM api_requests r
+            LEFT JOIN (
+                SELECT endpoint, SUM(pages) / NULLIF(SUM(seconds), 0) AS pages_per_s
+                FROM runs GROUP BY endpoint
+            ) t USING (endpoint)
+            WHERE r.ts >= ?
+            GROUP BY r.endpoint
+            ORDER BY requests DESC
+        """,
+            (datetime.now() - timedelta(hours=hours),) * 2,
+        ).fetchdf()
+
+    def get_api_latencies(self, endpoint: str, hours: float = 24) -> list[float]:
+        """Latencies (ms) of non-cached requests to `endpoint`."""
+        rows = self.conn.execute(
+            """
+            SELECT latency_ms FROM api_requests
+            WHERE endpoint = ? AND ts >= ? AND NOT cached
+        """,
+            (endpoint, datetime.now() - timedelta(hours=hours)),
+        ).fetchall()
+        return [row[0] for row in rows]
 
     def insert_product(
         self,
@@ -446,44 +745,14 @@ class UpgatesDuckDBAPI:
         self, product_id, category_id, category_code, category_name, main_yn, position
     ):
         """Insert category data into the categories table, skipping duplicates."""
-        # Check if the category_id already exists
-        existing_category = self.conn.execute(
+        self.conn.execute(
             """
-            SELECT 1 FROM categories WHERE category_id = ? and product_id = ?
+            INSERT INTO categories (product_id, category_id, category_code, category_name, main_yn, position)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_id, category_id) DO NOTHING
         """,
-            (category_id, product_id),
-        ).fetchone()
-        # print (f"Existing category: {existing_category}; category_id: {category_id}; product_id: {product_id}")
-
-        # import ipdb
-
-        # ipdb.set_trace()
-
-        # something here is wrong
-        # we inserting duplicates
-
-        if existing_category:
-            logfire.debug(
-                f"⚠️ Category with ID {category_id} already exists. Skipping insert."
-            )
-            return
-        else:
-            # Insert category if it doesn't exist
-            self.conn.execute(
-                """
-                INSERT INTO categories (product_id, category_id, category_code, category_name, main_yn, position)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    product_id,
-                    category_id,
-                    category_code,
-                    category_name,
-                    main_yn,
-                    position,
-                ),
-            )
-            logfire.debug(f"✅ Category with ID {category_id} inserted successfully.")
+            (product_id, category_id, category_code, category_name, main_yn, position),
+        )
 
     def insert_product_meta(self, product_id, meta_key, meta_type, meta_value):
         """Insert metadata into the metas table."""
@@ -505,50 +774,449 @@ class UpgatesDuckDBAPI:
             (product_id, country_code, vat_percentage),
         )
 
-    def insert_parameter(self, key, value):
-        """Insert parameter into the parameters table."""
-        self.conn.execute(
-            """
-            INSERT INTO parameters (key, value)
-            VALUES (?, ?)
-        """,
-            (key, value),
-        )
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Run the enclosed statements atomically (nested blocks join the outer one).
 
-    def insert_parameters(self, parameters: list):
-        """Insert multiple parameters into the parameters table."""
-        for parameter in parameters:
-            pass
+        Readers of the cache file see either all of a block's writes or none.
+        Transactions are per thread (see `conn`): a block on one thread never
+        joins one open on another.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
 
-    def insert_parameter_value(self, parameter_id, value):
-        """Insert parameter value into the parameter_values table."""
-        self.conn.execute(
-            """
-            INSERT INTO parameter_values (parameter_id, value)
-            VALUES (?, ?)
-        """,
-            (parameter_id, value),
+        self.conn.execute("BEGIN TRANSACTION")
+        self._transaction_depth = 1
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self._transaction_depth = 0
+
+    @contextmanager
+    def _registered(self, prefix: str, batch: ProductBatch) -> Iterator[None]:
+        """Expose the DataFrames of `batch` as views named `<prefix><table>`."""
+        for table in PRODUCT_TABLES:
+            self.conn.register(f"{prefix}{table}", getattr(batch, table))
+        try:
+            yield
+        finally:
+            for table in PRODUCT_TABLES:
+                self.conn.unregister(f"{prefix}{table}")
+
+    def _column_types(self, table: str) -> dict:
+        return {
+            name: dtype
+            for name, dtype, *_ in self.conn.execute(f"DESCRIBE {table}").fetchall()
+        }
+
+    def _replace_children(
+        self,
+        table: str,
+        columns: list,
+        source: str,
+        parents: str,
+        key: str = "product_id",
+        parent_table: str = "products",
+        touched: Optional[set] = None,
+    ) -> tuple:
+        """Make the `table` rows of the parents listed in `parents` equal `source`.
+
+        Rows belong to a parent (a product, an order) through the `key` column.
+        Only the difference is written: stored rows missing from `source` are
+        deleted and `source` rows not stored yet are inserted (rows of parents
+        not in `parent_table` are skipped). The keys of parents whose rows
+        changed are added to `touched`. Returns (inserted, deleted).
+        """
+        types = self._column_types(table)
+        names = ", ".join(columns)
+        # Compare in the table's types, eg. FLOAT prices against DOUBLE input
+        match = " AND ".join(
+            f"t.{c} IS NOT DISTINCT FROM CAST(b.{c} AS {types[c]})" for c in columns
         )
-
-    def insert_parameter_description(self, parameter_id, language, name):
-        """Insert parameter description into the parameter_descriptions table."""
-        self.conn.execute(
-            """
-            INSERT INTO parameter_descriptions (parameter_id, language, name)
-            VALUES (?, ?, ?)
-        """,
-            (parameter_id, language, name),
+        deleted = self.conn.execute(f"""
+            DELETE FROM {table} t
+            WHERE t.{key} IN (SELECT {key} FROM {parents})
+            AND NOT EXISTS (SELECT 1 FROM {source} b WHERE {match})
+            RETURNING {key}
+        """).fetchall()
+        inserted = self.conn.execute(f"""
+            INSERT INTO {table} ({names})
+            SELECT DISTINCT {names} FROM {source} b
+            WHERE b.{key} IN (SELECT {key} FROM {parent_table})
+            AND NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})
+            RETURNING {key}
+        """).fetchall()
+        if touched is not None:
+            touched.update(parent for (parent,) in deleted + inserted)
+        return len(inserted), len(deleted)
+
+    def _merge_products(self, prefix: str) -> dict:
+        """Merge product rows from `<prefix><table>` sources into the main tables.
+
+        Products whose `content_hash` matches the stored one are skipped with
+        all their child rows. Changed products are upserted on product_id,
+        descriptions are only added for new (product_id, language) pairs
+        (local translations are kept), and category links no longer listed are
+        deleted before the rest are upserted on (product_id, category_id).
+        Prices, images, metas and VATs of changed products are replaced by
+        their current API rows, writing only the difference. Returns rows
+        written per table (`<table>_deleted` for removed child rows,
+        `unchanged` for skipped products).
+        """
+        changed = f"{prefix}changed"
+        # Decided before the upsert below overwrites the stored hashes
+        ids = self.conn.execute(f"""
+            SELECT DISTINCT b.product_id FROM {prefix}products b
+            LEFT JOIN products p USING (product_id)
+            WHERE p.content_hash IS NULL OR p.content_hash <> b.content_hash
+        """).fetchdf()
+        only_changed = f"WHERE product_id IN (SELECT product_id FROM {changed})"
+        sources = {
+            "products": f"""(SELECT DISTINCT ON (product_id) *
+                FROM {prefix}products {only_changed})""",
+            "descriptions": f"""(SELECT DISTINCT ON (product_id, language) *
+                FROM {prefix}descriptions {only_changed})""",
+            "categories": f"""(SELECT DISTINCT ON (product_id, category_id) *
+                FROM {prefix}categories {only_changed})""",
+        }
+        updates = ", ".join(
+            f"{c} = excluded.{c}" for c in PRODUCT_TABLES["products"][1:]
         )
+        # Category links are unique per (product_id, category_id), see
+        # migration 2; only links whose name, code or position changed are
+        # rewritten.
+        link_columns = CATEGORY_COLUMNS[2:]
+        category_updates = ", ".join(f"{c} = excluded.{c}" for c in link_columns)
+        category_stored = ", ".join(f"categories.{c}" for c in link_columns)
+        category_new = ", ".join(f"excluded.{c}" for c in link_columns)
+        suffixes = {
+            "products": f"ON CONFLICT (product_id) DO UPDATE SET {updates}",
+            "descriptions": "ON CONFLICT DO NOTHING",
+            "categories": f"""ON CONFLICT (product_id, category_id)
+                DO UPDATE SET {category_updates}
+                WHERE ({category_stored}) IS DISTINCT FROM ({category_new})""",
+        }
+        total = self.conn.execute(
+            f"SELECT COUNT(DISTINCT product_id) FROM {prefix}products"
+        ).fetchone()[0]
+        written = {"unchanged": total - len(ids)}
+        self.conn.register(changed, ids)
+        try:
+            for table, columns in PRODUCT_TABLES.items():
+                if table in REPLACED_TABLES:
+                    source = f"(SELECT * FROM {prefix}{table} {only_changed})"
+                    written[table], written[f"{table}_deleted"] = (
+                        self._replace_children(table, columns, source, changed)
+                    )
+                    continue
+                if table == "categories":
+                    written["categories_deleted"] = self._delete_stale_links(
+                        f"{prefix}categories", changed
+                    )
+                names = ", ".join(columns)
+                written[table] = self.conn.execute(
+                    f"INSERT INTO {table} ({names}) "
+                    f"SELECT {names} FROM {sources[table]} b {suffixes[table]}"
+                ).fetchone()[0]
+        finally:
+            self.conn.unregister(changed)
+        return written
+
+    def _delete_stale_links(self, source: str, parents: str) -> int:
+        """Delete category links of the `parents` products missing from `source`."""
+        return len(self.conn.execute(f"""
+            DELETE FROM categories t
+            WHERE t.product_id IN (SELECT product_id FROM {parents})
+            AND NOT EXISTS (
+                SELECT 1 FROM {source} b
+                WHERE b.product_id = t.product_id AND b.category_id = t.category_id
+            )
+            RETURNING product_id
+        """).fetchall())
 
-    def insert_parameter_value_description(self, parameter_value_id, language, value):
-        """Insert parameter value description into the parameter_value_descriptions table."""
-        self.conn.execute(
-            """
-            INSERT INTO parameter_value_descriptions (parameter_value_id, language, value)
-            VALUES (?, ?, ?)
-        """,
-            (parameter_value_id, language, value),
+    def upsert_product_batch(self, batch: ProductBatch) -> dict:
+        """Load one page of products and their child rows set-wise, atomically."""
+        with self._registered("batch_", batch), self.transaction():
+            return self._merge_products("batch_")
+
+    def reset_product_staging(self) -> None:
+        """Create empty `staging_<table>` copies of the product tables."""
+        for table, columns in PRODUCT_TABLES.items():
+            self.conn.execute(
+                f"CREATE OR REPLACE TABLE staging_{table} AS "
+                f"SELECT {', '.join(columns)} FROM {table} LIMIT 0"
+            )
+
+    def stage_product_batch(self, batch: ProductBatch) -> int:
+        """Append one page to the staging tables; the main tables are untouched."""
+        with self._registered("batch_", batch), self.transaction():
+            for table, columns in PRODUCT_TABLES.items():
+                names = ", ".join(columns)
+                self.conn.execute(
+                    f"INSERT INTO staging_{table} ({names}) "
+                    f"SELECT {names} FROM batch_{table}"
+                )
+        return len(batch.products)
+
+    def commit_product_staging(self) -> dict:
+        """Merge everything staged during a run into the main tables at once."""
+        with self.transaction():
+            written = self._merge_products("staging_")
+            for table in PRODUCT_TABLES:
+                self.conn.execute(f"DROP TABLE staging_{table}")
+        return written
+
+    def upsert_customers(self, customers: pd.DataFrame) -> int:
+        """Insert or update one page of customers on customer_id; returns rows written."""
+        if customers.empty:
+            return 0
+        names = ", ".join(CUSTOMER_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in CUSTOMER_COLUMNS[1:])
+        self.conn.register("batch_customers", customers)
+        try:
+            with self.transaction():
+                return self.conn.execute(f"""
+                    INSERT INTO customers ({names})
+                    SELECT {names} FROM (
+                        SELECT DISTINCT ON (customer_id) * FROM batch_customers
+                        WHERE customer_id IS NOT NULL
+                    )
+                    ON CONFLICT (customer_id) DO UPDATE SET {updates}
+                """).fetchone()[0]
+        finally:
+            self.conn.unregister("batch_customers")
+
+    def upsert_order_batch(self, batch: OrderBatch) -> dict:
+        """Load one page of orders and their lines set-wise, atomically.
+
+        Orders are upserted on order_number (unique, see migration 3) and the
+        lines of each synced order are replaced by the page's lines, writing
+        only the difference. Returns rows written per table.
+        """
+        names = ", ".join(ORDER_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in ORDER_COLUMNS[1:])
+        self.conn.register("batch_orders", batch.orders)
+        self.conn.register("batch_order_items", batch.order_items)
+        try:
+            with self.transaction():
+                written = {"orders": self.conn.execute(f"""
+                        INSERT INTO orders ({names})
+                        SELECT {names} FROM (
+                            SELECT DISTINCT ON (order_number) * FROM batch_orders
+                            WHERE order_number IS NOT NULL
+                        )
+                        ON CONFLICT (order_number) DO UPDATE SET {updates}
+                    """).fetchone()[0]}
+                written["order_items"], written["order_items_deleted"] = (
+                    self._replace_children(
+                        "order_items",
+                        ORDER_ITEM_COLUMNS,
+                        "batch_order_items",
+                        "batch_orders",
+                        key="order_number",
+                        parent_table="orders",
+                    )
+                )
+        finally:
+            self.conn.unregister("batch_orders")
+            self.conn.unregister("batch_order_items")
+        return written
+
+    def upsert_parameter_batch(self, batch: ParameterBatch) -> dict:
+        """Load one page of parameters, values and their names set-wise, atomically.
+
+        Every table is upserted on its API key; values no longer listed under
+        a synced parameter are deleted with their descriptions. Returns rows
+        written per table.
+        """
+        written = {}
+        for table in PARAMETER_TABLES:
+            self.conn.register(f"batch_{table}", getattr(batch, table))
+        try:
+            with self.transaction():
+                stale = """
+                    SELECT value_id FROM parameter_values
+                    WHERE parameter_id IN (SELECT parameter_id FROM batch_parameters)
+                    AND value_id NOT IN (SELECT value_id FROM batch_parameter_values)
+                """
+                self.conn.execute(
+                    f"DELETE FROM parameter_value_descriptions WHERE value_id IN ({stale})"
+                )
+                written["parameter_values_deleted"] = self.conn.execute(
+                    f"DELETE FROM parameter_values WHERE value_id IN ({stale})"
+                ).fetchone()[0]
+                for table, (columns, key) in PARAMETER_TABLES.items():
+                    names = ", ".join(columns)
+                    updates = ", ".join(
+                        f"{c} = excluded.{c}" for c in columns if c not in key
+                    )
+                    written[table] = self.conn.execute(f"""
+                        INSERT INTO {table} ({names})
+                        SELECT {names} FROM batch_{table}
+                        WHERE {" AND ".join(f"{c} IS NOT NULL" for c in key)}
+                        ON CONFLICT ({", ".join(key)}) DO UPDATE SET {updates}
+                    """).fetchone()[0]
+        finally:
+            for table in PARAMETER_TABLES:
+                self.conn.unregister(f"batch_{table}")
+        return written
+
+    def replace_product_parameters(
+        self, links: pd.DataFrame, product_ids: list
+    ) -> tuple:
+        """Replace the parameter value links of `product_ids` with `links`.
+
+        `links` has columns product_id, parameter_id, value_id; products whose
+        links did not change are left alone. Returns (inserted, deleted).
+        """
+        if not product_ids:
+            return 0, 0
+        self.conn.register(
+            "parameter_product_ids", pd.DataFrame({"product_id": product_ids})
         )
+        self.conn.register("parameter_links", links)
+        try:
+            with self.transaction():
+                return self._replace_children(
+                    "product_parameters",
+                    PRODUCT_PARAMETER_COLUMNS,
+                    "parameter_links",
+                    "parameter_product_ids",
+                    parent_table="parameter_product_ids",
+                )
+        finally:
+            self.conn.unregister("parameter_product_ids")
+            self.conn.unregister("parameter_links")
+
+    def compare_product_listing(self, listing: pd.DataFrame) -> pd.DataFrame:
+        """Compare a remote product listing with the local products table.
+
+        `listing` has columns product_id, code, last_update_time (eg. from
+        `/products/simple`). Returns one row (product_id, code, status) per
+        product that is missing locally, stale, or deleted remotely.
+        """
+        self.conn.register("remote_listing", listing)
+        try:
+            return self.conn.execute("""
+                SELECT
+                    COALESCE(r.product_id, p.product_id) AS product_id,
+                    COALESCE(r.code, p.code) AS code,
+                    CASE
+                        WHEN p.product_id IS NULL THEN 'missing'
+                        WHEN r.product_id IS NULL THEN 'deleted'
+                        ELSE 'stale'
+                    END AS status
+                FROM (SELECT DISTINCT ON (product_id) * FROM remote_listing) r
+                FULL OUTER JOIN products p ON p.product_id = r.product_id
+                WHERE p.product_id IS NULL
+                    OR r.product_id IS NULL
+                    OR p.last_update_time IS NULL
+                    OR p.last_update_time <> r.last_update_time
+                ORDER BY 1
+            """).fetchdf()
+        finally:
+            self.conn.unregister("remote_listing")
+
+    def delete_products(self, product_ids: list) -> int:
+        """Delete products and all their child rows; returns products deleted.
+
+        DuckDB only sees deleted child rows as gone for the foreign keys on
+        products once they are committed, so children and products are
+        deleted in two transactions (not inside an outer one). If the second
+        fails, the products are left without children and are found again by
+        the next `verify-cache`.
+        """
+        if not product_ids:
+            return 0
+        ids = pd.DataFrame({"product_id": product_ids})
+        self.conn.register("deleted_products", ids)
+        only_deleted = "WHERE product_id IN (SELECT product_id FROM deleted_products)"
+        try:
+            with self.transaction():
+                children = [t for t in PRODUCT_TABLES if t != "products"]
+                for table in children + ["product_parameters"]:
+                    self.conn.execute(f"DELETE FROM {table} {only_deleted}")
+            with self.transaction():
+                return self.conn.execute(
+                    f"DELETE FROM products {only_deleted}"
+                ).fetchone()[0]
+        finally:
+            self.conn.unregister("deleted_products")
+
+    def update_product_stock(self, stock: pd.DataFrame) -> int:
+        """Update stock and availability of known products in one statement.
+
+        `stock` has columns product_id, stock, availability, availability_type;
+        products not in the local database or whose stock did not change are
+        left alone (changed ones lose their `content_hash`, so the next full
+        sync rewrites them). Returns rows updated.
+        """
+        if stock.empty:
+            return 0
+        self.conn.register("stock_updates", stock)
+        try:
+            updated = self.conn.execute("""
+                UPDATE products SET
+                    stock = stock_updates.stock,
+                    availability = stock_updates.availability,
+                    availability_type = stock_updates.availability_type,
+                    content_hash = NULL
+                FROM stock_updates
+                WHERE products.product_id = stock_updates.product_id
+                AND (products.stock, products.availability, products.availability_type)
+                    IS DISTINCT FROM (
+                        stock_updates.stock,
+                        stock_updates.availability,
+                        stock_updates.availability_type
+                    )
+            """).fetchone()[0]
+        finally:
+            self.conn.unregister("stock_updates")
+        return updated
+
+    def replace_product_prices(self, prices: pd.DataFrame, product_ids: list) -> int:
+        """Replace the price rows of `product_ids` with `prices`.
+
+        `prices` has columns product_id, currency, price_with_vat. Prices of
+        products not in the local database are skipped; unchanged prices are
+        left alone. Returns rows inserted.
+        """
+        if not product_ids:
+            return 0
+        ids = pd.DataFrame({"product_id": product_ids})
+        self.conn.register("price_product_ids", ids)
+        self.conn.register("price_updates", prices)
+        try:
+            with self.transaction():
+                changed: set = set()
+                inserted, _ = self._replace_children(
+                    "prices",
+                    PRICE_COLUMNS,
+                    "price_updates",
+                    "price_product_ids",
+                    touched=changed,
+                )
+                # Their rows no longer match the last full payload's hash
+                if changed:
+                    self.conn.execute(
+                        "UPDATE products SET content_hash = NULL "
+                        "WHERE list_contains(?, product_id)",
+                        [sorted(changed)],
+                    )
+        finally:
+            self.conn.unregister("price_product_ids")
+            self.conn.unregister("price_updates")
+        return inserted
 
     def insert_image(self, url):
         """Insert image URL into the images table."""
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+DuckDB Schema Migrations
+
+One-off changes to existing cache databases, applied in order and recorded in
+the `schema_migrations` table so each runs exactly once per database file.
+New databases get the current schema from `UpgatesDuckDBAPI._initialize_db`
+and then run every migration too, so a migration must be harmless on an empty
+or already-correct database.
+
+Each migration runs in its own transaction; a failing one is rolled back and
+raised, leaving the versions before it applied.
+
+Usage:
+
+    from upgates.db.migrations import apply_migrations
+    applied = apply_migrations(conn)
+
+File: upgates/db/migrations.py
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+import duckdb
+import logfire
+
+Migration = Tuple[int, str, Callable[[duckdb.DuckDBPyConnection], None]]
+
+# Child tables with their surrogate key and the columns that make a row unique
+CHILD_ROW_KEYS = {
+    "prices": ("id", ["product_id", "currency", "price_with_vat"]),
+    "images": ("id", ["product_id", "file_id", "url", "main_yn", "position"]),
+    "metas": ("meta_id", ["product_id", "meta_key", "meta_type", "meta_value"]),
+    "vats": ("vat_id", ["product_id", "country_code", "vat_percentage"]),
+}
+
+
+def _dedupe_product_children(conn: duckdb.DuckDBPyConnection) -> None:
+    # Before replace-on-sync every sync appended another copy of each row
+    for table, (key, columns) in CHILD_ROW_KEYS.items():
+        deleted = conn.execute(f"""
+            DELETE FROM {table} WHERE {key} NOT IN (
+                SELECT MIN({key}) FROM {table} GROUP BY {", ".join(columns)}
+            )
+        """).fetchone()[0]
+        if deleted:
+            logfire.info(f"🧹 Removed {deleted} duplicate {table} rows.")
+
+
+def _unique_category_links(conn: duckdb.DuckDBPyConnection) -> None:
+    # One link per (product_id, category_id), so categories can be upserted
+    deleted = conn.execute("""
+        DELETE FROM categories WHERE id NOT IN (
+            SELECT MIN(id) FROM categories GROUP BY product_id, category_id
+        )
+    """).fetchone()[0]
+    if deleted:
+        logfire.info(f"🧹 Removed {deleted} duplicate category links.")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS categories_product_category
+        ON categories (product_id, category_id)
+    """)
+
+
+# Columns added to tables created before customers and orders were stored
+ADDED_COLUMNS = {
+    "customers": {
+        "code": "TEXT",
+        "language": "TEXT",
+        "pricelist": "TEXT",
+        "active_yn": "BOOLEAN",
+        "creation_time": "TEXT",
+        "last_update_time": "TEXT",
+    },
+    "orders": {
+        "status_id": "INTEGER",
+        "currency": "TEXT",
+        "language": "TEXT",
+        "email": "TEXT",
+        "paid_date": "TEXT",
+        "creation_time": "TEXT",
+        "last_update_time": "TEXT",
+    },
+}
+
+
+def _customer_and_order_columns(conn: duckdb.DuckDBPyConnection) -> None:
+    # Orders are upserted on order_number, so it must be unique
+    for table, columns in ADDED_COLUMNS.items():
+        for column, dtype in columns.items():
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {dtype}"
+            )
+    conn.execute("""
+        DELETE FROM orders WHERE id NOT IN (
+            SELECT MAX(id) FROM orders GROUP BY order_number
+        )
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS orders_order_number
+        ON orders (order_number)
+    """)
+
+
+def _drop_legacy_parameter_tables(conn: duckdb.DuckDBPyConnection) -> None:
+    # The first parameter tables had no API IDs and were never filled; the
+    # current layout is created by UpgatesDuckDBAPI after the migrations run.
+    legacy = conn.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'parameters' AND column_name = 'id'
+    """).fetchone()[0]
+    if not legacy:
+        return
+    for table in (
+        "parameter_value_descriptions",
+        "parameter_descriptions",
+        "parameter_values",
+        "parameters",
+    ):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _product_column(column: str, dtype: str) -> Callable:
+    def migrate(conn: duckdb.DuckDBPyConnection) -> None:
+        # Staging tables of an interrupted `--commit run` sync get it too
+        tables = conn.execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_name IN ('products', 'staging_products')
+        """).fetchall()
+        for (table,) in tables:
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {dtype}"
+            )
+
+    return migrate
+
+
+def _product_last_update_time(conn: duckdb.DuckDBPyConnection) -> None:
+    _product_column("last_update_time", "TEXT")(conn)
+    # Hashed rows would be skipped as unchanged and never get the new column
+    # filled in, so verify-cache would find them stale on every run
+    conn.execute(
+        "UPDATE products SET content_hash = NULL WHERE last_update_time IS NULL"
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "dedupe product child rows", _dedupe_product_children),
+    (2, "unique category links", _unique_category_links),
+    (3, "customer and order columns", _customer_and_order_columns),
+    (4, "drop legacy parameter tables", _drop_legacy_parameter_tables),
+    (5, "product content hash", _product_column("content_hash", "TEXT")),
+    (6, "product last update time", _product_last_update_time),
+]
+
+
+def _create_migrations_table(conn: duckdb.DuckDBPyConnection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def applied_versions(conn: duckdb.DuckDBPyConnection) -> set:
+    """Versions already recorded in `schema_migrations`."""
+    _create_migrations_table(conn)
+    rows = conn.execute("SELECT version FROM schema_migrations").fetchall()
+    return {version for (version,) in rows}
+
+
+def apply_migrations(
+    conn: duckdb.DuckDBPyConnection, migrations: Optional[List[Migration]] = None
+) -> List[int]:
+    """Apply pending migrations in version order; returns the versions applied."""
+    done = applied_versions(conn)
+    applied = []
+    for version, name, migrate in sorted(migrations or MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                [version, name],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            logfire.error(f"❌ Schema migration {version} ({name}) failed.")
+            raise
+        logfire.info(f"🗄️ Applied schema migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+
+# EOF
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Cache Drift
+
+This module describes how the local `products` table differs from the shop, as
+found by comparing the slim `/products/simple` listing (ids, codes and
+`last_update_time`, 100 products per request) with the local rows:
+
+- **missing**: listed remotely, not stored locally;
+- **stale**: stored with a different (or no) `last_update_time`;
+- **deleted**: stored locally, no longer listed remotely.
+
+Missing and stale products are re-fetched by code (`?codes=`) and deleted ones
+are removed locally, so the cache can be trusted again for a handful of
+requests instead of a `clear-cache` and full re-sync. Rows cached before
+`last_update_time` was stored count as stale once.
+
+Usage:
+
+    drift = await client.verify_cache(repair=False)
+    print(drift.describe())
+
+File: upgates/drift.py
+"""
+
+from dataclasses import dataclass, field
+from typing import List
+
+import pandas as pd
+
+MISSING = "missing"
+STALE = "stale"
+DELETED = "deleted"
+
+
+@dataclass
+class CacheDrift:
+    """Differences between the remote product listing and the local cache."""
+
+    listed: int = 0
+    missing: List[str] = field(default_factory=list)
+    stale: List[str] = field(default_factory=list)
+    deleted: List[int] = field(default_factory=list)
+    unfetchable: int = 0  # missing or stale products without a code
+    refetched: int = 0  # re-fetched products actually written
+    unchanged: int = 0  # re-fetched products skipped (payload hash matched)
+    removed: int = 0
+    repaired: bool = False
+
+    @classmethod
+    def from_frame(cls, listed: int, drift: pd.DataFrame) -> "CacheDrift":
+        """Build from `compare_product_listing` rows (product_id, code, status)."""
+        fetchable = drift[drift["status"] != DELETED]
+        return cls(
+            listed=listed,
+            missing=_codes(fetchable, MISSING),
+            stale=_codes(fetchable, STALE),
+            deleted=sorted(
+                int(product_id)
+                for product_id in drift.loc[drift["status"] == DELETED, "product_id"]
+            ),
+            unfetchable=int(fetchable["code"].isna().sum()),
+        )
+
+    @property
+    def refetch(self) -> List[str]:
+        """Codes to re-fetch: missing and stale products."""
+        return sorted(set(self.missing) | set(self.stale))
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.missing or self.stale or self.deleted)
+
+    def describe(self) -> str:
+        """Human readable summary of the drift (and the repair, if any)."""
+        if self.in_sync:
+            return f"IN SYNC: all {self.listed} listed products match the cache."
+        summary = (
+            f"DRIFT: {self.listed} products listed; {len(self.missing)} missing, "
+            f"{len(self.stale)} stale, {len(self.deleted)} deleted remotely"
+        )
+        if self.unfetchable:
+            summary += f", {self.unfetchable} without a code (not re-fetchable)"
+        if self.repaired:
+            summary += (
+                f". Repaired: {self.refetched} re-fetched and written, "
+                f"{self.unchanged} re-fetched but unchanged, {self.removed} removed"
+            )
+        return summary + "."
+
+
+def _codes(drift: pd.DataFrame, status: str) -> List[str]:
+    return sorted(drift.loc[(drift["status"] == status), "code"].dropna().tolist())
+
+
+# EOF
@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Mock API Server
+
+This module serves a local aiohttp imitation of the Upgates v2 endpoints used by
+`UpgatesClient` (`products`, `products/simple`, `products/prices`,
+`products/parameters`, `customers`, `orders`, `parameters` and `PUT products`),
+shaped after
+`context/references/upgates/upgatesapiv2.apib`, so sync throughput can be
+benchmarked and regression-tested without touching the live shop or its quota.
+
+The catalog is synthetic and of configurable size. Like the real API the mock:
+
+- pages lists by `page` and honours `last_update_time_from`, `codes` and
+  `in_stock_yn`;
+- sends the `X-Rate-Limit-*` quota headers and answers `429` with a GMT
+  `Retry-After` once the hourly and daily limits are used up;
+- answers `429` (without `Retry-After`) above 3 concurrent requests;
+- rejects `PUT` requests with more than 100 items with `413`.
+
+Latency and extra 429s (every Nth request) can be injected on top.
+
+Usage:
+
+    $> upgates mock-server --products 5000 --latency-ms 150 --port 8089
+    $> UPGATES_API_URL=http://127.0.0.1:8089/api/v2 upgates sync-all
+
+    api = MockUpgatesAPI(MockCatalog(products=500), MockSettings(latency_ms=50))
+    web.run_app(api.app(), port=8089)
+
+File: upgates/mock_server.py
+"""
+
+import asyncio
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, List, Optional
+
+import logfire
+from aiohttp import web
+
+from upgates.models.payloads import dumps, loads
+
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone(timedelta(hours=1)))
+PARAGRAPH = "<p>Ručně vyráběný <strong>šperk</strong> z chirurgické oceli.</p>\n"
+LANGUAGES = ("cz", "en")
+
+
+def _timestamp(minutes: int) -> str:
+    return (BASE_TIME + timedelta(minutes=minutes)).isoformat()
+
+
+def synthetic_product(
+    product_id: int,
+    description_kb: int = 20,
+    last_update_time: str = "2025-03-01T12:00:00+01:00",
+) -> Dict[str, Any]:
+    """Build one full `/products` item with HTML descriptions of ~description_kb."""
+    long_description = PARAGRAPH * max(1, description_kb * 1024 // len(PARAGRAPH))
+    stock = (product_id - 1) % 7
+    return {
+        "product_id": product_id,
+        "code": f"P{product_id:06d}",
+        "ean": f"859{product_id:010d}",
+        "manufacturer": "Neven",
+        "stock": stock,
+        "weight": 120,
+        "availability": "Skladem" if stock else "Na dotaz",
+        "availability_type": "InStock" if stock else "OnRequest",
+        "unit": "ks",
+        "action_currently_yn": False,
+        "active_yn": True,
+        "archived_yn": False,
+        "can_add_to_basket_yn": True,
+        "last_update_time": last_update_time,
+        "descriptions": [
+            {
+                "language": language,
+                "title": f"Produkt {product_id}",
+                "short_description": PARAGRAPH,
+                "long_description": long_description,
+                "url": f"https://example.com/{language}/p{product_id}",
+                "seo_title": f"Produkt {product_id}",
+            }
+            for language in LANGUAGES
+        ],
+        "prices": [
+            {
+                "language": "cz",
+                "currency": "CZK",
+                "pricelists": [{"name": "Výchozí", "price_with_vat": 499.0}],
+            }
+        ],
+        "images": [
+            {
+                "file_id": product_id,
+                "url": f"https://example.com/img/{product_id}.jpg",
+                "main_yn": True,
+                "position": 1,
+            }
+        ],
+        "categories": [
+            {"category_id": 1, "code": "rings", "main_yn": True, "position": 1}
+        ],
+        "metas": [],
+        "vats": {"CZ": 21},
+    }
+
+
+def synthetic_customer(customer_id: int) -> Dict[str, Any]:
+    """Build one `/customers` item."""
+    return {
+        "customer_id": customer_id,
+        "type": "customer",
+        "firstname": "Jana",
+        "surname": f"Nováková {customer_id}",
+        "code": f"C{customer_id:06d}",
+        "language": "cz",
+        "pricelist": "Výchozí",
+        "company": None,
+        "communication": {"phone": f"+420777{customer_id:06d}"},
+        "login": {
+            "active_yn": True,
+            "blocked_yn": False,
+            "email": f"customer{customer_id}@example.com",
+        },
+        "creation_time": _timestamp(customer_id),
+        "last_update_time": _timestamp(customer_id * 2),
+    }
+
+
+def synthetic_order(order_id: int, products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build one `/orders` item buying 1-3 of `products`."""
+    items = [
+        products[(order_id * 7 + i) % len(products)] for i in range(1 + order_id % 3)
+    ]
+    return {
+        "order_number": f"{2025000000 + order_id}",
+        "order_id": order_id,
+        "external_order_number": None,
+        "language_id": "cz",
+        "currency_id": "CZK",
+        "prices_with_vat_yn": True,
+        "status_id": 1,
+        "status": "Přijatá",
+        "paid_date": None,
+        "creation_time": _timestamp(order_id * 3),
+        "last_update_time": _timestamp(order_id * 3 + 1),
+        "order_total": 499.0 * len(items),
+        "customer": {
+            "customer_id": order_id,
+            "email": f"customer{order_id}@example.com",
+            "phone": None,
+            "firstname_invoice": "Jana",
+            "surname_invoice": f"Nováková {order_id}",
+            "company": None,
+        },
+        "products": [
+            {
+                "product_id": product["product_id"],
+                "uuid": f"{order_id}-{i}",
+                "type": "product",
+                "code": product["code"],
+                "title": product["descriptions"][0]["title"],
+                "quantity": 1,
+                "price_per_unit": 499.0,
+                "price_with_vat": 499.0,
+                "price_without_vat": 412.4,
+                "vat": 21,
+            }
+            for i, product in enumerate(items)
+        ],
+    }
+
+
+def synthetic_parameter(parameter_id: int, values: int = 5) -> Dict[str, Any]:
+    """Build one `/parameters` item with `values` values."""
+    return {
+        "id": parameter_id,
+        "descriptions": [
+            {"language": language, "name": f"Parametr {parameter_id}"}
+            for language in LANGUAGES
+        ],
+        "values": [
+            {
+                "id": parameter_id * 100 + position,
+                "descriptions": [
+                    {"language": language, "value": f"Hodnota {position}"}
+                    for language in LANGUAGES
+                ],
+                "position": position,
+            }
+            for position in range(1, values + 1)
+        ],
+        "position": parameter_id,
+        "display_type": "select",
+        "display_in_product_list_yn": False,
+        "display_in_product_detail_yn": True,
+        "display_in_filters_as_slider_yn": False,
+    }
+
+
+class MockCatalog:
+    """Synthetic shop data served by the mock API."""
+
+    def __init__(
+        self,
+        products: int = 1000,
+        customers: int = 200,
+        orders: int = 500,
+        parameters: int = 20,
+        description_kb: int = 20,
+    ):
+        self.products = [
+            synthetic_product(i, description_kb, _timestamp(i))
+            for i in range(1, products + 1)
+        ]
+        self.customers = [synthetic_customer(i) for i in range(1, customers + 1)]
+        self.orders = (
+            [synthetic_order(i, self.products) for i in range(1, orders + 1)]
+            if self.products
+            else []
+        )
+        self.parameters = [synthetic_parameter(i) for i in range(1, parameters + 1)]
+        self.by_code = {product["code"]: product for product in self.products}
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the mock API; the defaults follow the real API's limits."""
+
+    page_size: int = 100
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    max_concurrency: int = 3
+    hour_limit: int = 100000
+    day_limit: int = 0
+    throttle_every: int = 0  # answer every Nth request with 429 (0: never)
+    retry_after: int = 1  # seconds until a throttled request may be retried
+    max_put_items: int = 100
+
+
+def _simple(product: Dict[str, Any]) -> Dict[str, Any]:
+    keys = (
+        "code",
+        "product_id",
+        "ean",
+        "active_yn",
+        "archived_yn",
+        "can_add_to_basket_yn",
+        "stock",
+        "availability",
+        "availability_type",
+        "weight",
+        "last_update_time",
+    )
+    return {**{key: product.get(key) for key in keys}, "variants": []}
+
+
+def _prices(product: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ("code", "product_id", "action_currently_yn", "prices")
+    return {**{key: product.get(key) for key in keys}, "variants": []}
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class MockUpgatesAPI:
+    """aiohttp application imitating the Upgates v2 API over a MockCatalog."""
+
+    def __init__(
+        self,
+        catalog: Optional[MockCatalog] = None,
+        settings: Optional[MockSettings] = None,
+    ):
+        self.catalog = catalog or MockCatalog()
+        self.settings = settings or MockSettings()
+        self.requests: Counter = Counter()  # served requests by "METHOD endpoint"
+        self.throttled: Counter = Counter()  # 429s by reason
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._window_hour: Optional[datetime] = None
+        self._hour_used = 0
+        self._day_used = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._limits])
+        app.router.add_get("/api/v2/products", self._list("products"))
+        app.router.add_put("/api/v2/products", self.put_products)
+        app.router.add_get("/api/v2/products/simple", self._list("products", _simple))
+        app.router.add_get("/api/v2/products/prices", self._list("products", _prices))
+        app.router.add_get(
+            "/api/v2/products/parameters",
+            self._list("products", self._product_parameters),
+        )
+        app.router.add_get("/api/v2/customers", self._list("customers"))
+        app.router.add_get("/api/v2/orders", self._list("orders"))
+        app.router.add_get("/api/v2/parameters", self._list("parameters"))
+        return app
+
+    # Quota ---------------------------------------------------------------
+
+    def _quota_headers(self) -> Dict[str, str]:
+        settings = self.settings
+        hour_remaining = max(0, settings.hour_limit - self._hour_used)
+        day_remaining = max(0, settings.day_limit - self._day_used)
+        return {
+            "X-Rate-Limit-Hour": str(settings.hour_limit),
+            "X-Rate-Limit-Day": str(settings.day_limit),
+            "X-Rate-Limit-Hour-Remaining": str(hour_remaining),
+            "X-Rate-Limit-Day-Remaining": str(day_remaining),
+            "X-Rate-Limit-Total-Remaining": str(hour_remaining + day_remaining),
+        }
+
+    def _take_quota(self, now: datetime) -> bool:
+        """Draw one request from the hourly, then the daily limit."""
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        if self._window_hour is None or hour != self._window_hour:
+            if self._window_hour is None or hour.date() != self._window_hour.date():
+                self._day_used = 0
+            self._window_hour = hour
+            self._hour_used = 0
+        if self._hour_used < self.settings.hour_limit:
+            self._hour_used += 1
+        elif self._day_used < self.settings.day_limit:
+            self._day_used += 1
+        else:
+            return False
+        return True
+
+    def _throttle(self, reason: str, retry_at: Optional[datetime]) -> web.Response:
+        self.throttled[reason] += 1
+        headers = self._quota_headers()
+        if retry_at is not None:
+            headers["Retry-After"] = format_datetime(retry_at, usegmt=True)
+        return web.json_response(
+            {"error": "Too Many Requests", "reason": reason},
+            status=429,
+            headers=headers,
+            dumps=dumps,
+        )
+
+    @web.middleware
+    async def _limits(self, request: web.Request, handler) -> web.StreamResponse:
+        """Apply the concurrency rule, quota, injected 429s and latency."""
+        settings = self.settings
+        if self.in_flight >= settings.max_concurrency:
+            return self._throttle("concurrency", None)
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            delay = settings.latency_ms + random.uniform(0, settings.jitter_ms)
+            if delay:
+                await asyncio.sleep(delay / 1000)
+
+            now = datetime.now(timezone.utc)
+            served = sum(self.requests.values()) + sum(self.throttled.values()) + 1
+            if settings.throttle_every and served % settings.throttle_every == 0:
+                return self._throttle(
+                    "injected", now + timedelta(seconds=settings.retry_after)
+                )
+            if not self._take_quota(now):
+                return self._throttle(
+                    "quota", self._window_hour + timedelta(hours=1)  # type: ignore
+                )
+
+            self.requests[f"{request.method} {request.path[len('/api/v2/'):]}"] += 1
+            response = await handler(request)
+            response.headers.update(self._quota_headers())
+            return response
+        finally:
+            self.in_flight -= 1
+
+    # Endpoints -----------------------------------------------------------
+
+    def _filter(
+        self, items: List[Dict[str, Any]], query: Dict[str, str]
+    ) -> List[Dict[str, Any]]:
+        since = _parse_time(query.get("last_update_time_from", ""))
+        if since is not None:
+            items = [
+                item
+                for item in items
+                if (_parse_time(item.get("last_update_time", "")) or since) >= since
+            ]
+        if query.get("codes"):
+            codes = set(query["codes"].split(";"))
+            items = [item for item in items if item.get("code") in codes]
+        if query.get("in_stock_yn") in ("0", "1"):
+            in_stock = query["in_stock_yn"] == "1"
+            items = [item for item in items if bool(item.get("stock")) == in_stock]
+        return items
+
+    def _product_parameters(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        """Build one `products/parameters` item (a product's own
+        `parameters_new`, or one value of one catalog parameter)."""
+        links = []
+        if self.catalog.parameters:
+            index = product["product_id"] - 1
+            parameter = self.catalog.parameters[index % len(self.catalog.parameters)]
+            values = parameter["values"]
+            if values:
+                value = values[index % len(values)]
+                links.append(
+                    {
+                        "id": parameter["id"],
+                        "descriptions": parameter["descriptions"],
+                        "values": [
+                            {"id": value["id"], "descriptions": value["descriptions"]}
+                        ],
+                    }
+                )
+        return {
+            "code": product.get("code"),
+            "product_id": product.get("product_id"),
+            "parameters": [],
+            "parameters_new": product.get("parameters_new", links),
+            "variants": [],
+        }
+
+    def _list(self, key: str, shape=None):
+        async def handler(request: web.Request) -> web.Response:
+            items = self._filter(getattr(self.catalog, key), dict(request.query))
+            size = self.settings.page_size
+            pages = max(1, math.ceil(len(items) / size))
+            try:
+                page = max(1, int(request.query.get("page", 1)))
+            except ValueError:
+                page = 1
+            chunk = items[(page - 1) * size : page * size]
+            body = {
+                "current_page": page,
+                "current_page_items": len(chunk),
+                "number_of_pages": pages,
+                "number_of_items": len(items),
+                key: [shape(item) for item in chunk] if shape else chunk,
+            }
+            return web.Response(body=dumps(body), content_type="application/json")
+
+        return handler
+
+    async def put_products(self, request: web.Request) -> web.Response:
+        """Update product descriptions by code; report each product separately."""
+        products = loads(await request.read()).get("products") or []
+        if len(products) > self.settings.max_put_items:
+            return web.json_response(
+                {"error": f"More than {self.settings.max_put_items} items."},
+                status=413,
+            )
+
+        results = []
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        for update in products:
+            product = self.catalog.by_code.get(update.get("code"))
+            if product is None:
+                results.append(
+                    {
+                        "code": update.get("code"),
+                        "updated_yn": False,
+                        "messages": [
+                            {
+                                "object": "product",
+                                "property": "code",
+                                "message": "Product does not exist.",
+                                "level": "error",
+                            }
+                        ],
+                    }
+                )
+                continue
+            descriptions = {d["language"]: d for d in product["descriptions"]}
+            for description in update.get("descriptions") or []:
+                language = description.get("language")
+                descriptions[language] = {
+                    **descriptions.get(language, {}),
+                    **description,
+                }
+            product["descriptions"] = list(descriptions.values())
+            product["last_update_time"] = now
+            results.append(
+                {
+                    "product_id": product["product_id"],
+                    "code": product["code"],
+                    "product_url": product["descriptions"][0].get("url"),
+                    "updated_yn": True,
+                    "messages": [],
+                }
+            )
+        return web.Response(
+            body=dumps({"products": results}), content_type="application/json"
+        )
+
+
+def run_mock_server(
+    catalog: MockCatalog, settings: MockSettings, host: str = "127.0.0.1", port=8089
+) -> None:
+    """Serve the mock API until interrupted."""
+    logfire.info(
+        f"🧪 Mock Upgates API on http://{host}:{port}/api/v2 "
+        f"({len(catalog.products)} products, {len(catalog.customers)} customers, "
+        f"{len(catalog.orders)} orders)"
+    )
+    web.run_app(MockUpgatesAPI(catalog, settings).app(), host=host, port=port)
+
+
+# EOF
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates API Payloads
+
+Typed schemas of the JSON pages returned by the Upgates API and the decoder used
+to read them. Pages are decoded straight from the raw response bytes with orjson
+(falling back to the standard library) into plain dicts; the `TypedDict` schemas
+below describe their shape for type checkers without a per-item validation cost.
+
+Only the fields read by this package are listed; the API returns more.
+
+Usage:
+
+    page: ProductsPage = loads(body)
+    for product in page["products"]:
+        print(product["code"], product.get("stock"))
+
+File: upgates/models/payloads.py
+"""
+
+import json
+from typing import Any, Dict, List, Optional, TypedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def loads(body: bytes) -> Any:
+    """Decode a JSON document from raw bytes."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(data: Any, sort_keys: bool = False) -> str:
+    """Encode a JSON document, eg. a request payload.
+
+    With `sort_keys` the output is canonical (sorted keys, compact separators),
+    eg. for hashing.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(data, option=option).decode()
+    if sort_keys:
+        return json.dumps(
+            data, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+    return json.dumps(data, ensure_ascii=False)
+
+
+class Page(TypedDict, total=False):
+    current_page: int
+    current_page_items: int
+    number_of_pages: int
+    number_of_items: int
+
+
+class PricelistPayload(TypedDict, total=False):
+    name: str
+    price_original: Optional[float]
+    price_sale: Optional[float]
+    price_with_vat: Optional[float]
+    price_without_vat: Optional[float]
+
+
+class PricePayload(TypedDict, total=False):
+    language: str
+    currency: str
+    pricelists: List[PricelistPayload]
+
+
+class DescriptionPayload(TypedDict, total=False):
+    language: str
+    title: str
+    short_description: str
+    long_description: str
+    url: str
+    seo_title: str
+    seo_description: str
+    seo_url: str
+    seo_keywords: str
+    unit: str
+
+
+class ImagePayload(TypedDict, total=False):
+    file_id: int
+    url: str
+    main_yn: bool
+    position: int
+
+
+class CategoryPayload(TypedDict, total=False):
+    category_id: int
+    code: str
+    name: str
+    main_yn: bool
+    position: int
+
+
+class MetaPayload(TypedDict, total=False):
+    key: str
+    type: str
+    value: Any
+
+
+class ProductPayload(TypedDict, total=False):
+    product_id: int
+    code: str
+    ean: str
+    manufacturer: str
+    stock: Optional[float]
+    weight: Optional[float]
+    availability: str
+    availability_type: str
+    unit: str
+    action_currently_yn: bool
+    active_yn: bool
+    archived_yn: bool
+    can_add_to_basket_yn: bool
+    adult_yn: bool
+    set_yn: bool
+    in_set_yn: bool
+    exclude_from_search_yn: bool
+    last_update_time: str
+    descriptions: List[DescriptionPayload]
+    prices: List[PricePayload]
+    images: List[ImagePayload]
+    categories: List[CategoryPayload]
+    metas: List[MetaPayload]
+    vats: Dict[str, float]
+
+
+class ProductsPage(Page, total=False):
+    products: List[ProductPayload]
+
+
+class CustomerCompanyPayload(TypedDict, total=False):
+    name: Optional[str]
+    company_number: Optional[str]
+    vat_number: Optional[str]
+    vat_payer_yn: bool
+
+
+class CustomerLoginPayload(TypedDict, total=False):
+    active_yn: bool
+    blocked_yn: bool
+    email: str
+
+
+class CustomerPayload(TypedDict, total=False):
+    customer_id: int
+    type: str
+    firstname: Optional[str]
+    surname: Optional[str]
+    code: Optional[str]
+    language: str
+    pricelist: str
+    company: Optional[CustomerCompanyPayload]
+    communication: Dict[str, Optional[str]]
+    login: CustomerLoginPayload
+    creation_time: str
+    last_update_time: str
+
+
+class CustomersPage(Page, total=False):
+    customers: List[CustomerPayload]
+
+
+class OrderCustomerPayload(TypedDict, total=False):
+    customer_id: Optional[int]
+    email: Optional[str]
+    phone: Optional[str]
+    firstname_invoice: Optional[str]
+    surname_invoice: Optional[str]
+    company: Optional[str]
+
+
+class OrderProductPayload(TypedDict, total=False):
+    product_id: Optional[int]
+    uuid: str
+    type: str
+    code: Optional[str]
+    title: Optional[str]
+    quantity: float
+    price_per_unit: float
+    price_with_vat: float
+    price_without_vat: float
+    vat: float
+
+
+class OrderPayload(TypedDict, total=False):
+    order_number: str
+    order_id: int
+    external_order_number: Optional[str]
+    language_id: str
+    currency_id: str
+    prices_with_vat_yn: bool
+    status_id: Optional[int]
+    status: Optional[str]
+    paid_date: Optional[str]
+    creation_time: str
+    last_update_time: str
+    order_total: float
+    customer: OrderCustomerPayload
+    products: List[OrderProductPayload]
+
+
+class OrdersPage(Page, total=False):
+    orders: List[OrderPayload]
+
+
+# EOF
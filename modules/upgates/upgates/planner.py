@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Request Budget Planner
+
+This module estimates how many API requests a sync needs and compares that with
+the quota reported in the `X-Rate-Limit-*` headers, before any data is written.
+A sync that runs out of daily quota half way leaves the local cache partially
+updated and blocks order processing, so large syncs are planned up front:
+
+- **run**: the whole sync fits in the quota available now;
+- **split**: it fits once later hourly windows refill the hourly limit, and the
+  scheduler is allowed to wait for them;
+- **refuse**: it cannot finish within a day of quota windows.
+
+Usage:
+
+    plan = plan_requests({"products": 120}, client.quota, reserve=10)
+    if plan.action == "refuse":
+        raise RateLimitExceeded(plan.describe())
+
+File: upgates/planner.py
+"""
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from upgates.ratelimit import QuotaState, next_hour
+
+RUN = "run"
+SPLIT = "split"
+REFUSE = "refuse"
+
+MAX_WINDOWS = 24  # hourly quota windows a single sync may span
+
+
+@dataclass
+class SyncPlan:
+    """Requests a sync still needs versus the quota, and what to do about it."""
+
+    pages: Dict[str, int] = field(default_factory=dict)
+    requests: int = 0
+    available: Optional[int] = None
+    hour_limit: Optional[int] = None
+    reserve: int = 0
+    windows: int = 1
+    finishes_at: Optional[datetime] = None
+    action: str = RUN
+    reason: str = ""
+
+    def describe(self) -> str:
+        """Human readable summary of the plan."""
+        pages = ", ".join(f"{endpoint}: {n}" for endpoint, n in self.pages.items())
+        budget = (
+            "unknown quota"
+            if self.available is None
+            else f"{self.available} available now (reserve {self.reserve}, "
+            f"hourly limit {self.hour_limit})"
+        )
+        summary = f"{self.requests} requests needed ({pages}); {budget}"
+        if self.action == SPLIT and self.finishes_at:
+            summary += (
+                f"; spans {self.windows} hourly windows, finishing after "
+                f"{self.finishes_at:%Y-%m-%d %H:%M} UTC"
+            )
+        return f"{self.action.upper()}: {summary}. {self.reason}".strip()
+
+
+def plan_requests(
+    pages: Dict[str, int],
+    quota: QuotaState,
+    reserve: int = 0,
+    max_wait: float = 3600,
+    now: Optional[datetime] = None,
+) -> SyncPlan:
+    """Decide whether a sync needing `pages` requests per endpoint can run."""
+    now = now or datetime.now(timezone.utc)
+    needed = sum(pages.values())
+    plan = SyncPlan(
+        pages=dict(pages),
+        requests=needed,
+        available=quota.available,
+        hour_limit=quota.hour_limit,
+        reserve=reserve,
+    )
+
+    if quota.available is None:
+        plan.reason = "No quota headers seen yet; running without a budget check."
+        return plan
+
+    budget_now = max(0, quota.available - reserve)
+    if needed <= budget_now:
+        plan.reason = "The sync fits in the current quota."
+        return plan
+
+    if not quota.hour_limit:
+        plan.action = REFUSE
+        plan.reason = "Not enough quota and no hourly limit to wait for."
+        return plan
+
+    # Hourly limits refill at the start of each hour; the daily one does not
+    extra = math.ceil((needed - budget_now) / quota.hour_limit)
+    plan.windows = 1 + extra
+    plan.finishes_at = next_hour(now) + timedelta(hours=extra - 1)
+
+    if plan.windows > MAX_WINDOWS:
+        plan.action = REFUSE
+        plan.reason = (
+            f"It would take {plan.windows} hourly windows; run it in parts "
+            "(--page-count) or buy additional quota."
+        )
+    elif max_wait < (next_hour(now) - now).total_seconds():
+        plan.action = REFUSE
+        plan.reason = (
+            f"It needs to wait for the next hourly window, but UPGATES_QUOTA_MAX_WAIT "
+            f"is {max_wait:.0f}s."
+        )
+    else:
+        plan.action = SPLIT
+        plan.reason = "Requests pause at the quota limit until the next window."
+    return plan
+
+
+# EOF
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates API Rate Limiting
+
+This module keeps track of the request budget reported by the Upgates API in its
+`X-Rate-Limit-*` response headers and paces client requests so that a sync never
+trips the hourly/daily limits or the concurrent request limit.
+
+Upgates draws requests from the hourly limit first and from the daily limit after
+that; the hourly limit resets at the start of every hour. A `429` response carries
+a `Retry-After` header with the GMT time of the next unthrottled request.
+
+Concurrency is adjusted AIMD-style: every round of successful requests raises the
+limit by one (up to `max_concurrency`), a 429 or a latency spike halves it.
+
+With a `HostCoordinator` (upgates/coordinator.py) the concurrent request limit
+and the quota are shared with the other processes on the host.
+
+Usage:
+
+    scheduler = RequestScheduler(max_concurrency=3)
+    async with scheduler.slot():
+        async with session.get(url) as response:
+            scheduler.update(response.status, response.headers)
+
+File: upgates/ratelimit.py
+"""
+
+import asyncio
+import dataclasses
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Mapping, Optional
+
+import logfire
+
+from upgates.coordinator import LEDGER_FIELDS
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when the API quota cannot be satisfied within the allowed wait."""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_retry_after(
+    value: Optional[str], now: Optional[datetime] = None
+) -> Optional[datetime]:
+    """Parse a `Retry-After` header given as an HTTP date (GMT) or delta seconds."""
+    if not value:
+        return None
+    now = now or _utcnow()
+    value = value.strip()
+    if value.isdigit():
+        return now + timedelta(seconds=int(value))
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            retry_at = datetime.fromisoformat(value)
+        except ValueError:
+            logfire.warning(f"⚠️ Unparseable Retry-After header: {value!r}")
+            return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return retry_at
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (from 1)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def next_hour(now: datetime) -> datetime:
+    """Start of the next hourly quota window."""
+    return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+@dataclass
+class QuotaState:
+    """Last known API quota, as reported by the `X-Rate-Limit-*` headers."""
+
+    hour_limit: Optional[int] = None
+    day_limit: Optional[int] = None
+    hour_remaining: Optional[int] = None
+    day_remaining: Optional[int] = None
+    total_remaining: Optional[int] = None
+    retry_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    requests_sent: int = 0
+    throttled: int = 0
+
+    @property
+    def available(self) -> Optional[int]:
+        """Requests that can be made before the next hourly reset, if known."""
+        if self.hour_remaining is None and self.day_remaining is None:
+            return self.total_remaining
+        return (self.hour_remaining or 0) + (self.day_remaining or 0)
+
+
+class RequestScheduler:
+    """Paces API requests against the quota and the concurrent request limit."""
+
+    EWMA_ALPHA = 0.2  # weight of the newest latency sample
+    MIN_LATENCY_SAMPLES = 5  # samples needed before latency spikes count
+
+    def __init__(
+        self,
+        max_concurrency: int = 3,
+        reserve: int = 0,
+        max_wait: float = 3600,
+        latency_spike_factor: float = 3.0,
+        coordinator=None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.coordinator = coordinator
+        self.reserve = max(0, reserve)
+        self.max_wait = max_wait
+        self.latency_spike_factor = latency_spike_factor
+        self.state = QuotaState()
+        self.limit = self.max_concurrency
+        self.latency_ewma: Optional[float] = None
+        self._latency_samples = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._throttle_streak = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    def snapshot(self) -> QuotaState:
+        """Return a copy of the current quota state."""
+        return dataclasses.replace(self.state)
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Primitives are bound to one loop; the client may be reused across asyncio.run()
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self._in_flight = 0
+        return self._condition
+
+    def delay(self, now: Optional[datetime] = None) -> float:
+        """Seconds to wait before the next request may be sent."""
+        now = now or _utcnow()
+        state = self.state
+        if state.retry_at and state.retry_at > now:
+            return (state.retry_at - now).total_seconds()
+
+        available = state.available
+        if available is not None and available - self._in_flight <= self.reserve:
+            if state.updated_at and state.updated_at < now.replace(
+                minute=0, second=0, microsecond=0
+            ):
+                # The budget was reported in an earlier hourly window; probe again.
+                return 0.0
+            return (next_hour(now) - now).total_seconds()
+        return 0.0
+
+    def _merge_ledger(self) -> None:
+        """Adopt quota figures other processes saw more recently than we did."""
+        if self.coordinator is None:
+            return
+        ledger = self.coordinator.read()
+        state = self.state
+        updated_at = ledger.get("updated_at")
+        if updated_at and (state.updated_at is None or updated_at > state.updated_at):
+            for field in LEDGER_FIELDS:
+                setattr(state, field, ledger.get(field))
+            state.updated_at = updated_at
+        retry_at = ledger.get("retry_at")
+        if retry_at and (state.retry_at is None or retry_at > state.retry_at):
+            state.retry_at = retry_at
+
+    async def _wait_for_quota(self) -> None:
+        self._merge_ledger()
+        while (wait := self.delay()) > 0:
+            if wait > self.max_wait:
+                raise RateLimitExceeded(
+                    f"API quota exhausted; next request possible in {wait:.0f}s "
+                    f"(max wait {self.max_wait:.0f}s). Quota: {self.state}"
+                )
+            logfire.info(
+                f"⏳ API quota pacing: waiting {wait:.1f}s. Quota: {self.state}"
+            )
+            await asyncio.sleep(wait)
+            self._merge_ledger()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for quota and a free concurrency slot, then hold it for one request.
+
+        With a coordinator the slot is also one of the host-wide request slots.
+        """
+        condition = self._get_condition()
+        await self._wait_for_quota()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        host_slot = None
+        try:
+            if self.coordinator is not None:
+                host_slot = await self.coordinator.acquire()
+            self.state.requests_sent += 1
+            yield
+        finally:
+            if host_slot is not None:
+                self.coordinator.release(host_slot)
+            async with condition:
+                self._in_flight -= 1
+                condition.notify_all()
+
+    def _decrease(self, reason: str) -> None:
+        # One decrease per round trip, so a burst of slow/throttled replies counts once
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency_ewma or 0.0):
+            return
+        self._last_decrease = now
+        self._successes = 0
+        if self.limit > 1:
+            self.limit = max(1, self.limit // 2)
+            logfire.info(f"📉 API concurrency reduced to {self.limit} ({reason}).")
+
+    def _observe(self, status: int, latency: Optional[float]) -> None:
+        """Adjust the concurrency limit from one response (AIMD)."""
+        if status == 429:
+            self._decrease("rate limited")
+            return
+        if latency is None:
+            return
+
+        ewma = self.latency_ewma
+        if (
+            ewma is not None
+            and self._latency_samples >= self.MIN_LATENCY_SAMPLES
+            and latency > ewma * self.latency_spike_factor
+        ):
+            self._decrease(f"latency {latency:.2f}s vs {ewma:.2f}s average")
+        else:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes = 0
+                logfire.debug(f"📈 API concurrency raised to {self.limit}.")
+
+        self._latency_samples += 1
+        self.latency_ewma = (
+            latency if ewma is None else ewma + self.EWMA_ALPHA * (latency - ewma)
+        )
+
+    def update(
+        self,
+        status: int,
+        headers: Mapping[str, str],
+        latency: Optional[float] = None,
+    ) -> QuotaState:
+        """Record the quota reported by a response and its latency in seconds."""
+        now = _utcnow()
+        state = self.state
+        for field, header in (
+            ("hour_limit", "X-Rate-Limit-Hour"),
+            ("day_limit", "X-Rate-Limit-Day"),
+            ("hour_remaining", "X-Rate-Limit-Hour-Remaining"),
+            ("day_remaining", "X-Rate-Limit-Day-Remaining"),
+            ("total_remaining", "X-Rate-Limit-Total-Remaining"),
+        ):
+            value = _header_int(headers, header)
+            if value is not None:
+                setattr(state, field, value)
+        state.updated_at = now
+        self._observe(status, latency)
+
+        if status == 429:
+            state.throttled += 1
+            self._throttle_streak += 1
+            retry_at = parse_retry_after(headers.get("Retry-After"), now)
+            if retry_at is None:
+                # Concurrency 429s come without Retry-After; back off briefly.
+                retry_at = now + timedelta(seconds=min(2**self._throttle_streak, 60))
+            state.retry_at = retry_at
+            logfire.warning(
+                f"⚠️ API rate limit hit (429); retrying at {retry_at.isoformat()}"
+            )
+        else:
+            self._throttle_streak = 0
+            if state.retry_at and state.retry_at <= now:
+                state.retry_at = None
+        if self.coordinator is not None:
+            self.coordinator.publish(state)
+        return state
+
+
+# EOF
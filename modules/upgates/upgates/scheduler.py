@@ -1,14 +1,36 @@
+import asyncio
 import time
 
 import schedule
 
+from upgates import config
+from upgates.client import UpgatesClient
+
+
+async def _incremental_sync() -> None:
+    async with UpgatesClient() as client:
+        await client.sync_all(incremental=True)
+
+
+async def _stock_price_sync() -> None:
+    async with UpgatesClient() as client:
+        await client.sync_stock_prices()
+
 
 def scheduled_sync():
-    """Runs full API sync on a schedule."""
+    """Runs incremental API sync on a schedule."""
     print("🔄 Running scheduled sync...")
+    asyncio.run(_incremental_sync())
+
+
+def scheduled_stock_sync():
+    """Refreshes stock and prices from the slim product endpoints."""
+    print("🔄 Running scheduled stock & price refresh...")
+    asyncio.run(_stock_price_sync())
 
 
 schedule.every(30).minutes.do(scheduled_sync)
+schedule.every(config.UPGATES_STOCK_SYNC_MINUTES).minutes.do(scheduled_stock_sync)
 
 print("🕒 Scheduled sync initialized.")
 while True:
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Request Telemetry
+
+This module collects one sample per Upgates API request — endpoint, page, status,
+bytes, latency and the quota left afterwards — plus the time spent decoding and
+storing each page, so a slow sync can be attributed to the network, JSON
+decoding or DuckDB. Samples are buffered in memory (up to `max_samples`, oldest
+dropped first) and flushed to the DuckDB `api_requests` table, which the
+`upgates stats` command summarises.
+
+Usage:
+
+    stats = RequestStats()
+    stats.record(RequestSample(endpoint="products", page=1, status=200, ...))
+    stats.add_timing("products", 1, "store", 0.25)
+    stats.flush(db_api)
+
+File: upgates/telemetry.py
+"""
+
+import threading
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+import logfire
+import pandas as pd
+
+# Upper bounds (ms) of the latency histogram buckets shown by `upgates stats`
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+@dataclass
+class RequestSample:
+    """One API request (or cache hit) and the work done on its page."""
+
+    endpoint: str
+    method: str = "GET"
+    page: Optional[int] = None
+    status: Optional[int] = None
+    bytes: int = 0
+    latency_ms: float = 0.0
+    decode_ms: Optional[float] = None
+    store_ms: Optional[float] = None
+    cached: bool = False
+    hour_remaining: Optional[int] = None
+    day_remaining: Optional[int] = None
+    ts: datetime = field(default_factory=datetime.now)
+
+
+class RequestStats:
+    """In-memory buffer of request samples for one client.
+
+    Samples are recorded on the event loop and flushed on the DuckDB writer
+    thread, so the buffer is only read or swapped under `_lock`.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.samples: Deque[RequestSample] = deque(maxlen=max_samples)
+        self.dropped = 0  # samples pushed out of a full buffer since the last flush
+        self._pages: Dict[Tuple[str, int], RequestSample] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sample: RequestSample) -> RequestSample:
+        """Add a sample; page samples can later get decode/store timings."""
+        with self._lock:
+            if len(self.samples) == self.samples.maxlen:
+                self._forget(self.samples[0])
+                self.dropped += 1
+            self.samples.append(sample)
+            if sample.page is not None:
+                self._pages[(sample.endpoint, sample.page)] = sample
+        return sample
+
+    def add_timing(self, endpoint: str, page: int, phase: str, seconds: float) -> None:
+        """Attach the `decode` or `store` time of a page to its request sample."""
+        with self._lock:
+            sample = self._pages.get((endpoint, page))
+            if sample is not None:
+                setattr(sample, f"{phase}_ms", seconds * 1000)
+
+    def to_frame(self, samples: Optional[List[RequestSample]] = None) -> pd.DataFrame:
+        """Buffered samples as a DataFrame shaped like the `api_requests` table."""
+        if samples is None:
+            with self._lock:
+                samples = list(self.samples)
+        frame = pd.DataFrame([asdict(sample) for sample in samples])
+        if not frame.empty:
+            frame.insert(0, "run_id", self.run_id)
+        return frame
+
+    def flush(self, db_api, keep_pending: bool = False) -> int:
+        """Write buffered samples to DuckDB and clear the buffer.
+
+        The buffer is swapped out under the lock, so samples recorded by the
+        event loop while the DuckDB writer thread flushes go into the next batch.
+        `keep_pending` holds back page samples still waiting for their store
+        timing, i.e. pages of other syncs running while one of them finishes.
+        """
+        with self._lock:
+            samples = list(self.samples)
+            self.samples.clear()
+            dropped, self.dropped = self.dropped, 0
+            if keep_pending:
+                pending = [s for s in samples if self._awaits_store(s)]
+                samples = [s for s in samples if not self._awaits_store(s)]
+                self.samples.extend(pending)
+            for sample in samples:
+                self._forget(sample)
+        if dropped:
+            logfire.warning(
+                f"⚠️ Dropped {dropped} request samples "
+                f"(buffer holds {self.samples.maxlen})."
+            )
+        if not samples:
+            return 0
+        count = db_api.insert_api_requests(self.to_frame(samples))
+        logfire.debug(f"📈 Flushed {count} request samples (run {self.run_id}).")
+        return count
+
+    def _awaits_store(self, sample: RequestSample) -> bool:
+        return (
+            sample.page is not None
+            and sample.store_ms is None
+            and self._pages.get((sample.endpoint, sample.page)) is sample
+        )
+
+    def _forget(self, sample: RequestSample) -> None:
+        key = (sample.endpoint, sample.page)
+        if self._pages.get(key) is sample:
+            del self._pages[key]
+
+
+def histogram(latencies_ms: List[float]) -> List[Tuple[str, int]]:
+    """Count latencies into LATENCY_BUCKETS_MS buckets, labelled `<=N ms`."""
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for latency in latencies_ms:
+        index = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency <= bound),
+            len(LATENCY_BUCKETS_MS),
+        )
+        counts[index] += 1
+    labels = [f"<={bound} ms" for bound in LATENCY_BUCKETS_MS]
+    labels.append(f">{LATENCY_BUCKETS_MS[-1]} ms")
+    return list(zip(labels, counts))
+
+
+# EOF
@@ -0,0 +1,53 @@
+"""
+Pytest configuration for the upgates test suite.
+
+`upgates.config` reads the environment at import time and refuses to load
+without an AI model, so point it at a throwaway data directory first. Each test
+server is its own "API account", so clients do not share a host quota ledger.
+
+The `api_client` fixture serves an aiohttp app (or a `MockUpgatesAPI`) and
+opens a client pointed at it, storing into a DuckDB file under `tmp_path`:
+
+    async with api_client(MockUpgatesAPI(MockCatalog(products=20))) as client:
+        await client.sync_products(check_budget=False)
+"""
+
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+os.environ.setdefault("OPENAI_ENABLED", "1")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("NEVEN_PATH", tempfile.mkdtemp(prefix="neven-tests-"))
+os.environ.setdefault("UPGATES_API_URL", "http://127.0.0.1:9/api/v2")
+os.environ.setdefault("LOGFIRE_IGNORE_NO_CONFIG", "1")
+os.environ.setdefault("UPGATES_COORDINATOR", "0")
+
+# Imported after the environment above, which upgates.config reads on import
+from upgates.client import UpgatesClient  # noqa: E402
+from upgates.db.duckdb_api import UpgatesDuckDBAPI  # noqa: E402
+from upgates.mock_server import MockUpgatesAPI  # noqa: E402
+
+
+@pytest.fixture
+def api_client(tmp_path):
+    """Factory of clients talking to a test server, each with a fresh database."""
+
+    @asynccontextmanager
+    async def serve(app, **kwargs):
+        if isinstance(app, MockUpgatesAPI):
+            app = app.app()
+        db_api = UpgatesDuckDBAPI(db_file=str(tmp_path / "upgates.db"))
+        try:
+            async with TestServer(app) as server:
+                kwargs.setdefault("cache", False)
+                async with UpgatesClient(db_api=db_api, **kwargs) as client:
+                    client.API_URL = str(server.make_url("/api/v2"))
+                    yield client
+        finally:
+            db_api.close()
+
+    return serve
@@ -1,3 +1,510 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from upgates.client import UpgatesClient
+from upgates.mock_server import MockCatalog, MockSettings, MockUpgatesAPI
+
+
 def test_api():
     """Test API client fetch method."""
     assert True
+
+
+def test_client_reuses_pooled_session():
+    """The client keeps one keep-alive session for its whole lifetime."""
+
+    async def run():
+        async with UpgatesClient() as client:
+            first = await client._get_session()
+            second = await client._get_session()
+            assert first is second
+            assert first.connector.limit == client.MAX_CONCURRENCY
+        assert first.closed
+        assert client._session is None
+
+    asyncio.run(run())
+
+
+def test_fetch_data_reassembles_concurrent_pages_in_order(api_client):
+    """Pages after the first are fetched concurrently but returned in order."""
+
+    async def products(request):
+        page = int(request.query.get("page", 1))
+        await asyncio.sleep(0.01 * (5 - page))  # later pages answer first
+        return web.json_response(
+            {"number_of_pages": 4, "products": [{"product_id": page}]}
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/products", products)
+        async with api_client(app) as client:
+            data = await client.fetch_data("products")
+            limited = await client.fetch_data("products", page_count=2)
+        return data, limited
+
+    data, limited = asyncio.run(run())
+    assert [p["product_id"] for p in data["products"]] == [1, 2, 3, 4]
+    assert [p["product_id"] for p in limited["products"]] == [1, 2]
+
+
+def test_iter_pages_prefetches_a_bounded_window(api_client):
+    """The page iterator never runs more than PREFETCH_PAGES ahead of its consumer."""
+    requested = []
+
+    async def customers(request):
+        page = int(request.query.get("page", 1))
+        requested.append(page)
+        return web.json_response(
+            {"current_page": page, "number_of_pages": 20, "customers": [page]}
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/customers", customers)
+        async with api_client(app) as client:
+            client.PREFETCH_PAGES = 2
+            seen = []
+            async for page in client.iter_pages("customers"):
+                seen.append(page["current_page"])
+                await asyncio.sleep(0.01)
+                assert len(requested) <= len(seen) + client.PREFETCH_PAGES
+        return seen
+
+    assert asyncio.run(run()) == list(range(1, 21))
+
+
+def test_closing_iter_pages_waits_for_cancelled_prefetches(api_client):
+    """Leaving the page iterator early leaves no prefetch task behind."""
+
+    async def customers(request):
+        page = int(request.query.get("page", 1))
+        if page > 2:
+            await asyncio.sleep(10)
+        return web.json_response(
+            {"current_page": page, "number_of_pages": 20, "customers": [page]}
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/customers", customers)
+        async with api_client(app) as client:
+            pages = client.iter_pages("customers")
+            await anext(pages)
+            await anext(pages)  # pages 3+ are now being prefetched
+            await pages.aclose()
+            names = [task.get_coro().__name__ for task in asyncio.all_tasks()]
+            assert "_get_page" not in names
+
+    asyncio.run(run())
+
+
+def test_incremental_sync_uses_the_stored_watermark(api_client):
+    """A completed sync records a watermark that the next incremental run sends."""
+    queries = []
+
+    async def orders(request):
+        queries.append(dict(request.query))
+        return web.json_response(
+            {
+                "current_page": 1,
+                "number_of_pages": 1,
+                "orders": [
+                    {
+                        "order_number": "1",
+                        "last_update_time": "2025-03-01T08:00:00+01:00",
+                    },
+                    {
+                        "order_number": "2",
+                        "last_update_time": "2025-03-02T08:00:00+01:00",
+                    },
+                ],
+            }
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/orders", orders)
+        async with api_client(app) as client:
+            await client.sync_orders()
+            await client.sync_orders(incremental=True)
+
+    asyncio.run(run())
+    assert "last_update_time_from" not in queries[0]
+    assert queries[1]["last_update_time_from"] == "2025-03-02T08:00:00+01:00"
+
+
+def test_fast_decoder_matches_stdlib_on_large_pages():
+    """Pages decoded from raw bytes match the standard library's result."""
+    import json
+
+    from upgates.benchmark import synthetic_products_page
+    from upgates.models.payloads import dumps, loads
+
+    page = synthetic_products_page(products=5, description_kb=64)
+    body = json.dumps(page).encode()
+    assert loads(body) == json.loads(body)
+    assert json.loads(dumps(page)) == page
+
+
+def test_sync_stock_prices_updates_only_stock_and_prices(api_client):
+    """The slim sync touches stock/availability and prices, skipping unknown products."""
+
+    def page(products):
+        return web.json_response(
+            {"current_page": 1, "number_of_pages": 1, "products": products}
+        )
+
+    async def simple(request):
+        return page(
+            [
+                {"product_id": 9001, "stock": 7, "availability": "Skladem"},
+                {"product_id": 9002, "stock": None, "availability": "Na dotaz"},
+                {"product_id": 9999, "stock": 1},
+            ]
+        )
+
+    async def prices(request):
+        return page(
+            [
+                {
+                    "product_id": pid,
+                    "prices": [
+                        {"currency": "CZK", "pricelists": [{"price_with_vat": 99.0}]}
+                    ],
+                }
+                for pid in (9001, 9002, 9999)
+            ]
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/products/simple", simple)
+        app.router.add_get("/api/v2/products/prices", prices)
+        async with api_client(app) as client:
+            client._store_products(
+                [
+                    {"product_id": 9001, "code": "S1", "stock": 1},
+                    {"product_id": 9002, "code": "S2", "stock": 2},
+                ]
+            )
+            await client.sync_stock_prices()
+            await client.sync_stock_prices()
+            return client.db_api.conn.execute("""
+                SELECT p.product_id, p.code, p.stock, p.availability,
+                       COUNT(pr.id), MAX(pr.price_with_vat)
+                FROM products p LEFT JOIN prices pr USING (product_id)
+                WHERE p.product_id >= 9000
+                GROUP BY ALL ORDER BY p.product_id
+                """).fetchall()
+
+    assert asyncio.run(run()) == [
+        (9001, "S1", 7, "Skladem", 1, 99.0),
+        (9002, "S2", None, "Na dotaz", 1, 99.0),
+    ]
+
+
+def test_plan_sync_probe_pages_are_reused_by_the_sync(api_client):
+    """The budget check's first-page probes are not fetched twice."""
+    requested = []
+
+    async def customers(request):
+        page = int(request.query.get("page", 1))
+        requested.append(page)
+        return web.json_response(
+            {"current_page": page, "number_of_pages": 3, "customers": [{}]},
+            headers={
+                "X-Rate-Limit-Hour": "50",
+                "X-Rate-Limit-Hour-Remaining": "40",
+                "X-Rate-Limit-Day-Remaining": "0",
+            },
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/customers", customers)
+        async with api_client(app) as client:
+            plan = await client.check_budget(["customers"])
+            await client.sync_customers()
+        return plan
+
+    plan = asyncio.run(run())
+    assert plan.action == "run" and plan.pages == {"customers": 2}
+    assert sorted(requested) == [1, 2, 3]
+
+
+def test_transient_errors_are_retried_with_backoff(api_client):
+    """5xx responses are retried; the caller only sees the final answer."""
+    calls = []
+
+    async def parameters(request):
+        calls.append(1)
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.json_response({"number_of_pages": 1, "parameters": []})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/parameters", parameters)
+        async with api_client(app) as client:
+            client.RETRY_LIMIT, client.RETRY_BACKOFF = 3, 0.01
+            return await client._request("GET", "parameters")
+
+    status, _ = asyncio.run(run())
+    assert status == 200 and len(calls) == 3
+
+
+def test_interrupted_sync_resumes_from_the_next_page(api_client):
+    """A sync that dies mid-way restarts after its last stored page."""
+    requested = []
+    broken = {"page": 4}
+
+    async def orders(request):
+        page = int(request.query.get("page", 1))
+        requested.append(page)
+        if page == broken["page"]:
+            return web.Response(status=500)
+        return web.json_response(
+            {"number_of_pages": 5, "orders": [{"order_number": str(page)}]}
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/orders", orders)
+        async with api_client(app) as client:
+            client.RETRY_LIMIT, client.RETRY_BACKOFF = 1, 0.01
+            client.PREFETCH_PAGES = 1
+            with pytest.raises(RuntimeError):
+                await client.sync_orders()
+            assert (
+                client.db_api.get_sync_checkpoint("orders", "{}", 1)["last_page"] == 3
+            )
+
+            broken["page"] = None
+            requested.clear()
+            await client.sync_orders()
+            assert client.db_api.get_sync_checkpoint("orders", "{}", 1) is None
+
+    asyncio.run(run())
+    assert requested == [4, 5]
+
+
+def test_identical_concurrent_gets_share_one_request(api_client):
+    """Concurrent callers asking for the same page or codes coalesce."""
+    api = MockUpgatesAPI(
+        MockCatalog(products=5, customers=0, orders=0, parameters=0),
+        MockSettings(latency_ms=50),
+    )
+
+    async def run():
+        async with api_client(api) as client:
+            first, second = await asyncio.gather(
+                client.fetch_products(["P000002", "P000001"]),
+                client.fetch_products(["P000001", "P000002", "P000001"]),
+            )
+            assert [p["code"] for p in first] == ["P000001", "P000002"]
+            assert first == second
+
+            # One caller giving up does not cancel the shared request
+            quitter = asyncio.ensure_future(client._get_page("customers", 1))
+            stayer = asyncio.ensure_future(client._get_page("customers", 1))
+            await asyncio.sleep(0.01)
+            quitter.cancel()
+            assert (await stayer)["number_of_items"] == 0
+            assert client.coalesced == 2
+            assert not client._flights
+
+    asyncio.run(run())
+    assert api.requests == {"GET products": 1, "GET customers": 1}
+
+
+def test_commit_per_run_publishes_products_only_at_the_end(api_client):
+    """Staged product syncs leave the catalog untouched until the run completes."""
+    api = MockUpgatesAPI(MockCatalog(products=250, description_kb=1))
+
+    async def run():
+        async with api_client(api) as client:
+            count = "SELECT COUNT(*) FROM products"
+            stage = client._stage_products
+            pages = []
+
+            def failing_stage(products):
+                pages.append(len(products))
+                if len(pages) == 2:
+                    raise RuntimeError("disk full")
+                return stage(products)
+
+            client._stage_products = failing_stage
+            try:
+                await client.sync_products(check_budget=False, commit="run")
+            except RuntimeError:
+                pass
+            assert client.db_api.conn.execute(count).fetchone()[0] == 0
+            staged = "SELECT COUNT(*) FROM staging_products"
+            assert client.db_api.conn.execute(staged).fetchone()[0] == 100
+
+            client._stage_products = stage
+            await client.sync_products(check_budget=False, commit="run")
+            assert client.db_api.conn.execute(count).fetchone()[0] == 250
+            assert client.db_api.get_sync_checkpoint("products", "{}", 24) is None
+
+    asyncio.run(run())
+    # Run 1 prefetched all 3 pages; run 2 resumed at page 2 instead of page 1
+    assert api.requests["GET products"] == 5
+
+
+def test_customers_and_orders_are_stored_with_order_lines(api_client):
+    """Customer and order syncs persist rows; a re-sync replaces changed lines."""
+    api = MockUpgatesAPI(MockCatalog(products=20, customers=120, orders=30))
+
+    async def run():
+        async with api_client(api) as client:
+            query = client.db_api.conn.execute
+            await client.sync_customers()
+            await client.sync_orders()
+            assert query("SELECT COUNT(*) FROM customers").fetchone()[0] == 120
+            assert query("SELECT COUNT(*) FROM orders").fetchone()[0] == 30
+            lines = "SELECT COUNT(*) FROM order_items"
+            assert query(lines).fetchone()[0] == 60
+
+            order = api.catalog.orders[0]
+            order["status"] = "Vyřízená"
+            order["products"] = order["products"][:1]
+            order["products"][0]["quantity"] = 3
+            await client.sync_orders()
+            assert query(lines).fetchone()[0] == 59
+            row = query("""
+                SELECT o.status, i.quantity FROM orders o
+                JOIN order_items i USING (order_number)
+                WHERE o.order_id = 1
+            """).fetchall()
+            assert row == [("Vyřízená", 3.0)]
+
+    asyncio.run(run())
+
+
+def test_parameters_and_product_links_are_bulk_loaded(api_client):
+    """Parameter definitions and product links land in their own tables."""
+    api = MockUpgatesAPI(MockCatalog(products=150, parameters=4))
+
+    async def run():
+        async with api_client(api) as client:
+            query = client.db_api.conn.execute
+            await client.sync_parameters()
+            counts = [
+                query(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in (
+                    "parameters",
+                    "parameter_descriptions",
+                    "parameter_values",
+                    "parameter_value_descriptions",
+                    "product_parameters",
+                )
+            ]
+            assert counts == [4, 8, 20, 40, 150]
+
+            api.catalog.parameters[0]["values"].pop()
+            api.catalog.products[0]["parameters_new"] = []
+            await client.sync_parameters()
+            assert query("""
+                SELECT v.value_id, d.value FROM product_parameters p
+                JOIN parameter_values v USING (value_id)
+                JOIN parameter_value_descriptions d USING (value_id)
+                WHERE p.product_id = 2 AND d.language = 'en'
+            """).fetchall() == [(202, "Hodnota 2")]
+            assert (
+                query(
+                    "SELECT COUNT(*) FROM product_parameters WHERE product_id = 1"
+                ).fetchone()[0]
+                == 0
+            )
+            values = "SELECT COUNT(*) FROM parameter_values"
+            assert query(values).fetchone()[0] == 19
+
+    asyncio.run(run())
+    assert api.requests["GET products/parameters"] == 4
+
+
+def test_page_writes_run_off_the_event_loop(api_client):
+    """Slow DuckDB writes happen on the writer thread while the loop keeps going."""
+    import threading
+
+    api = MockUpgatesAPI(MockCatalog(products=500, description_kb=1))
+    threads, probes = set(), []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        async with api_client(api) as client:
+            client.WRITE_QUEUE_PAGES = 1
+            store = client._store_products
+
+            def blocked_store(products):
+                threads.add(threading.current_thread().name)
+                # Only a loop that is not stuck in this write can set it
+                loop_ran = threading.Event()
+                loop.call_soon_threadsafe(loop_ran.set)
+                probes.append(loop_ran.wait(timeout=10))
+                return store(products)
+
+            client._store_products = blocked_store
+            await client.sync_products(check_budget=False)
+            count = "SELECT COUNT(*) FROM products"
+            assert client.db_api.conn.execute(count).fetchone()[0] == 500
+
+    asyncio.run(run())
+    assert all(name.startswith("upgates-duckdb") for name in threads)
+    assert probes and all(probes)
+
+
+def test_failed_page_write_stops_the_fetcher(api_client):
+    """A failing write cancels the page fetcher and waits for it to finish."""
+    api = MockUpgatesAPI(MockCatalog(products=500, description_kb=1))
+
+    async def run():
+        async with api_client(api) as client:
+
+            def failing_store(products):
+                raise RuntimeError("disk full")
+
+            client._store_products = failing_store
+            with pytest.raises(RuntimeError, match="disk full"):
+                await client.sync_products(check_budget=False)
+            pending = [task.get_coro().__name__ for task in asyncio.all_tasks()]
+            assert "_fetch_pages" not in pending
+
+    asyncio.run(run())
+
+
+def test_verify_cache_repairs_only_drifted_products(api_client):
+    """Missing, stale and deleted products are found and fixed by code."""
+    api = MockUpgatesAPI(MockCatalog(products=150, description_kb=1))
+
+    async def run():
+        async with api_client(api) as client:
+            await client.sync_products(check_budget=False)
+            assert (await client.verify_cache()).in_sync
+
+            api.catalog.products.pop(0)  # P000001 deleted in the shop
+            stale = api.catalog.products[0]
+            stale.update(stock=50, last_update_time="2030-01-01T00:00:00+01:00")
+            client.db_api.delete_products([3])  # P000003 lost locally
+            api.requests.clear()
+
+            drift = await client.verify_cache(repair=False)
+            assert (drift.missing, drift.stale, drift.deleted) == (
+                ["P000003"],
+                ["P000002"],
+                [1],
+            )
+            drift = await client.verify_cache()
+            assert (drift.refetched, drift.unchanged, drift.removed) == (2, 0, 1)
+            assert (await client.verify_cache()).in_sync
+            query = "SELECT stock FROM products WHERE product_id = 2"
+            assert client.db_api.conn.execute(query).fetchone()[0] == 50
+
+    asyncio.run(run())
+    # 3 listings of 2 pages each, and one `?codes=` request for the repair
+    assert api.requests["GET products/simple"] == 6
+    assert api.requests["GET products"] == 1
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from upgates.cache import CacheMiss, ResponseCache
+from upgates.client import UpgatesClient
+
+
+def test_cache_ttl_falls_back_to_parent_endpoint(tmp_path):
+    cache = ResponseCache(tmp_path, default_ttl=60, ttls={"products": 3600})
+    assert cache.ttl("products/simple") == 3600
+    assert cache.ttl("orders") == 60
+
+
+def test_cache_expires_entries(tmp_path):
+    cache = ResponseCache(tmp_path, default_ttl=60, ttls={})
+    cache.put("orders", {"page": 1}, b'{"orders": []}')
+    assert cache.get("orders", {"page": 1}) == b'{"orders": []}'
+    assert cache.get("orders", {"page": 2}) is None
+
+    file = cache._file("orders", {"page": 1})
+    old = time.time() - 120
+    os.utime(file, (old, old))
+    assert cache.get("orders", {"page": 1}) is None
+    assert cache.get("orders", {"page": 1}, ignore_ttl=True) is not None
+
+
+def test_replay_serves_pages_from_cache_only(tmp_path, monkeypatch):
+    """A replayed fetch never touches the network and fails on a cache miss."""
+    monkeypatch.setattr("upgates.config.http_cache_path", tmp_path)
+    cache = ResponseCache(tmp_path)
+    for page in (1, 2):
+        body = f'{{"number_of_pages": 2, "parameters": [{{"id": {page}}}]}}'
+        cache.put("parameters", {"page": page}, body.encode())
+
+    async def run(endpoint):
+        async with UpgatesClient(replay=True) as client:
+            return await client.fetch_data(endpoint)
+
+    data = asyncio.run(run("parameters"))
+    assert [p["id"] for p in data["parameters"]] == [1, 2]
+
+    with pytest.raises(CacheMiss):
+        asyncio.run(run("customers"))
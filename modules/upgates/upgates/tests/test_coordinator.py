@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from upgates.coordinator import HostCoordinator
+from upgates.ratelimit import RequestScheduler
+
+
+def test_host_slots_are_shared_between_coordinators(tmp_path):
+    """Two processes' coordinators never hold more slots than the host allows."""
+    first = HostCoordinator(tmp_path, slots=2, poll_interval=0.01)
+    second = HostCoordinator(tmp_path, slots=2, poll_interval=0.01)
+    peak = active = 0
+
+    async def request(coordinator):
+        nonlocal peak, active
+        async with coordinator.slot():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.03)
+            active -= 1
+
+    async def run():
+        await asyncio.gather(*(request(c) for c in (first, second) * 3))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_quota_ledger_pauses_every_process(tmp_path):
+    """A 429 or quota seen by one scheduler is honoured by the others."""
+    webhook = RequestScheduler(coordinator=HostCoordinator(tmp_path))
+    scheduler = RequestScheduler(coordinator=HostCoordinator(tmp_path))
+
+    webhook.update(
+        200,
+        {
+            "X-Rate-Limit-Hour": "100",
+            "X-Rate-Limit-Hour-Remaining": "4",
+            "X-Rate-Limit-Day-Remaining": "0",
+        },
+    )
+    scheduler._merge_ledger()
+    assert scheduler.state.hour_limit == 100
+    assert scheduler.state.available == 4
+
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    webhook.update(429, {"Retry-After": retry_at.strftime("%a, %d %b %Y %H:%M:%S GMT")})
+    # A later success elsewhere must not erase the pending Retry-After
+    scheduler.update(200, {"X-Rate-Limit-Hour-Remaining": "3"})
+    scheduler._merge_ledger()
+    assert scheduler.delay() > 25
+
+    cli = RequestScheduler(coordinator=HostCoordinator(tmp_path))
+    cli._merge_ledger()
+    assert cli.state.hour_remaining == 3
+    assert cli.delay() > 25
@@ -1,3 +1,254 @@
+import pytest
+
+from upgates.db.duckdb_api import UpgatesDuckDBAPI
+from upgates.mock_server import synthetic_product
+
+
 def test_database():
     """Test database connection."""
     assert True
+
+
+def test_sync_watermark_roundtrip():
+    """Incremental sync watermarks are stored per endpoint and overwritten."""
+    db_api = UpgatesDuckDBAPI()
+    assert db_api.get_sync_watermark("invoices") is None
+
+    db_api.set_sync_watermark("invoices", "2025-01-01T10:00:00+01:00", 5)
+    db_api.set_sync_watermark("invoices", "2025-02-01T10:00:00+01:00", 2)
+    assert db_api.get_sync_watermark("invoices") == "2025-02-01T10:00:00+01:00"
+
+
+def test_product_page_is_loaded_set_wise():
+    """A flattened page upserts products and skips known descriptions/categories."""
+    from upgates.db.batches import product_frames
+
+    db_api = UpgatesDuckDBAPI()
+    products = [synthetic_product(i, description_kb=1) for i in (7101, 7102)]
+    products[0]["descriptions"][0].update(language="CS", seo_keywords=["a", "b"])
+    products[0]["categories"].append(dict(products[0]["categories"][0]))
+
+    written = db_api.upsert_product_batch(product_frames(products))
+    assert written["products"] == 2
+    assert written["descriptions"] == 4
+    assert written["categories"] == 2
+
+    products[0]["stock"] = 42
+    written = db_api.upsert_product_batch(product_frames(products))
+    assert written["descriptions"] == written["categories"] == 0
+    rows = db_api.conn.execute("""
+        SELECT p.stock, d.language, d.seo_keywords
+        FROM products p JOIN descriptions d USING (product_id)
+        WHERE product_id = 7101 ORDER BY d.language
+    """).fetchall()
+    assert rows == [(42, "cz", "a, b"), (42, "en", "")]
+
+
+def test_failed_page_transaction_leaves_no_partial_rows():
+    """A page that fails half way is rolled back as a whole."""
+    from upgates.db.batches import product_frames
+
+    db_api = UpgatesDuckDBAPI()
+    try:
+        with db_api.transaction():
+            db_api.upsert_product_batch(product_frames([synthetic_product(7201, 1)]))
+            db_api.set_sync_checkpoint("products", "{}", 1, 2, "now", None, 1)
+            raise RuntimeError("prices failed")
+    except RuntimeError:
+        pass
+    query = "SELECT COUNT(*) FROM descriptions WHERE product_id = 7201"
+    assert db_api.conn.execute(query).fetchone()[0] == 0
+    assert db_api.get_sync_checkpoint("products", "{}", 24) is None
+
+
+def test_resync_replaces_child_rows_instead_of_appending(tmp_path):
+    """Re-syncing a product keeps one copy of its prices, images, metas and VATs."""
+    from upgates.db.batches import product_frames
+    from upgates.db.migrations import MIGRATIONS, apply_migrations
+
+    db_api = UpgatesDuckDBAPI(db_file=str(tmp_path / "children.db"))
+    product = synthetic_product(7301, description_kb=1)
+    db_api.upsert_product_batch(product_frames([product]))
+
+    def sizes():
+        tables = ("prices", "images", "metas", "vats")
+        query = "SELECT COUNT(*) FROM {}"
+        return [db_api.conn.execute(query.format(t)).fetchone()[0] for t in tables]
+
+    before = sizes()
+    written = db_api.upsert_product_batch(product_frames([product]))
+    assert sizes() == before
+    assert written["prices"] == written["prices_deleted"] == 0
+
+    product["prices"][0]["pricelists"][0]["price_with_vat"] = 412.4
+    written = db_api.upsert_product_batch(product_frames([product]))
+    assert written["prices"] == written["prices_deleted"] == 1
+    assert sizes() == before
+
+    # Caches filled before replace-on-sync are deduplicated once
+    db_api.conn.execute(
+        "INSERT INTO vats (product_id, country_code, vat_percentage) "
+        "SELECT product_id, country_code, vat_percentage FROM vats"
+    )
+    db_api.conn.execute("DELETE FROM schema_migrations")
+    assert apply_migrations(db_api.conn) == [m[0] for m in MIGRATIONS]
+    assert sizes() == before
+    assert apply_migrations(db_api.conn) == []
+
+
+def test_category_links_are_unique_and_upserted():
+    """A renamed category updates its link; a second copy cannot be inserted."""
+    import duckdb
+
+    from upgates.db.batches import product_frames
+
+    db_api = UpgatesDuckDBAPI()
+    product = synthetic_product(7401, description_kb=1)
+    db_api.upsert_product_batch(product_frames([product]))
+
+    product["categories"][0]["name"] = "Renamed"
+    written = db_api.upsert_product_batch(product_frames([product]))
+    assert written["categories"] == 1
+    db_api.insert_product_category(7401, 1, "x", "Other", False, 0)
+    rows = db_api.conn.execute(
+        "SELECT category_name FROM categories WHERE product_id = 7401"
+    ).fetchall()
+    assert rows == [("Renamed",)]
+
+    with pytest.raises(duckdb.ConstraintException):
+        db_api.conn.execute(
+            "INSERT INTO categories (product_id, category_id) VALUES (7401, 1)"
+        )
+
+
+def test_category_links_removed_in_the_shop_are_deleted():
+    """A changed product keeps only the category links its payload still lists."""
+    from upgates.db.batches import product_frames
+
+    db_api = UpgatesDuckDBAPI()
+    product = synthetic_product(7402, description_kb=1)
+    product["categories"].append(
+        {"category_id": 2, "code": "gold", "main_yn": False, "position": 2}
+    )
+    db_api.upsert_product_batch(product_frames([product]))
+
+    def links():
+        return db_api.conn.execute(
+            "SELECT category_id FROM categories WHERE product_id = 7402 ORDER BY 1"
+        ).fetchall()
+
+    assert links() == [(1,), (2,)]
+    product["categories"].pop(0)
+    written = db_api.upsert_product_batch(product_frames([product]))
+    assert written["categories_deleted"] == 1 and written["categories"] == 0
+    assert links() == [(2,)]
+
+    product["categories"] = []
+    assert (
+        db_api.upsert_product_batch(product_frames([product]))["categories_deleted"]
+        == 1
+    )
+    assert links() == []
+
+
+def test_legacy_parameter_tables_are_dropped():
+    """The pre-ID parameter layout is removed so the current one can be created."""
+    import duckdb
+
+    from upgates.db.migrations import MIGRATIONS, apply_migrations
+
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE parameters (id INTEGER PRIMARY KEY, position INTEGER)")
+    conn.execute("CREATE TABLE parameter_values (id INTEGER PRIMARY KEY)")
+    assert apply_migrations(conn, [m for m in MIGRATIONS if m[0] == 4]) == [4]
+    tables = conn.execute("SELECT table_name FROM information_schema.tables")
+    assert {name for (name,) in tables.fetchall()} == {"schema_migrations"}
+
+
+def test_threads_get_their_own_transactions(tmp_path):
+    """A rollback on one thread leaves another thread's open transaction alone."""
+    import threading
+
+    db_api = UpgatesDuckDBAPI(db_file=str(tmp_path / "threads.db"))
+    inside, done = threading.Event(), threading.Event()
+
+    def writer():
+        with db_api.transaction():
+            db_api.set_sync_watermark("orders", "2025-01-01T00:00:00+01:00", 1)
+            inside.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    inside.wait(5)
+    # The writer's uncommitted row is invisible here, and a failing block on
+    # this thread rolls back only its own statements
+    assert db_api.get_sync_watermark("orders") is None
+    try:
+        with db_api.transaction():
+            db_api.set_sync_watermark("customers", "2025-01-01T00:00:00+01:00", 1)
+            raise RuntimeError("failed page")
+    except RuntimeError:
+        pass
+    done.set()
+    thread.join()
+
+    assert db_api.get_sync_watermark("orders") == "2025-01-01T00:00:00+01:00"
+    assert db_api.get_sync_watermark("customers") is None
+    db_api.close()
+
+
+def test_unchanged_products_are_skipped_by_content_hash():
+    """Products whose payload hash matches are not rewritten at all."""
+    import pandas as pd
+
+    from upgates.db.batches import product_frames
+
+    db_api = UpgatesDuckDBAPI()
+    products = [synthetic_product(i, description_kb=1) for i in (7501, 7502)]
+    db_api.upsert_product_batch(product_frames(products))
+
+    written = db_api.upsert_product_batch(product_frames(products))
+    assert written["unchanged"] == 2
+    assert written["products"] == written["descriptions"] == written["prices"] == 0
+
+    products[1]["stock"] = 99
+    written = db_api.upsert_product_batch(product_frames(products))
+    assert written["unchanged"] == 1 and written["products"] == 1
+
+    # A stock refresh that changes a product invalidates its hash
+    stock = pd.DataFrame(
+        [(7501, 5, "Skladem", "")],
+        columns=["product_id", "stock", "availability", "availability_type"],
+    )
+    assert db_api.update_product_stock(stock) == 1
+    assert db_api.update_product_stock(stock) == 0
+    written = db_api.upsert_product_batch(product_frames(products))
+    assert written["unchanged"] == 1 and written["products"] == 1
+    query = "SELECT stock FROM products WHERE product_id = 7501"
+    assert db_api.conn.execute(query).fetchone()[0] == products[0]["stock"]
+
+
+def test_hashed_products_without_update_time_are_rewritten(tmp_path):
+    """Migration 6 lets rows hashed before last_update_time existed be refilled."""
+    import pandas as pd
+
+    from upgates.db.batches import product_frames
+    from upgates.db.migrations import apply_migrations
+
+    db_api = UpgatesDuckDBAPI(db_file=str(tmp_path / "v5.db"))
+    product = synthetic_product(7601, description_kb=1)
+    db_api.upsert_product_batch(product_frames([product]))
+    # A cache written at migration 5: hashed, but no last_update_time yet
+    db_api.conn.execute("UPDATE products SET last_update_time = NULL")
+    db_api.conn.execute("DELETE FROM schema_migrations WHERE version = 6")
+    assert apply_migrations(db_api.conn) == [6]
+
+    listing = pd.DataFrame(
+        [(7601, product["code"], product["last_update_time"])],
+        columns=["product_id", "code", "last_update_time"],
+    )
+    assert db_api.compare_product_listing(listing)["status"].tolist() == ["stale"]
+    written = db_api.upsert_product_batch(product_frames([product]))
+    assert written["unchanged"] == 0 and written["products"] == 1
+    assert db_api.compare_product_listing(listing).empty
@@ -0,0 +1,61 @@
+import asyncio
+
+import aiohttp
+
+from upgates.benchmark import benchmark_sync
+from upgates.mock_server import MockCatalog, MockSettings, MockUpgatesAPI
+
+
+def test_benchmark_sync_stays_within_the_concurrency_limit():
+    """A full sync against the mock stores every product without 429s."""
+    catalog = MockCatalog(products=250, customers=30, orders=40, description_kb=1)
+    results = asyncio.run(benchmark_sync(catalog, MockSettings(latency_ms=20)))
+
+    assert results["products_stored"] == 250
+    assert results["by_endpoint"]["GET products"] == 3
+    assert results["by_endpoint"]["GET customers"] == 1
+    assert results["peak_concurrency"] <= 3
+    assert results["throttled"] == {}
+
+
+def test_mock_enforces_concurrency_quota_and_put_limits(api_client):
+    """Excess parallelism, spent quota and oversized PUTs are rejected."""
+    api = MockUpgatesAPI(
+        MockCatalog(products=5, customers=0, orders=0, parameters=0),
+        MockSettings(latency_ms=100),
+    )
+
+    async def scenario():
+        async with api_client(api) as client, aiohttp.ClientSession() as session:
+
+            async def get(path):
+                async with session.get(client.API_URL + path) as response:
+                    await response.read()
+                    return response.status, response.headers
+
+            burst = await asyncio.gather(*(get("/products/simple") for _ in range(5)))
+            statuses = sorted(status for status, _ in burst)
+            assert statuses == [200, 200, 200, 429, 429]
+            assert all("Retry-After" not in h for s, h in burst if s == 429)
+
+            result = await client.save_products([{"code": "P000001"}, {"code": "NOPE"}])
+            assert result.saved == ["P000001"]
+            assert list(result.failed) == ["NOPE"]
+            status, _ = await client._request(
+                "PUT",
+                "products",
+                payload={"products": [{"code": "P000001"}] * 101},
+            )
+            assert status == 413
+
+            # Leave one request in the hourly limit; the one after it is refused
+            api.settings.hour_limit = sum(api.requests.values()) + 1
+            status, headers = await get("/products?in_stock_yn=1")
+            assert status == 200
+            assert headers["X-Rate-Limit-Hour-Remaining"] == "0"
+            status, headers = await get("/products")
+            assert status == 429
+            assert headers["Retry-After"].endswith("GMT")
+
+    asyncio.run(scenario())
+    assert api.throttled == {"concurrency": 2, "quota": 1}
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from upgates.planner import REFUSE, RUN, SPLIT, plan_requests
+from upgates.ratelimit import QuotaState
+
+NOW = datetime(2025, 3, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def quota(hour_remaining, day_remaining, hour_limit=50):
+    return QuotaState(
+        hour_limit=hour_limit,
+        day_limit=600,
+        hour_remaining=hour_remaining,
+        day_remaining=day_remaining,
+    )
+
+
+def test_plan_runs_when_the_quota_covers_the_sync():
+    plan = plan_requests({"products": 30, "orders": 5}, quota(10, 30), now=NOW)
+    assert plan.action == RUN
+    assert plan.requests == 35
+
+
+def test_plan_splits_across_hourly_windows():
+    """Missing requests come from later hourly refills, if waiting is allowed."""
+    plan = plan_requests({"products": 140}, quota(10, 20), reserve=5, now=NOW)
+    assert plan.action == SPLIT
+    assert plan.windows == 4  # 25 now + 3 x 50
+    assert plan.finishes_at == datetime(2025, 3, 1, 13, 0, tzinfo=timezone.utc)
+
+    impatient = plan_requests({"products": 140}, quota(10, 20), max_wait=60, now=NOW)
+    assert impatient.action == REFUSE
+
+
+def test_plan_refuses_syncs_longer_than_a_day():
+    plan = plan_requests({"products": 5000}, quota(0, 0, hour_limit=100), now=NOW)
+    assert plan.action == REFUSE
+    assert "5000 requests needed" in plan.describe()
+
+
+def test_plan_runs_without_quota_headers():
+    assert plan_requests({"products": 10}, QuotaState(), now=NOW).action == RUN
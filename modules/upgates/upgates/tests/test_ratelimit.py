@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from upgates.ratelimit import RequestScheduler, parse_retry_after
+
+
+def test_parse_retry_after_http_date():
+    """Retry-After is sent as a GMT date."""
+    retry_at = parse_retry_after("Wed, 21 Oct 2025 07:28:00 GMT")
+    assert retry_at == datetime(2025, 10, 21, 7, 28, tzinfo=timezone.utc)
+
+
+def test_parse_retry_after_seconds():
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert parse_retry_after("30", now) == now + timedelta(seconds=30)
+
+
+def test_scheduler_tracks_quota_headers():
+    scheduler = RequestScheduler()
+    state = scheduler.update(
+        200,
+        {
+            "X-Rate-Limit-Hour": "50",
+            "X-Rate-Limit-Hour-Remaining": "7",
+            "X-Rate-Limit-Day-Remaining": "100",
+            "X-Rate-Limit-Total-Remaining": "1200",
+        },
+    )
+    assert state.hour_limit == 50
+    assert state.available == 107
+    assert scheduler.delay() == 0
+
+
+def test_scheduler_honours_retry_after():
+    scheduler = RequestScheduler()
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=90)
+    scheduler.update(
+        429, {"Retry-After": retry_at.strftime("%a, %d %b %Y %H:%M:%S GMT")}
+    )
+    assert 80 < scheduler.delay() <= 90
+    assert scheduler.snapshot().throttled == 1
+
+
+def test_scheduler_waits_for_next_hour_when_budget_is_spent():
+    scheduler = RequestScheduler(reserve=2)
+    scheduler.update(
+        200, {"X-Rate-Limit-Hour-Remaining": "2", "X-Rate-Limit-Day-Remaining": "0"}
+    )
+    assert 0 < scheduler.delay() <= 3600
+
+
+def test_scheduler_limits_concurrency():
+    scheduler = RequestScheduler(max_concurrency=2)
+    peak = 0
+    active = 0
+
+    async def request():
+        nonlocal peak, active
+        async with scheduler.slot():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_scheduler_aimd_concurrency():
+    """429s halve the concurrency limit, rounds of successes raise it again."""
+    scheduler = RequestScheduler(max_concurrency=4)
+    scheduler.update(429, {"Retry-After": "0"})
+    assert scheduler.limit == 2
+
+    for _ in range(2):
+        scheduler.update(200, {}, latency=0.1)
+    assert scheduler.limit == 3
+
+
+def test_scheduler_backs_off_on_latency_spike():
+    scheduler = RequestScheduler(max_concurrency=3, latency_spike_factor=3)
+    for _ in range(scheduler.MIN_LATENCY_SAMPLES):
+        scheduler.update(200, {}, latency=0.1)
+    assert scheduler.limit == 3
+
+    scheduler.update(200, {}, latency=1.0)
+    assert scheduler.limit == 1
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+from aiohttp import web
+from click.testing import CliRunner
+
+from upgates import config
+from upgates.bin.cli import cli
+from upgates.telemetry import RequestSample, RequestStats, histogram
+
+
+def test_histogram_buckets():
+    buckets = dict(histogram([50, 120, 120, 20000]))
+    assert buckets["<=100 ms"] == 1
+    assert buckets["<=250 ms"] == 2
+    assert buckets[">10000 ms"] == 1
+
+
+def test_requests_are_recorded_and_summarised(api_client, monkeypatch):
+    """Each page request becomes a sample with decode/store timings, shown by stats."""
+
+    async def products(request):
+        page = int(request.query.get("page", 1))
+        return web.json_response(
+            {"number_of_pages": 3, "products": [{"product_id": 7000 + page}]},
+            headers={"X-Rate-Limit-Hour-Remaining": "42"},
+        )
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/api/v2/products", products)
+        async with api_client(app) as client:
+            await client.sync_products(check_budget=False)
+            rows = client.db_api.conn.execute(
+                """
+                SELECT page, status, hour_remaining, decode_ms IS NOT NULL,
+                       store_ms IS NOT NULL
+                FROM api_requests WHERE run_id = ? ORDER BY page
+                """,
+                (client.stats.run_id,),
+            ).fetchall()
+        return rows, client.db_api.db_file
+
+    rows, db_file = asyncio.run(run())
+    assert rows == [(page, 200, 42, True, True) for page in (1, 2, 3)]
+
+    monkeypatch.setattr(config, "default_db_path", db_file)
+    result = CliRunner().invoke(cli, ["stats"])
+    assert result.exit_code == 0, result.output
+    assert "products" in result.output
+    assert "latency" in result.output
+
+
+class _Sink:
+    """Stands in for UpgatesDuckDBAPI.insert_api_requests."""
+
+    def __init__(self):
+        self.frames = []
+
+    def insert_api_requests(self, frame):
+        self.frames.append(frame)
+        return len(frame)
+
+
+def test_stats_buffer_is_bounded_and_keeps_pending_pages():
+    stats = RequestStats(max_samples=3)
+    for page in range(1, 6):
+        stats.record(RequestSample(endpoint="products", page=page))
+    assert [sample.page for sample in stats.samples] == [3, 4, 5]
+    assert stats.dropped == 2
+
+    stats.add_timing("products", 3, "store", 0.1)
+    sink = _Sink()
+    assert stats.flush(sink, keep_pending=True) == 1
+    assert [sample.page for sample in stats.samples] == [4, 5]
+    # Held-back pages still receive their store timing and flush afterwards
+    stats.add_timing("products", 4, "store", 0.2)
+    assert stats.flush(sink) == 2
+    assert sink.frames[-1]["store_ms"].tolist()[0] == 200
+    assert not stats.samples and stats.dropped == 0
+
+
+def test_stats_flush_while_recording_loses_nothing():
+    stats, sink = RequestStats(), _Sink()
+    done = threading.Event()
+
+    def flusher():
+        while not done.is_set():
+            stats.flush(sink, keep_pending=True)
+
+    thread = threading.Thread(target=flusher)
+    thread.start()
+    for page in range(1, 5001):
+        stats.record(RequestSample(endpoint="products", page=page))
+        stats.add_timing("products", page, "store", 0.001)
+    done.set()
+    thread.join()
+    stats.flush(sink)
+    assert sum(len(frame) for frame in sink.frames) == 5000
+    assert all(frame["store_ms"].notna().all() for frame in sink.frames)
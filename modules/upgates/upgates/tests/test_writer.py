@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+from upgates.writer import ProductWriter
+
+
+def test_writer_batches_splits_and_retries_only_failed_products():
+    """Products go out 100 per PUT; 413s split and only failures are re-sent."""
+    puts = []
+    flaky = {"P0042": 1}  # fails once, then saves
+
+    async def request(method, endpoint, params=None, payload=None):
+        products = payload["products"]
+        puts.append([p["code"] for p in products])
+        if len(products) > 60:  # this API instance rejects bigger bodies
+            return 413, b"Payload Too Large"
+        results = []
+        for product in products:
+            code = product["code"]
+            if code == "BAD" or flaky.get(code, 0) > 0:
+                flaky[code] = flaky.get(code, 0) - 1
+                message = {"message": "Invalid description", "level": "error"}
+                results.append(
+                    {"code": code, "updated_yn": False, "messages": [message]}
+                )
+            else:
+                results.append({"code": code, "updated_yn": True, "messages": []})
+        return 200, json.dumps({"products": results}).encode()
+
+    products = [{"code": f"P{i:04d}"} for i in range(150)] + [{"code": "BAD"}]
+    writer = ProductWriter(request, batch_size=500, retries=2)
+    result = asyncio.run(writer.save(products))
+
+    assert writer.batch_size == 100
+    assert sorted(result.saved) == sorted(p["code"] for p in products[:-1])
+    assert list(result.failed) == ["BAD"]
+    assert result.failed["BAD"][0]["message"] == "Invalid description"
+    # 100 + 51 rejected, split into 4 x ~25-50, then two retry rounds
+    assert [len(codes) for codes in puts[:2]] == [100, 51]
+    assert puts[-2:] == [["P0042", "BAD"], ["BAD"]]
+    assert result.requests == len(puts)
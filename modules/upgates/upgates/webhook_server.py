@@ -22,10 +22,26 @@ Event Types:
 
 from flask import Flask, request, jsonify
 import asyncio
+import threading
 from upgates.client import UpgatesClient
 
 app = Flask(__name__)
 client = UpgatesClient()
+# Flask serves requests on threads, each sync in its own event loop; the client's
+# session and DuckDB writer belong to one loop at a time, so syncs take turns.
+_sync_lock = threading.Lock()
+
+
+async def _run_sync(sync) -> None:
+    """Run an incremental client sync, closing the pooled session when done."""
+    async with client:
+        await sync(incremental=True)
+
+
+def _sync(sync) -> None:
+    """Run `_run_sync` in a fresh event loop, one webhook at a time."""
+    with _sync_lock:
+        asyncio.run(_run_sync(sync))
 
 
 @app.route("/webhook", methods=["POST"])
@@ -36,11 +52,11 @@ def webhook():
 
     match data.get("type"):
         case "product.updated":
-            asyncio.run(client.sync_products())
+            _sync(client.sync_products)
         case "customer.updated":
-            asyncio.run(client.sync_customers())
+            _sync(client.sync_customers)
         case "order.updated":
-            asyncio.run(client.sync_orders())
+            _sync(client.sync_orders)
         case _:
             print(f"⚠️ Unknown webhook event: {data}")
 
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Upgates Batched Product Writer
+
+This module packs product updates into multi-product `PUT /products` requests.
+The API accepts at most 100 products per PUT (more returns `413` and nothing is
+saved) and reports the outcome of every product separately, so the writer maps
+each `updated_yn`/`messages` result back to its product code and retries only
+the products that failed.
+
+Usage:
+
+    writer = ProductWriter(client._request)
+    result = await writer.save([{"code": "P1", "descriptions": [...]}, ...])
+    for code, messages in result.failed.items():
+        print(code, messages)
+
+File: upgates/writer.py
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import logfire
+
+from upgates.models.payloads import loads
+
+RequestFunc = Callable[..., Awaitable[Tuple[int, bytes]]]
+
+# `messages` levels that mean the product was not saved
+ERROR_LEVELS = ("error", "fatal_error")
+
+
+@dataclass
+class SaveResult:
+    """Outcome of a batched save: saved product codes and failures by code."""
+
+    saved: List[str] = field(default_factory=list)
+    failed: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    requests: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+def _failure(message: str) -> List[Dict[str, Any]]:
+    return [{"object": None, "property": None, "message": message, "level": "error"}]
+
+
+class ProductWriter:
+    """Saves product updates in PUT batches of up to `batch_size` products."""
+
+    MAX_BATCH_SIZE = 100  # API limit per PUT request
+
+    def __init__(self, request: RequestFunc, batch_size: int = 100, retries: int = 2):
+        self.request = request
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.retries = retries
+
+    async def save(self, products: List[Dict[str, Any]]) -> SaveResult:
+        """Save `products` (PUT payload entries keyed by `code`).
+
+        Batches are sent concurrently (the client's scheduler bounds them);
+        products reported as failed are re-sent up to `retries` times.
+        """
+        result = SaveResult()
+        pending = list(products)
+        for attempt in range(self.retries + 1):
+            if not pending:
+                break
+            if attempt:
+                logfire.info(
+                    f"🔁 Retrying {len(pending)} failed products "
+                    f"(attempt {attempt}/{self.retries})."
+                )
+            batches = [
+                pending[i : i + self.batch_size]
+                for i in range(0, len(pending), self.batch_size)
+            ]
+            outcomes = await asyncio.gather(*(self._put(b, result) for b in batches))
+
+            by_code = {product["code"]: product for product in pending}
+            pending, result.failed = [], {}
+            for saved, failed in outcomes:
+                result.saved.extend(saved)
+                result.failed.update(failed)
+                pending.extend(by_code[code] for code in failed)
+
+        for code, messages in result.failed.items():
+            logfire.error(
+                f"❌ [{code}] Product not saved: "
+                + "; ".join(m.get("message", "") for m in messages)
+            )
+        logfire.info(
+            f"💾 Saved {len(result.saved)} products in {result.requests} requests, "
+            f"{len(result.failed)} failed."
+        )
+        return result
+
+    async def _put(
+        self, batch: List[Dict[str, Any]], result: SaveResult
+    ) -> Tuple[List[str], Dict[str, List[Dict[str, Any]]]]:
+        """PUT one batch; split it in halves if the API rejects its size."""
+        result.requests += 1
+        status, body = await self.request(
+            "PUT", "products", payload={"products": batch}
+        )
+
+        if status == 413 and len(batch) > 1:
+            logfire.warning(f"⚠️ PUT of {len(batch)} products too large; splitting.")
+            middle = len(batch) // 2
+            first, second = await asyncio.gather(
+                self._put(batch[:middle], result), self._put(batch[middle:], result)
+            )
+            return first[0] + second[0], {**first[1], **second[1]}
+
+        codes = [product["code"] for product in batch]
+        if status != 200:
+            text = body[:200].decode(errors="replace")
+            return [], {code: _failure(f"HTTP {status}: {text}") for code in codes}
+
+        reported: Dict[Optional[str], Dict[str, Any]] = {
+            item.get("code"): item for item in loads(body).get("products", [])
+        }
+        saved, failed = [], {}
+        for code in codes:
+            item = reported.get(code)
+            if item is None:
+                failed[code] = _failure("Product missing from the API response.")
+                continue
+            messages = item.get("messages") or []
+            if not item.get("updated_yn", True) or any(
+                m.get("level") in ERROR_LEVELS for m in messages
+            ):
+                failed[code] = messages or _failure("Product was not updated.")
+            else:
+                saved.append(code)
+        return saved, failed
+
+
+# EOF